@@ -1,5 +1,7 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.db.models import Count, Exists, OuterRef
 from .models import Chapter, Lecture, Enrollment
+from .entitlements import invalidate_entitlements
 
 
 class LectureInline(admin.TabularInline):
@@ -27,6 +29,34 @@ class ChapterAdmin(admin.ModelAdmin):
             'fields': ('order', 'is_active')
         }),
     )
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            _lectures_count=Count('lectures')
+        )
+    
+    def lectures_count(self, obj):
+        return obj._lectures_count
+    lectures_count.short_description = 'عدد المحاضرات'
+    lectures_count.admin_order_field = '_lectures_count'
+
+
+class DuplicateVideoFilter(admin.SimpleListFilter):
+    """Lectures whose video is used by another lecture (uses lecture_video_idx)"""
+    title = 'فيديو مكرر'
+    parameter_name = 'duplicate_video'
+    
+    def lookups(self, request, model_admin):
+        return [('yes', 'مكرر')]
+    
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            same_video = Lecture.objects.filter(
+                video_provider=OuterRef('video_provider'),
+                video_id=OuterRef('video_id')
+            ).exclude(pk=OuterRef('pk'))
+            return queryset.exclude(video_id='').filter(Exists(same_video))
+        return queryset
 
 
 @admin.register(Lecture)
@@ -42,16 +72,25 @@ class LectureAdmin(admin.ModelAdmin):
         'enrolled_count',
         'is_active'
     ]
-    list_filter = ['chapter__grade', 'chapter', 'is_free', 'is_active']
-    search_fields = ['title', 'description', 'chapter__title']
+    list_filter = [
+        'chapter__grade',
+        'chapter',
+        'video_provider',
+        DuplicateVideoFilter,
+        'is_free',
+        'is_active'
+    ]
+    search_fields = ['title', 'description', 'chapter__title', '=video_id']
     ordering = ['chapter', 'order']
+    readonly_fields = ['video_provider', 'video_id', 'video_hash']
+    list_select_related = ['chapter']
     
     fieldsets = (
         ('بيانات المحاضرة', {
             'fields': ('chapter', 'title', 'description', 'order')
         }),
         ('الفيديو', {
-            'fields': ('video_url', 'duration')
+            'fields': ('video_url', 'duration', ('video_provider', 'video_id', 'video_hash'))
         }),
         ('المرفقات', {
             'fields': ('pdf_file',)
@@ -63,6 +102,30 @@ class LectureAdmin(admin.ModelAdmin):
             'fields': ('is_active',)
         }),
     )
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            _enrolled_count=Count('enrollments')
+        )
+    
+    def enrolled_count(self, obj):
+        return obj._enrolled_count
+    enrolled_count.short_description = 'عدد المشتركين'
+    enrolled_count.admin_order_field = '_enrolled_count'
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if obj.video_id:
+            duplicate = Lecture.objects.filter(
+                video_provider=obj.video_provider,
+                video_id=obj.video_id
+            ).exclude(pk=obj.pk).first()
+            if duplicate:
+                self.message_user(
+                    request,
+                    f'⚠️ نفس الفيديو مستخدم في محاضرة أخرى: {duplicate}',
+                    messages.WARNING
+                )
 
 
 @admin.register(Enrollment)
@@ -89,3 +152,7 @@ class EnrollmentAdmin(admin.ModelAdmin):
     ]
     readonly_fields = ['enrolled_at', 'completed_at']
     date_hierarchy = 'enrolled_at'
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_entitlements(obj.student)
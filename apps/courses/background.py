@@ -0,0 +1,48 @@
+"""
+Background job runner for the Voltage Platform
+تشغيل المهام في الخلفية بدون تعطيل الطلب
+
+Jobs are handed to a small thread pool once the surrounding transaction
+commits, so admin saves return immediately and the job always sees the
+committed row.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'BACKGROUND_TASK_WORKERS', 2),
+            thread_name_prefix='voltage-bg'
+        )
+    return _executor
+
+
+def _run(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Background job %s failed', func.__name__)
+    finally:
+        # Each worker thread owns its own DB connection
+        connection.close()
+
+
+def run_in_background(func, *args):
+    """Schedule func(*args) to run after the current transaction commits"""
+    def submit():
+        if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+            func(*args)
+        else:
+            _get_executor().submit(_run, func, *args)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,93 @@
+"""
+Chapter catalog snapshots
+كتالوج الفصول المخزن مؤقتاً لكل سنة دراسية
+
+Each snapshot is a list of plain dicts (chapter fields + active lecture
+count + total duration + last change time) built with one aggregated
+query and kept in the cache until a Chapter or Lecture changes (see
+signals.py). The snapshots also back the catalog ETags in views.py.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Chapter
+
+GRADES = [grade for grade, _ in Chapter.GRADE_CHOICES]
+
+
+def catalog_cache_key(grade=None):
+    return f'courses:catalog:{grade or "all"}'
+
+
+def build_catalog(grade=None):
+    """Build the snapshot for one grade (or all grades) in a single query"""
+    active_lectures = Q(lectures__is_active=True)
+    chapters = Chapter.objects.filter(is_active=True)
+    if grade:
+        chapters = chapters.filter(grade=grade)
+    
+    chapters = chapters.annotate(
+        active_lectures_count=Count('lectures', filter=active_lectures),
+        total_duration=Coalesce(Sum('lectures__duration', filter=active_lectures), 0),
+        last_changed=Greatest('updated_at', Coalesce(Max('lectures__updated_at'), 'updated_at')),
+    ).values(
+        'id', 'title', 'description', 'grade', 'order', 'thumbnail',
+        'thumbnail_derivatives', 'active_lectures_count', 'total_duration', 'last_changed'
+    )
+    
+    grade_names = dict(Chapter.GRADE_CHOICES)
+    storage = Chapter._meta.get_field('thumbnail').storage
+    return [
+        {
+            'id': row['id'],
+            'title': row['title'],
+            'description': row['description'],
+            'grade': row['grade'],
+            'grade_display': grade_names.get(row['grade'], row['grade']),
+            'order': row['order'],
+            'thumbnail_url': storage.url(row['thumbnail']) if row['thumbnail'] else '',
+            'thumbnail_derivatives': row['thumbnail_derivatives'],
+            'lectures_count': row['active_lectures_count'],
+            'total_duration': row['total_duration'],
+            'updated_at': row['last_changed'],
+        }
+        for row in chapters
+    ]
+
+
+def refresh_catalog(grade=None):
+    catalog = build_catalog(grade)
+    cache.set(catalog_cache_key(grade), catalog, None)
+    return catalog
+
+
+def get_catalog(grade=None):
+    """Return the cached snapshot, building it on a miss"""
+    catalog = cache.get(catalog_cache_key(grade))
+    if catalog is None:
+        catalog = refresh_catalog(grade)
+    return catalog
+
+
+def get_catalog_chapter(chapter_id):
+    """Return one active chapter's snapshot entry, or None"""
+    for chapter in get_catalog():
+        if chapter['id'] == chapter_id:
+            return chapter
+    return None
+
+
+def invalidate_catalog(*grades):
+    """
+    Drop the snapshots of the given grades (plus the all-grades one) now
+    and again once the transaction commits; the next read rebuilds them.
+    No grades means the change may touch any grade.
+    """
+    affected = [g for g in grades if g] or GRADES
+    keys = [catalog_cache_key(g) for g in dict.fromkeys(affected)] + [catalog_cache_key(None)]
+    cache.delete_many(keys)
+    # A page read before the commit rebuilds from the old rows, so the
+    # snapshot it caches must not outlive the transaction
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,135 @@
+"""
+Protected file delivery
+تحميل الملفات المحمية (الملازم)
+
+After the view has checked access, the file is handed off without going
+through worker memory:
+
+- PROTECTED_MEDIA_SERVER = 'nginx'    -> X-Accel-Redirect to an internal location
+- PROTECTED_MEDIA_SERVER = 'sendfile' -> X-Sendfile with the absolute path
+- otherwise                           -> FileResponse with single-range support;
+  the open file keeps its fileno() so gunicorn's wsgi.file_wrapper can
+  send it with sendfile(2).
+"""
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import http_date
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$', re.ASCII)
+MULTI_RANGE_RE = re.compile(r'^bytes=\d*-\d*(?:\s*,\s*\d*-\d*)+$', re.ASCII)
+
+
+class RangeFile:
+    """
+    Read-only window over an open file. Exposes fileno() for sendfile and
+    deliberately no seek()/tell(), so FileResponse doesn't re-measure it.
+    """
+    
+    def __init__(self, file, start, length):
+        self._file = file
+        self._remaining = length
+        file.seek(start)
+    
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+    
+    def fileno(self):
+        return self._file.fileno()
+    
+    def close(self):
+        self._file.close()
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) for a single 'bytes=' range, None to serve the whole
+    file, or False if the range is malformed or can't be satisfied.
+    """
+    header = header.strip() if header else ''
+    if not header.startswith('bytes=') or MULTI_RANGE_RE.match(header):
+        return None  # Absent, another unit or multi-range: send everything
+    
+    match = RANGE_RE.match(header)
+    if not match or not any(match.groups()):
+        return False
+    
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _disposition(filename):
+    return f"inline; filename*=UTF-8''{quote(filename)}"
+
+
+def serve_protected_file(request, field_file, content_type='application/octet-stream'):
+    """Send a FieldFile the student is already allowed to read"""
+    filename = os.path.basename(field_file.name)
+    server = getattr(settings, 'PROTECTED_MEDIA_SERVER', '')
+    
+    if server == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(settings.PROTECTED_MEDIA_URL + field_file.name)
+        response['Content-Disposition'] = _disposition(filename)
+        return response
+    
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        # Remote storage: no local path, stream it as-is
+        return FileResponse(field_file.open('rb'), filename=filename, content_type=content_type)
+    
+    if server == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        response['Content-Disposition'] = _disposition(filename)
+        return response
+    
+    stat = os.stat(path)
+    size = stat.st_size
+    last_modified = http_date(stat.st_mtime)
+    
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range == last_modified:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    
+    response = FileResponse(
+        RangeFile(open(path, 'rb'), start, length),
+        filename=filename,
+        content_type=content_type,
+        status=206 if byte_range else 200,
+    )
+    response['Content-Length'] = length
+    response['Content-Disposition'] = _disposition(filename)
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = last_modified
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
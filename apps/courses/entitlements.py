@@ -0,0 +1,108 @@
+"""
+Student entitlements
+صلاحيات الطالب على المحاضرات
+
+Loads a student's enrolled and completed lecture IDs once and keeps them
+in the cache under a versioned key, so "does this student own this
+lecture?" is a set lookup instead of an Enrollment query. Anything that
+creates or completes an enrollment must call invalidate_entitlements().
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Enrollment
+
+ENTITLEMENTS_TIMEOUT = 60 * 60 * 24
+
+
+class Entitlements:
+    """Frozen sets of lecture IDs a student is enrolled in / has completed"""
+    
+    __slots__ = ('version', 'enrolled', 'completed')
+    
+    def __init__(self, version, enrolled=frozenset(), completed=frozenset()):
+        self.version = version
+        self.enrolled = enrolled
+        self.completed = completed
+    
+    def owns(self, lecture_id):
+        return lecture_id in self.enrolled
+    
+    def can_watch(self, lecture):
+        return lecture.is_free or lecture.id in self.enrolled
+
+
+ANONYMOUS = Entitlements(version=0)
+
+
+def _version_key(student_id):
+    return f'courses:entitlements:{student_id}:version'
+
+
+def get_entitlements_version(student_id):
+    key = _version_key(student_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from a fresh value so an evicted counter never
+        # resurrects snapshots cached under an old version
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_entitlements(user):
+    """Return the user's Entitlements, memoized on the user for the request"""
+    if not user.is_authenticated:
+        return ANONYMOUS
+    
+    entitlements = getattr(user, '_entitlements', None)
+    if entitlements is not None:
+        return entitlements
+    
+    version = get_entitlements_version(user.pk)
+    key = f'courses:entitlements:{user.pk}:v{version}'
+    data = cache.get(key)
+    if data is None:
+        enrolled = set()
+        completed = set()
+        for lecture_id, is_completed in Enrollment.objects.filter(
+            student_id=user.pk
+        ).values_list('lecture_id', 'is_completed'):
+            enrolled.add(lecture_id)
+            if is_completed:
+                completed.add(lecture_id)
+        data = (frozenset(enrolled), frozenset(completed))
+        cache.set(key, data, ENTITLEMENTS_TIMEOUT)
+    
+    entitlements = Entitlements(version, *data)
+    user._entitlements = entitlements
+    return entitlements
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
+
+
+def bump_entitlements_version(student_id):
+    """
+    New version now, and again once the transaction commits: a request
+    that reads the old enrollments before the commit caches them under
+    the first bump, which the second one leaves behind.
+    """
+    key = _version_key(student_id)
+    _bump(key)
+    transaction.on_commit(lambda: _bump(key))
+
+
+def invalidate_entitlements(student):
+    """Bump the student's version so the next lookup reloads from the DB"""
+    bump_entitlements_version(student.pk)
+    try:
+        del student._entitlements
+    except AttributeError:
+        pass
@@ -0,0 +1,42 @@
+"""
+Management command to write buffered video progress to the database
+
+Usage:
+    python manage.py flush_progress              # flush once
+    python manage.py flush_progress --loop 15    # flush every 15 seconds
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.courses.progress_buffer import cache_is_shared, flush_progress
+
+
+class Command(BaseCommand):
+    help = 'Flush buffered video progress heartbeats to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Buffered entries applied per UPDATE (default: 500)'
+        )
+        parser.add_argument(
+            '--loop', type=int, metavar='SECONDS',
+            help='Keep running, flushing every SECONDS'
+        )
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            self.stdout.write(self.style.WARNING(
+                'The cache is process-local (no REDIS_URL): heartbeats are written '
+                'directly, there is nothing to flush.'
+            ))
+            return
+
+        while True:
+            written = flush_progress(batch_size=options['batch_size'])
+            if written or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Flushed {written} enrollments'))
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
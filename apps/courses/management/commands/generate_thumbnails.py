@@ -0,0 +1,38 @@
+"""
+Management command to (re)build thumbnail derivatives for existing images
+
+Usage:
+    python manage.py generate_thumbnails          # only rows missing derivatives
+    python manage.py generate_thumbnails --all    # rebuild everything
+"""
+from django.core.management.base import BaseCommand
+
+from apps.courses.models import Chapter, Lecture
+from apps.courses.thumbnails import build_thumbnail_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Generate WebP/JPEG thumbnail sizes for chapters and lectures'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Rebuild derivatives even where they already exist'
+        )
+
+    def handle(self, *args, **options):
+        generated = 0
+        for model in (Chapter, Lecture):
+            rows = model.objects.exclude(thumbnail='').exclude(thumbnail__isnull=True)
+            if not options['all']:
+                rows = rows.filter(thumbnail_derivatives={})
+            
+            for pk, name in rows.values_list('pk', 'thumbnail').iterator():
+                try:
+                    build_thumbnail_derivatives(model._meta.label, pk, name)
+                    generated += 1
+                    self.stdout.write(self.style.SUCCESS(f'  ✓ {name}'))
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'  ✗ {name}: {e}'))
+        
+        self.stdout.write(self.style.SUCCESS(f'\nGenerated thumbnails for {generated} images!'))
@@ -1,28 +1,137 @@
 """
 Management command to update video durations for existing lectures
+
+Usage:
+    python manage.py update_durations
+    python manage.py update_durations --workers 8 --checkpoint durations.json
+    python manage.py update_durations --all   # refresh every YouTube lecture
 """
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from django.core.management.base import BaseCommand
-from apps.courses.models import Lecture, get_youtube_duration
+from django.utils import timezone
+
+from apps.courses.catalog import invalidate_catalog
+from apps.courses.models import Lecture
+from apps.courses.video_metadata import get_duration_fetcher
 
 
 class Command(BaseCommand):
     help = 'Update video durations for all lectures with duration=0'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Number of concurrent lookups (default: 4)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Rows per bulk_update (default: 100)'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='JSON file recording processed lectures, used to resume an interrupted run'
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Refresh every YouTube lecture, not only those with duration=0'
+        )
+
     def handle(self, *args, **options):
-        lectures = Lecture.objects.filter(duration=0)
-        updated = 0
-        
+        self.checkpoint_path = options['checkpoint']
+        self.batch_size = max(1, options['batch_size'])
+        self.done = self.load_checkpoint()
+        self.pending = []
+        self.updated = 0
+
+        lectures = Lecture.objects.filter(video_provider='youtube').only(
+            'id', 'title', 'video_url', 'video_id', 'duration'
+        )
+        if not options['all']:
+            lectures = lectures.filter(duration=0)
+
+        # Group lectures by video ID so each video is fetched only once
+        by_video = defaultdict(list)
+        for lecture in lectures.iterator():
+            if lecture.id not in self.done:
+                by_video[lecture.video_id].append(lecture)
+
+        if self.done:
+            self.stdout.write(f'Resuming: skipping {len(self.done)} already processed lectures')
+        self.stdout.write(f'Fetching {len(by_video)} videos with {options["workers"]} workers...')
+
+        fetch = get_duration_fetcher()
+        pool = ThreadPoolExecutor(max_workers=max(1, options['workers']))
+        try:
+            futures = {
+                pool.submit(fetch, group[0].video_url): video_id
+                for video_id, group in by_video.items()
+            }
+            for future in as_completed(futures):
+                video_id = futures[future]
+                try:
+                    duration = future.result()
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'  ✗ {video_id}: {e}'))
+                    duration = 0
+                self.record(by_video[video_id], duration)
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.flush()
+            self.stdout.write(self.style.WARNING(
+                f'\nInterrupted after updating {self.updated} lectures. '
+                'Run again with the same --checkpoint to resume.'
+            ))
+            return
+        pool.shutdown()
+
+        self.flush()
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        self.stdout.write(self.style.SUCCESS(f'\nUpdated {self.updated} lectures!'))
+
+    def record(self, lectures, duration):
+        """Apply one fetched duration to every lecture sharing the video"""
+        now = timezone.now()
         for lecture in lectures:
-            if lecture.video_url and ('youtube' in lecture.video_url or 'youtu.be' in lecture.video_url):
-                self.stdout.write(f'Fetching duration for: {lecture.title}...')
-                duration = get_youtube_duration(lecture.video_url)
-                
-                if duration > 0:
-                    lecture.duration = duration
-                    lecture.save(update_fields=['duration'])
-                    self.stdout.write(self.style.SUCCESS(f'  ✓ {duration} minutes'))
-                    updated += 1
-                else:
-                    self.stdout.write(self.style.WARNING('  ✗ Could not fetch duration'))
-        
-        self.stdout.write(self.style.SUCCESS(f'\nUpdated {updated} lectures!'))
+            if duration > 0:
+                lecture.duration = duration
+                lecture.updated_at = now
+                self.pending.append(lecture)
+                self.stdout.write(self.style.SUCCESS(f'  ✓ {lecture.title}: {duration} minutes'))
+            else:
+                # Left out of the checkpoint so a resumed run retries it
+                self.stdout.write(self.style.WARNING(f'  ✗ Could not fetch duration: {lecture.title}'))
+
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write pending durations in one bulk_update and save the checkpoint"""
+        if self.pending:
+            Lecture.objects.bulk_update(
+                self.pending, ['duration', 'updated_at'], batch_size=self.batch_size
+            )
+            self.updated += len(self.pending)
+            self.done.update(lecture.id for lecture in self.pending)
+            self.pending = []
+            invalidate_catalog()
+        self.save_checkpoint()
+
+    def load_checkpoint(self):
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path) as f:
+            return set(json.load(f).get('done', []))
+
+    def save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'done': sorted(self.done)}, f)
+        os.replace(tmp_path, self.checkpoint_path)
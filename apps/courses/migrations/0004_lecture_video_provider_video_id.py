@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_lecture_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lecture',
+            name='video_id',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='معرف الفيديو'),
+        ),
+        migrations.AddField(
+            model_name='lecture',
+            name='video_provider',
+            field=models.CharField(choices=[('youtube', 'YouTube'), ('vimeo', 'Vimeo'), ('other', 'أخرى')], default='other', editable=False, max_length=10, verbose_name='مزود الفيديو'),
+        ),
+        migrations.AddIndex(
+            model_name='lecture',
+            index=models.Index(fields=['video_provider', 'video_id'], name='lecture_video_idx'),
+        ),
+    ]
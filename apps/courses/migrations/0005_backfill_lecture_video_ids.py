@@ -0,0 +1,53 @@
+# Backfill video_provider / video_id for existing lectures
+
+import re
+
+from django.db import migrations
+
+# Frozen copy of apps.courses.video_metadata.parse_video_url as of this
+# migration, so later changes to the app code cannot change what it does
+YOUTUBE_ID_PATTERNS = [
+    re.compile(r'youtube(?:-nocookie)?\.com/watch\?(?:.*&)?v=([a-zA-Z0-9_-]+)'),
+    re.compile(r'youtu\.be/([a-zA-Z0-9_-]+)'),
+    re.compile(r'youtube(?:-nocookie)?\.com/(?:embed|shorts|live|v)/([a-zA-Z0-9_-]+)'),
+]
+VIMEO_URL = re.compile(
+    r'vimeo\.com/(?:video/|channels/[\w-]+/|groups/[\w-]+/videos/)?(\d+)'
+    r'(?:/([a-zA-Z0-9]+))?(?:[/?#].*)?$'
+)
+
+
+def parse_video_url(url):
+    url = url or ''
+    for pattern in YOUTUBE_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return 'youtube', match.group(1)
+    match = VIMEO_URL.search(url)
+    if match:
+        return 'vimeo', match.group(1)
+    return 'other', ''
+
+
+def backfill_video_ids(apps, schema_editor):
+    Lecture = apps.get_model('courses', 'Lecture')
+    batch = []
+    for lecture in Lecture.objects.only('id', 'video_url').iterator(chunk_size=500):
+        lecture.video_provider, lecture.video_id = parse_video_url(lecture.video_url)
+        batch.append(lecture)
+        if len(batch) >= 500:
+            Lecture.objects.bulk_update(batch, ['video_provider', 'video_id'])
+            batch = []
+    if batch:
+        Lecture.objects.bulk_update(batch, ['video_provider', 'video_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_lecture_video_provider_video_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_video_ids, migrations.RunPython.noop),
+    ]
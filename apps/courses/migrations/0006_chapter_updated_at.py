@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_backfill_lecture_video_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='آخر تحديث'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_chapter_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='thumbnail_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='نسخ الصورة المصغرة'),
+        ),
+        migrations.AddField(
+            model_name='lecture',
+            name='thumbnail_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='نسخ الصورة المصغرة'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Re-parse lectures the first backfill left as 'other' (YouTube shorts/live)
+
+from importlib import import_module
+
+from django.db import migrations
+
+# Migration files never change, so the parser frozen in 0005 is safe to reuse
+parse_video_url = import_module(
+    'apps.courses.migrations.0005_backfill_lecture_video_ids'
+).parse_video_url
+
+
+def reparse_other_video_urls(apps, schema_editor):
+    Lecture = apps.get_model('courses', 'Lecture')
+    batch = []
+    for lecture in Lecture.objects.filter(video_provider='other').only('id', 'video_url').iterator(chunk_size=500):
+        provider, video_id = parse_video_url(lecture.video_url)
+        if provider == 'other':
+            continue
+        lecture.video_provider, lecture.video_id = provider, video_id
+        batch.append(lecture)
+        if len(batch) >= 500:
+            Lecture.objects.bulk_update(batch, ['video_provider', 'video_id'])
+            batch = []
+    if batch:
+        Lecture.objects.bulk_update(batch, ['video_provider', 'video_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_thumbnail_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunPython(reparse_other_video_urls, migrations.RunPython.noop),
+    ]
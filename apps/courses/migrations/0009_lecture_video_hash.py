@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_reparse_other_video_urls'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lecture',
+            name='video_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32, verbose_name='هاش الفيديو'),
+        ),
+    ]
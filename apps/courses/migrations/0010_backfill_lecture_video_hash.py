@@ -0,0 +1,47 @@
+# Backfill video_hash for existing Vimeo lectures
+
+import re
+
+from django.db import migrations
+
+# Frozen copy of apps.courses.video_metadata.extract_vimeo_hash as of this
+# migration, so later changes to the app code cannot change what it does
+VIMEO_URL = re.compile(
+    r'vimeo\.com/(?:video/|channels/[\w-]+/|groups/[\w-]+/videos/)?(\d+)'
+    r'(?:/([a-zA-Z0-9]+))?(?:[/?#].*)?$'
+)
+VIMEO_HASH_PARAM = re.compile(r'[?&]h=([a-zA-Z0-9]+)')
+
+
+def extract_vimeo_hash(url):
+    match = VIMEO_URL.search(url or '')
+    if match and match.group(2):
+        return match.group(2)
+    match = VIMEO_HASH_PARAM.search(url or '')
+    return match.group(1) if match else ''
+
+
+def backfill_video_hash(apps, schema_editor):
+    Lecture = apps.get_model('courses', 'Lecture')
+    batch = []
+    for lecture in Lecture.objects.filter(video_provider='vimeo').only('id', 'video_url').iterator(chunk_size=500):
+        lecture.video_hash = extract_vimeo_hash(lecture.video_url)
+        if not lecture.video_hash:
+            continue
+        batch.append(lecture)
+        if len(batch) >= 500:
+            Lecture.objects.bulk_update(batch, ['video_hash'])
+            batch = []
+    if batch:
+        Lecture.objects.bulk_update(batch, ['video_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_lecture_video_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_video_hash, migrations.RunPython.noop),
+    ]
@@ -4,37 +4,11 @@ Courses Models for Voltage Platform
 """
 from django.db import models
 from django.conf import settings
-import re
 
-
-def get_youtube_duration(url):
-    """Fetch video duration from YouTube URL in minutes"""
-    try:
-        from pytube import YouTube
-        
-        # Extract video ID and construct proper URL
-        video_id = None
-        if 'youtube.com/watch' in url:
-            match = re.search(r'v=([a-zA-Z0-9_-]+)', url)
-            if match:
-                video_id = match.group(1)
-        elif 'youtu.be/' in url:
-            match = re.search(r'youtu\.be/([a-zA-Z0-9_-]+)', url)
-            if match:
-                video_id = match.group(1)
-        elif 'youtube.com/embed/' in url:
-            match = re.search(r'embed/([a-zA-Z0-9_-]+)', url)
-            if match:
-                video_id = match.group(1)
-        
-        if video_id:
-            yt = YouTube(f'https://www.youtube.com/watch?v={video_id}')
-            # Duration is in seconds, convert to minutes
-            duration_minutes = yt.length // 60
-            return max(1, duration_minutes)  # At least 1 minute
-    except Exception as e:
-        print(f"Error fetching YouTube duration: {e}")
-    return 0
+from .thumbnails import schedule_thumbnail_derivatives, thumbnail_changed, thumbnail_saved
+from .video_metadata import (
+    extract_vimeo_hash, get_youtube_duration, parse_video_url, schedule_duration_refresh
+)
 
 
 class Chapter(models.Model):
@@ -56,14 +30,45 @@ class Chapter(models.Model):
         blank=True,
         null=True
     )
+    thumbnail_derivatives = models.JSONField(
+        'نسخ الصورة المصغرة',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     is_active = models.BooleanField('نشط', default=True)
     created_at = models.DateTimeField('تاريخ الإنشاء', auto_now_add=True)
+    updated_at = models.DateTimeField('آخر تحديث', auto_now=True)
     
     class Meta:
         verbose_name = 'فصل'
         verbose_name_plural = 'الفصول'
         ordering = ['grade', 'order']
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_thumbnail = instance.__dict__.get('thumbnail')
+        instance._loaded_grade = instance.__dict__.get('grade')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        """Regenerate thumbnail sizes in the background after a new upload"""
+        update_fields = kwargs.get('update_fields')
+        new_thumbnail = thumbnail_saved(update_fields) and thumbnail_changed(self)
+        if new_thumbnail:
+            self.thumbnail_derivatives = {}
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'thumbnail_derivatives'}
+        
+        super().save(*args, **kwargs)
+        if thumbnail_saved(update_fields):
+            self._loaded_thumbnail = self.thumbnail.name
+        self._loaded_grade = self.grade
+        
+        if new_thumbnail and self.thumbnail:
+            schedule_thumbnail_derivatives(self)
+    
     def __str__(self):
         return f"{self.get_grade_display()} - {self.title}"
     
@@ -75,6 +80,15 @@ class Chapter(models.Model):
 class Lecture(models.Model):
     """المحاضرة"""
     
+    VIDEO_PROVIDER_CHOICES = [
+        ('youtube', 'YouTube'),
+        ('vimeo', 'Vimeo'),
+        ('other', 'أخرى'),
+    ]
+    
+    YOUTUBE_EMBED_PARAMS = '?rel=0&modestbranding=1&enablejsapi=1'
+    VIMEO_EMBED_PARAMS = 'title=0&byline=0&portrait=0'
+    
     chapter = models.ForeignKey(
         Chapter,
         on_delete=models.CASCADE,
@@ -89,6 +103,27 @@ class Lecture(models.Model):
         'رابط الفيديو (Vimeo/YouTube)',
         help_text='ضع رابط الفيديو من Vimeo أو YouTube'
     )
+    # Parsed from video_url on save
+    video_provider = models.CharField(
+        'مزود الفيديو',
+        max_length=10,
+        choices=VIDEO_PROVIDER_CHOICES,
+        default='other',
+        editable=False
+    )
+    video_id = models.CharField(
+        'معرف الفيديو',
+        max_length=64,
+        blank=True,
+        editable=False
+    )
+    # Privacy hash of an unlisted Vimeo video (vimeo.com/ID/HASH or ?h=HASH)
+    video_hash = models.CharField(
+        'هاش الفيديو',
+        max_length=32,
+        blank=True,
+        editable=False
+    )
     duration = models.PositiveIntegerField(
         'مدة الفيديو (بالدقائق)',
         default=0
@@ -109,6 +144,12 @@ class Lecture(models.Model):
         blank=True,
         null=True
     )
+    thumbnail_derivatives = models.JSONField(
+        'نسخ الصورة المصغرة',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     
     # Pricing
     price = models.DecimalField(
@@ -131,27 +172,52 @@ class Lecture(models.Model):
         verbose_name = 'محاضرة'
         verbose_name_plural = 'المحاضرات'
         ordering = ['chapter', 'order']
+        indexes = [
+            models.Index(fields=['video_provider', 'video_id'], name='lecture_video_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember stored values so save() can tell what changed
+        instance._loaded_video_url = instance.__dict__.get('video_url')
+        instance._loaded_thumbnail = instance.__dict__.get('thumbnail')
+        instance._loaded_chapter_id = instance.__dict__.get('chapter_id')
+        return instance
     
     def save(self, *args, **kwargs):
-        """Auto-fetch duration from YouTube if not set"""
-        # Check if this is a new object or video_url changed
-        if self.pk:
-            try:
-                old_instance = Lecture.objects.get(pk=self.pk)
-                url_changed = old_instance.video_url != self.video_url
-            except Lecture.DoesNotExist:
-                url_changed = True
-        else:
-            url_changed = True
+        """Queue background duration lookup / thumbnail sizes for changed media"""
+        update_fields = kwargs.get('update_fields')
+        url_changed = self.video_url != getattr(self, '_loaded_video_url', None)
+        new_thumbnail = thumbnail_saved(update_fields) and thumbnail_changed(self)
+        if new_thumbnail:
+            self.thumbnail_derivatives = {}
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'thumbnail_derivatives'}
         
-        # Fetch duration if it's 0 or URL changed
-        if (self.duration == 0 or url_changed) and self.video_url:
-            if 'youtube' in self.video_url or 'youtu.be' in self.video_url:
-                fetched_duration = get_youtube_duration(self.video_url)
-                if fetched_duration > 0:
-                    self.duration = fetched_duration
+        if url_changed or not self.video_id:
+            self.video_provider, self.video_id = parse_video_url(self.video_url)
+            self.video_hash = extract_vimeo_hash(self.video_url) if self.video_provider == 'vimeo' else ''
+            if update_fields is not None and 'video_url' in update_fields:
+                kwargs['update_fields'] = {
+                    *kwargs['update_fields'], 'video_provider', 'video_id', 'video_hash'
+                }
         
         super().save(*args, **kwargs)
+        self._loaded_video_url = self.video_url
+        if thumbnail_saved(update_fields):
+            self._loaded_thumbnail = self.thumbnail.name
+        self._loaded_chapter_id = self.chapter_id
+        
+        if new_thumbnail and self.thumbnail:
+            schedule_thumbnail_derivatives(self)
+        
+        if update_fields is not None and 'video_url' not in update_fields:
+            return
+        
+        # Fetch duration if it's 0 or URL changed
+        if (self.duration == 0 or url_changed) and self.video_provider == 'youtube':
+            schedule_duration_refresh(self)
     
     def __str__(self):
         return f"{self.chapter.title} - {self.title}"
@@ -162,33 +228,16 @@ class Lecture(models.Model):
     
     @property
     def get_embed_url(self):
-        """Convert video URL to embeddable format"""
-        import re
-        url = self.video_url
-        
-        # YouTube embed parameters to avoid errors
-        youtube_params = "?rel=0&modestbranding=1&enablejsapi=1"
-        
-        # YouTube: convert watch URL to embed URL
-        if 'youtube.com/watch' in url:
-            # Extract video ID from watch?v=VIDEO_ID
-            match = re.search(r'v=([a-zA-Z0-9_-]+)', url)
-            if match:
-                video_id = match.group(1)
-                return f'https://www.youtube.com/embed/{video_id}{youtube_params}'
-        
-        # YouTube short URLs: youtu.be/VIDEO_ID
-        elif 'youtu.be/' in url:
-            match = re.search(r'youtu\.be/([a-zA-Z0-9_-]+)', url)
-            if match:
-                video_id = match.group(1)
-                return f'https://www.youtube.com/embed/{video_id}{youtube_params}'
-        
-        # Already an embed URL - add params if YouTube
-        if 'youtube.com/embed' in url and '?' not in url:
-            return f'{url}{youtube_params}'
-        
-        return url
+        """Build the embeddable URL from the stored provider and video ID"""
+        if self.video_provider == 'youtube' and self.video_id:
+            return f'https://www.youtube.com/embed/{self.video_id}{self.YOUTUBE_EMBED_PARAMS}'
+        if self.video_provider == 'vimeo' and self.video_id:
+            # Unlisted videos only play with their privacy hash
+            params = self.VIMEO_EMBED_PARAMS
+            if self.video_hash:
+                params = f'h={self.video_hash}&{params}'
+            return f'https://player.vimeo.com/video/{self.video_id}?{params}'
+        return self.video_url
 
 
 class Enrollment(models.Model):
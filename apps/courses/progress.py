@@ -0,0 +1,69 @@
+"""
+Atomic progress updates
+تحديثات نسبة المشاهدة بجملة UPDATE واحدة
+
+Every write here is a single conditional UPDATE built from F() expressions,
+so concurrent tabs can't overwrite each other's progress and no row is
+read into Python first.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Case, F, PositiveIntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Enrollment
+
+COMPLETION_THRESHOLD = 90
+COMPLETION_BATTERY_BONUS = 5
+
+
+def record_progress(student_id, lecture_id, progress):
+    """progress = GREATEST(progress, %s) for one enrollment - one UPDATE"""
+    return Enrollment.objects.filter(
+        student_id=student_id,
+        lecture_id=lecture_id
+    ).update(progress=Greatest(F('progress'), Value(progress)))
+
+
+def complete_enrollment(student_id, lecture_id, progress):
+    """
+    Mark an enrollment completed and charge the battery, exactly once.
+    The UPDATE only matches while is_completed is False, so concurrent
+    heartbeats can't both award the battery. Returns True if this call
+    completed it.
+    """
+    completed = Enrollment.objects.filter(
+        student_id=student_id,
+        lecture_id=lecture_id,
+        is_completed=False
+    ).update(
+        progress=Greatest(F('progress'), Value(progress)),
+        is_completed=True,
+        completed_at=timezone.now()
+    )
+    
+    if completed:
+        get_user_model().objects.adjust_battery([student_id], COMPLETION_BATTERY_BONUS)
+    return bool(completed)
+
+
+def apply_progress_batch(values):
+    """
+    Write {(student_id, lecture_id): progress} in a single UPDATE.
+    Rows only ever move forward; completion flags are left alone.
+    """
+    if not values:
+        return 0
+    
+    pairs = Q()
+    whens = []
+    for (student_id, lecture_id), progress in values.items():
+        pairs |= Q(student_id=student_id, lecture_id=lecture_id)
+        whens.append(When(student_id=student_id, lecture_id=lecture_id, then=Value(progress)))
+    
+    return Enrollment.objects.filter(pairs).update(
+        progress=Greatest(
+            F('progress'),
+            Case(*whens, default=F('progress'), output_field=PositiveIntegerField())
+        )
+    )
@@ -0,0 +1,146 @@
+"""
+Write-behind buffer for video progress heartbeats
+تجميع تحديثات نسبة المشاهدة قبل كتابتها في قاعدة البيانات
+
+Heartbeats only touch the cache: the highest progress seen for each
+(student, lecture) is kept under its own key, and the first heartbeat
+after a flush appends the pair to a sequence-numbered log. flush_progress()
+walks the log and applies the buffered values in batches.
+
+Completion is NOT buffered - the view applies it immediately (see
+progress.complete_enrollment) so the battery reward happens exactly once.
+
+The buffer only works when every web process and the flush_progress
+worker see the same cache (Redis). With a process-local cache such as
+LocMemCache the worker would never see what the web workers buffered, so
+heartbeats are written straight to the database instead.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+
+from .progress import apply_progress_batch, record_progress
+
+BUFFER_TIMEOUT = 60 * 60
+# Heartbeat processes also flush every N logged pairs, so the buffer drains
+# even if the flush_progress worker falls behind
+FLUSH_EVERY = 200
+DIRTY_TIMEOUT = 10 * 60
+FLUSH_LOCK_TIMEOUT = 5 * 60
+
+SEQ_KEY = 'courses:progress:seq'
+FLUSHED_KEY = 'courses:progress:flushed'
+FLUSH_LOCK_KEY = 'courses:progress:flush_lock'
+
+
+def _value_key(student_id, lecture_id):
+    return f'courses:progress:{student_id}:{lecture_id}'
+
+
+def _dirty_key(student_id, lecture_id):
+    return f'courses:progress:dirty:{student_id}:{lecture_id}'
+
+
+def _entry_key(seq):
+    return f'courses:progress:entry:{seq}'
+
+
+# Keep the larger of the stored and new value in one server-side step
+_REDIS_MAX_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local value = tonumber(ARGV[1])
+if value > current then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return value
+end
+return current
+"""
+_local_lock = threading.Lock()
+
+
+def cache_is_shared():
+    """True when all processes share the default cache (Redis)"""
+    return isinstance(caches['default'], RedisCache)
+
+
+def buffering_enabled():
+    return settings.PROGRESS_BUFFER_ENABLED and cache_is_shared()
+
+
+def _store_max(key, progress):
+    """Atomically raise the cached value to progress; returns the new max"""
+    backend = caches['default']
+    if isinstance(backend, RedisCache):
+        full_key = backend.make_and_validate_key(key)
+        client = backend._cache.get_client(full_key, write=True)
+        return int(client.eval(_REDIS_MAX_SCRIPT, 1, full_key, progress, BUFFER_TIMEOUT))
+    
+    # In-process caches: a lock makes the read-compare-write atomic
+    with _local_lock:
+        buffered = cache.get(key, 0)
+        if progress > buffered:
+            cache.set(key, progress, BUFFER_TIMEOUT)
+            buffered = progress
+        return buffered
+
+
+def record_heartbeat(student_id, lecture_id, progress):
+    """Buffer a heartbeat, keeping the max progress. Returns the buffered value."""
+    if not cache_is_shared():
+        # A process-local buffer would never reach the flush worker
+        record_progress(student_id, lecture_id, progress)
+        return progress
+    
+    buffered = _store_max(_value_key(student_id, lecture_id), progress)
+    
+    # Log the pair once per flush cycle; add() is atomic so concurrent
+    # heartbeats for the same pair append a single entry
+    if cache.add(_dirty_key(student_id, lecture_id), 1, DIRTY_TIMEOUT):
+        cache.add(SEQ_KEY, 0, None)
+        seq = cache.incr(SEQ_KEY)
+        cache.set(_entry_key(seq), (student_id, lecture_id), BUFFER_TIMEOUT)
+        if seq % FLUSH_EVERY == 0:
+            flush_progress()
+    
+    return buffered
+
+
+def get_buffered_progress(student_id, lecture_id):
+    return cache.get(_value_key(student_id, lecture_id))
+
+
+def flush_progress(batch_size=500):
+    """Apply buffered heartbeats to the database. Returns rows written."""
+    if not cache.add(FLUSH_LOCK_KEY, 1, FLUSH_LOCK_TIMEOUT):
+        return 0  # Another flusher is running
+    
+    written = 0
+    try:
+        flushed = cache.get(FLUSHED_KEY, 0)
+        head = cache.get(SEQ_KEY, 0)
+        
+        while flushed < head:
+            seqs = range(flushed + 1, min(flushed + batch_size, head) + 1)
+            entry_keys = [_entry_key(seq) for seq in seqs]
+            pairs = set(cache.get_many(entry_keys).values())
+            
+            # Clear the dirty markers before reading values, so a heartbeat
+            # arriving mid-flush re-logs its pair for the next cycle
+            cache.delete_many([_dirty_key(*pair) for pair in pairs])
+            buffered = cache.get_many([_value_key(*pair) for pair in pairs])
+            values = {
+                pair: buffered[_value_key(*pair)]
+                for pair in pairs
+                if _value_key(*pair) in buffered
+            }
+            
+            written += apply_progress_batch(values)
+            cache.delete_many(entry_keys)
+            flushed = seqs[-1]
+            cache.set(FLUSHED_KEY, flushed, None)
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+    
+    return written
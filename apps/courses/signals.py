@@ -0,0 +1,31 @@
+"""
+Signals for the courses app
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import invalidate_catalog
+from .entitlements import bump_entitlements_version
+from .models import Chapter, Enrollment, Lecture
+
+
+@receiver([post_save, post_delete], sender=Chapter)
+def chapter_changed(sender, instance, **kwargs):
+    # A chapter moved between grades leaves its old grade's snapshot too
+    invalidate_catalog(instance.grade, getattr(instance, '_loaded_grade', None))
+
+
+@receiver([post_save, post_delete], sender=Lecture)
+def lecture_changed(sender, instance, **kwargs):
+    try:
+        grade = instance.chapter.grade
+    except Chapter.DoesNotExist:
+        grade = None
+    if instance.chapter_id != getattr(instance, '_loaded_chapter_id', instance.chapter_id):
+        grade = None  # moved to another chapter, possibly another grade
+    invalidate_catalog(grade)
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    bump_entitlements_version(instance.student_id)
@@ -0,0 +1,29 @@
+"""
+Template helpers for responsive thumbnails
+
+    {% load thumbnails %}
+    <source type="image/webp" srcset="{{ chapter.thumbnail_derivatives|srcset:'webp' }}">
+    <img src="{{ chapter.thumbnail_derivatives|smallest:'jpg'|default:chapter.thumbnail_url }}"
+         srcset="{{ chapter.thumbnail_derivatives|srcset:'jpg' }}">
+"""
+from django import template
+from django.core.files.storage import default_storage
+
+from apps.courses import thumbnails
+
+register = template.Library()
+
+
+@register.filter
+def srcset(derivatives, ext):
+    return thumbnails.srcset(derivatives, ext)
+
+
+@register.filter
+def smallest(derivatives, ext):
+    """URL of the narrowest derivative, for the plain src fallback"""
+    paths = (derivatives or {}).get(ext) or {}
+    if not paths:
+        return ''
+    width = min(paths, key=int)
+    return default_storage.url(paths[width])
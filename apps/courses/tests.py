@@ -0,0 +1,739 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.users.models import ActivationCode, User
+from .background import run_in_background
+from .catalog import catalog_cache_key, get_catalog
+from .downloads import parse_range
+from .entitlements import get_entitlements, get_entitlements_version, invalidate_entitlements
+from .models import Chapter, Lecture, Enrollment
+from .progress import complete_enrollment, record_progress
+from .progress_buffer import flush_progress, get_buffered_progress, record_heartbeat
+from .video_metadata import extract_vimeo_hash, parse_video_url
+
+
+FETCHED_URLS = []
+
+
+def fake_duration(url):
+    """VIDEO_DURATION_FETCHER stand-in that never touches the network"""
+    FETCHED_URLS.append(url)
+    return 42
+
+
+DURATIONS = {}
+
+
+def scripted_duration(url):
+    """Fetcher replaying DURATIONS: a number, or an exception to raise"""
+    FETCHED_URLS.append(url)
+    outcome = DURATIONS[url]
+    if isinstance(outcome, BaseException):
+        raise outcome
+    return outcome
+
+
+def make_lecture(chapter=None, **kwargs):
+    chapter = chapter or Chapter.objects.create(title='الفصل الأول', grade=1)
+    kwargs.setdefault('video_url', 'https://vimeo.com/1')
+    return Lecture.objects.create(chapter=chapter, title='محاضرة', **kwargs)
+
+
+VIDEO_URLS = {
+    'https://www.youtube.com/watch?v=dQw4w9WgXcQ': ('youtube', 'dQw4w9WgXcQ'),
+    'https://www.youtube.com/watch?feature=share&v=dQw4w9WgXcQ': ('youtube', 'dQw4w9WgXcQ'),
+    'https://youtu.be/dQw4w9WgXcQ?t=42': ('youtube', 'dQw4w9WgXcQ'),
+    'https://www.youtube.com/embed/dQw4w9WgXcQ': ('youtube', 'dQw4w9WgXcQ'),
+    'https://youtube.com/shorts/aBc_12-3': ('youtube', 'aBc_12-3'),
+    'https://www.youtube.com/live/aBc_12-3?si=x': ('youtube', 'aBc_12-3'),
+    'https://vimeo.com/76979871': ('vimeo', '76979871'),
+    'https://vimeo.com/76979871/8272103f6e': ('vimeo', '76979871'),
+    'https://player.vimeo.com/video/76979871?h=8272103f6e': ('vimeo', '76979871'),
+    'https://vimeo.com/channels/staffpicks/76979871': ('vimeo', '76979871'),
+    'https://vimeo.com/showcase/123': ('other', ''),
+    'https://example.com/video.mp4': ('other', ''),
+    '': ('other', ''),
+}
+
+
+class VideoUrlTests(SimpleTestCase):
+
+    def test_parse_video_url(self):
+        for url, expected in VIDEO_URLS.items():
+            with self.subTest(url=url):
+                self.assertEqual(parse_video_url(url), expected)
+
+    def test_backfill_migration_parses_the_same(self):
+        migration = import_module('apps.courses.migrations.0005_backfill_lecture_video_ids')
+        for url, expected in VIDEO_URLS.items():
+            with self.subTest(url=url):
+                self.assertEqual(migration.parse_video_url(url), expected)
+
+    def test_backfill_migration_extracts_the_same_hash(self):
+        migration = import_module('apps.courses.migrations.0010_backfill_lecture_video_hash')
+        for url in VIDEO_URLS:
+            with self.subTest(url=url):
+                self.assertEqual(migration.extract_vimeo_hash(url), extract_vimeo_hash(url))
+
+
+class VideoEmbedTests(TestCase):
+
+    def test_unlisted_vimeo_embed_keeps_hash(self):
+        for url in (
+            'https://vimeo.com/76979871/8272103f6e',
+            'https://player.vimeo.com/video/76979871?h=8272103f6e',
+        ):
+            lecture = Lecture.objects.get(pk=make_lecture(video_url=url).pk)
+            self.assertEqual(lecture.video_hash, '8272103f6e')
+            with self.subTest(url=url), patch('apps.courses.models.extract_vimeo_hash') as parse:
+                self.assertEqual(
+                    lecture.get_embed_url,
+                    'https://player.vimeo.com/video/76979871?h=8272103f6e&title=0&byline=0&portrait=0'
+                )
+            parse.assert_not_called()  # stored on save, never parsed on render
+
+        lecture.video_url = 'https://vimeo.com/1'
+        lecture.save(update_fields=['video_url'])
+        lecture = Lecture.objects.get(pk=lecture.pk)
+        self.assertEqual(lecture.video_hash, '')
+        self.assertEqual(lecture.get_embed_url, 'https://player.vimeo.com/video/1?title=0&byline=0&portrait=0')
+
+
+class AtomicProgressTests(TestCase):
+
+    def setUp(self):
+        self.student = User.objects.create_user('01012345678', 'pass', first_name='طالب')
+        self.lecture = make_lecture()
+        Enrollment.objects.create(student=self.student, lecture=self.lecture)
+
+    def test_progress_never_moves_backwards(self):
+        record_progress(self.student.pk, self.lecture.pk, 40)
+        record_progress(self.student.pk, self.lecture.pk, 20)
+
+        enrollment = Enrollment.objects.get(student=self.student, lecture=self.lecture)
+        self.assertEqual(enrollment.progress, 40)
+
+    @override_settings(PROGRESS_BUFFER_ENABLED=False)
+    def test_heartbeat_is_one_update(self):
+        self.client.force_login(self.student)
+        url = reverse('courses:update_progress', args=[self.lecture.pk])
+        self.client.post(url, {'progress': 10})  # warm the entitlement cache
+
+        with self.assertNumQueries(3):  # session, user, UPDATE
+            response = self.client.post(url, {'progress': 30})
+
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(Enrollment.objects.get(student=self.student).progress, 30)
+
+    def test_stale_tabs_do_not_lose_battery(self):
+        # Two tabs each hold their own copy of the User row, loaded at 0
+        other = make_lecture()
+        Enrollment.objects.create(student=self.student, lecture=other)
+        first_tab = User.objects.get(pk=self.student.pk)
+        second_tab = User.objects.get(pk=self.student.pk)
+
+        complete_enrollment(first_tab.pk, self.lecture.pk, 95)
+        complete_enrollment(second_tab.pk, other.pk, 95)
+        User.objects.adjust_battery([first_tab.pk], 5)
+        User.objects.adjust_battery([second_tab.pk], 5)
+
+        self.assertEqual(second_tab.battery_level, 0)  # still stale
+        self.assertEqual(User.objects.get(pk=self.student.pk).battery_level, 20)
+
+    def test_stale_profile_save_keeps_battery(self):
+        stale = User.objects.get(pk=self.student.pk)
+        User.objects.adjust_battery([self.student.pk], 15)
+
+        self.client.force_login(self.student)
+        with patch('django.contrib.auth.middleware.get_user', return_value=stale):
+            self.client.post(reverse('users:profile'), {'first_name': 'اسم جديد'})
+
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.first_name, 'اسم جديد')
+        self.assertEqual(self.student.battery_level, 15)
+
+    def test_completion_rewarded_once(self):
+        self.assertTrue(complete_enrollment(self.student.pk, self.lecture.pk, 95))
+        self.assertFalse(complete_enrollment(self.student.pk, self.lecture.pk, 100))
+
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.battery_level, 5)
+
+    def test_battery_is_clamped(self):
+        User.objects.filter(pk=self.student.pk).update(battery_level=98)
+        User.objects.adjust_battery([self.student.pk], 10)
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.battery_level, 100)
+
+        User.objects.adjust_battery([self.student.pk], -500)
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.battery_level, 0)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ChangelistQueryCountTests(TestCase):
+    """Changelist cost must not grow with the number of rows shown"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('01000000001', 'pass', first_name='Admin')
+        self.client.force_login(self.admin)
+        self.students = [
+            User.objects.create_user(f'0101234560{i}', 'pass', first_name='طالب')
+            for i in range(3)
+        ]
+
+    def add_chapters(self, count):
+        for _ in range(count):
+            chapter = Chapter.objects.create(title='فصل', grade=1)
+            for _ in range(2):
+                lecture = make_lecture(chapter=chapter)
+                for student in self.students:
+                    Enrollment.objects.create(student=student, lecture=lecture)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def assert_constant_queries(self, url):
+        self.add_chapters(2)
+        small = self.count_queries(url)
+        self.add_chapters(8)
+        large = self.count_queries(url)
+        self.assertEqual(small, large)
+
+    def test_chapter_changelist(self):
+        self.assert_constant_queries(reverse('admin:courses_chapter_changelist'))
+
+    def test_lecture_changelist(self):
+        self.assert_constant_queries(reverse('admin:courses_lecture_changelist'))
+
+    def test_sorted_by_annotation(self):
+        response = self.client.get(reverse('admin:courses_lecture_changelist'), {'o': '6'})
+        self.assertEqual(response.status_code, 200)
+
+
+@skipIf(connection.vendor == 'sqlite', 'SQLite serializes writers; run against PostgreSQL')
+class ConcurrentBatteryTests(TransactionTestCase):
+
+    def test_no_lost_increments(self):
+        student = User.objects.create_user('01012345679', 'pass', first_name='طالب')
+        workers = 10
+        barrier = threading.Barrier(workers)
+
+        def charge():
+            barrier.wait()
+            User.objects.adjust_battery([student.pk], 1)
+            connection.close()
+
+        threads = [threading.Thread(target=charge) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        student.refresh_from_db()
+        self.assertEqual(student.battery_level, workers)
+
+
+@override_settings(
+    BACKGROUND_TASKS_EAGER=True,
+    VIDEO_DURATION_FETCHER='apps.courses.tests.fake_duration'
+)
+class DurationRefreshTests(TestCase):
+
+    def setUp(self):
+        FETCHED_URLS.clear()
+        self.chapter = Chapter.objects.create(title='الفصل الأول', grade=1)
+
+    def test_lookup_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            lecture = Lecture.objects.create(
+                chapter=self.chapter, title='محاضرة', video_url='https://youtu.be/abc123'
+            )
+        # Nothing fetched during save; the job waits for the commit
+        self.assertEqual(FETCHED_URLS, [])
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(FETCHED_URLS, ['https://youtu.be/abc123'])
+        lecture.refresh_from_db()
+        self.assertEqual(lecture.duration, 42)
+
+    def test_only_a_changed_url_is_looked_up_again(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            lecture = Lecture.objects.create(
+                chapter=self.chapter, title='محاضرة', video_url='https://youtu.be/abc123'
+            )
+        lecture = Lecture.objects.get(pk=lecture.pk)  # loaded via from_db
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lecture.title = 'عنوان جديد'
+            lecture.save()
+        self.assertEqual(FETCHED_URLS, ['https://youtu.be/abc123'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            lecture.video_url = 'https://youtu.be/xyz789'
+            lecture.save()
+        self.assertEqual(FETCHED_URLS, ['https://youtu.be/abc123', 'https://youtu.be/xyz789'])
+
+
+class BackgroundRunnerTests(TestCase):
+
+    @override_settings(BACKGROUND_TASKS_EAGER=False)
+    def test_jobs_run_on_the_pool_and_failures_are_logged(self):
+        done = threading.Event()
+        threads = []
+
+        def job(value):
+            threads.append(threading.current_thread().name)
+            done.set()
+
+        def broken():
+            raise RuntimeError('boom')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            run_in_background(job, 1)
+        self.assertTrue(done.wait(5))
+        self.assertTrue(threads[0].startswith('voltage-bg'))
+
+        with self.assertLogs('apps.courses.background', level='ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                run_in_background(broken)
+            from .background import _get_executor
+            _get_executor().submit(lambda: None).result(5)  # wait for the queue to drain
+
+
+@override_settings(VIDEO_DURATION_FETCHER='apps.courses.tests.scripted_duration')
+class UpdateDurationsResumeTests(TestCase):
+
+    def setUp(self):
+        FETCHED_URLS.clear()
+        DURATIONS.clear()
+        chapter = Chapter.objects.create(title='الفصل الأول', grade=1)
+        self.lectures = [
+            Lecture.objects.create(
+                chapter=chapter, title=f'محاضرة {i}', order=i, video_url=f'https://youtu.be/vid{i}'
+            )
+            for i in range(3)
+        ]
+        checkpoint_dir = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(checkpoint_dir, 'durations.json')
+        self.addCleanup(lambda: os.path.exists(self.checkpoint) and os.remove(self.checkpoint))
+        self.addCleanup(os.rmdir, checkpoint_dir)
+
+    def run_command(self):
+        call_command(
+            'update_durations', workers=1, checkpoint=self.checkpoint, stdout=StringIO()
+        )
+
+    def test_failed_lectures_are_retried_on_resume(self):
+        first, failed, interrupted = self.lectures
+        DURATIONS.update({
+            first.video_url: 10,
+            failed.video_url: 0,  # transient API error
+            interrupted.video_url: KeyboardInterrupt(),
+        })
+        self.run_command()
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)['done'], [first.pk])
+
+        FETCHED_URLS.clear()
+        DURATIONS.update({failed.video_url: 20, interrupted.video_url: 30})
+        self.run_command()
+
+        self.assertEqual(sorted(FETCHED_URLS), [failed.video_url, interrupted.video_url])
+        durations = dict(Lecture.objects.values_list('pk', 'duration'))
+        self.assertEqual(
+            [durations[lecture.pk] for lecture in self.lectures], [10, 20, 30]
+        )
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+
+class CatalogSnapshotTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.first = Chapter.objects.create(title='فصل أولى', grade=1)
+        self.second = Chapter.objects.create(title='فصل تانية', grade=2)
+        make_lecture(chapter=self.first, duration=10)
+
+    def test_catalog_is_one_query_then_cached(self):
+        cache.clear()
+        with self.assertNumQueries(1):
+            catalog = get_catalog(1)
+        self.assertEqual([(c['id'], c['total_duration']) for c in catalog], [(self.first.pk, 10)])
+        with self.assertNumQueries(0):
+            get_catalog(1)
+
+    def test_only_the_changed_grade_is_dropped(self):
+        get_catalog(1)
+        second_grade = get_catalog(2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_lecture(chapter=self.first, duration=5)
+        self.assertIsNone(cache.get(catalog_cache_key(1)))
+        self.assertIsNone(cache.get(catalog_cache_key(None)))
+        self.assertEqual(cache.get(catalog_cache_key(2)), second_grade)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_catalog(1)[0]['total_duration'], 15)
+
+    def test_read_during_the_transaction_is_not_kept(self):
+        get_catalog(1)
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            make_lecture(chapter=self.first, duration=5)
+            # Another request reads (and caches) the catalog before the commit
+            get_catalog(1)
+        for callback in callbacks:
+            callback()
+
+        self.assertIsNone(cache.get(catalog_cache_key(1)))
+
+    def test_chapter_moving_grades_refreshes_both(self):
+        get_catalog(1)
+        get_catalog(2)
+        chapter = Chapter.objects.get(pk=self.first.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            chapter.grade = 2
+            chapter.save()
+        self.assertEqual(get_catalog(1), [])
+        self.assertEqual(len(get_catalog(2)), 2)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class CatalogETagTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user('01012345678', 'pass', first_name='طالب')
+        self.client.force_login(self.student)
+        self.lecture = make_lecture()
+        self.chapter = self.lecture.chapter
+        self.pages = [
+            reverse('courses:chapter_list'),
+            reverse('courses:lecture_list', args=[self.chapter.pk]),
+        ]
+
+    def get(self, url, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(url, **headers)
+
+    def test_matching_etag_gets_304_without_catalog_queries(self):
+        for url in self.pages:
+            with self.subTest(url=url):
+                etag = self.get(url)['ETag']
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.get(url, etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse([q for q in ctx if 'courses_' in q['sql']])
+
+    def test_editing_a_chapter_changes_the_etag(self):
+        etags = [self.get(url)['ETag'] for url in self.pages]
+        with self.captureOnCommitCallbacks(execute=True):
+            Chapter.objects.get(pk=self.chapter.pk).save()
+
+        for url, etag in zip(self.pages, etags):
+            with self.subTest(url=url):
+                response = self.get(url, etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_editing_a_lecture_changes_the_etag(self):
+        etags = [self.get(url)['ETag'] for url in self.pages]
+        with self.captureOnCommitCallbacks(execute=True):
+            lecture = Lecture.objects.get(pk=self.lecture.pk)
+            lecture.title = 'محاضرة معدلة'
+            lecture.save()
+
+        for url, etag in zip(self.pages, etags):
+            with self.subTest(url=url):
+                response = self.get(url, etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+
+class ParseRangeTests(SimpleTestCase):
+
+    def test_parse_range(self):
+        cases = {
+            None: None,
+            '': None,
+            'items=0-5': None,
+            'bytes=0-1, 4-5': None,  # multi-range: send everything
+            'bytes=0-': (0, 9),
+            'bytes=2-5': (2, 5),
+            'bytes=8-100': (8, 9),
+            'bytes=-3': (7, 9),
+            'bytes=-50': (0, 9),
+            'bytes=10-': False,
+            'bytes=5-2': False,
+            'bytes=-0': False,
+            'bytes=-': False,
+            'bytes=abc': False,
+            'bytes=1-2-3': False,
+            'bytes=١-٢': False,  # non-ASCII digits
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 10), expected)
+
+
+class ProtectedDownloadTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.lecture = make_lecture()
+        self.lecture.pdf_file.save('notes.pdf', ContentFile(b'0123456789'))
+        student = User.objects.create_user('01012345678', 'pass', first_name='طالب')
+        Enrollment.objects.create(student=student, lecture=self.lecture)
+        self.client.force_login(student)
+        self.url = reverse('courses:lecture_pdf', args=[self.lecture.pk])
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        self.addCleanup(response.close)
+        return response
+
+    def test_whole_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+    def test_partial_content(self):
+        for header, content_range, body in (
+            ('bytes=0-', 'bytes 0-9/10', b'0123456789'),
+            ('bytes=2-5', 'bytes 2-5/10', b'2345'),
+            ('bytes=-3', 'bytes 7-9/10', b'789'),
+        ):
+            with self.subTest(header=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(body)))
+                self.assertEqual(b''.join(response.streaming_content), body)
+
+    def test_unsatisfiable_or_malformed_range_is_416(self):
+        for header in ('bytes=10-', 'bytes=5-2', 'bytes=abc', 'bytes=-'):
+            with self.subTest(header=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        response = self.get(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='Thu, 01 Jan 1970 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '10')
+
+    def test_web_server_offload(self):
+        with self.settings(PROTECTED_MEDIA_SERVER='nginx', PROTECTED_MEDIA_URL='/protected-media/'):
+            response = self.get(HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.lecture.pdf_file.name}')
+        self.assertEqual(response.content, b'')
+
+        with self.settings(PROTECTED_MEDIA_SERVER='sendfile'):
+            response = self.get()
+        self.assertEqual(response['X-Sendfile'], self.lecture.pdf_file.path)
+        self.assertIn("filename*=UTF-8''notes", response['Content-Disposition'])
+        self.assertEqual(response.content, b'')
+
+
+def make_image(width=800, height=600):
+    from PIL import Image
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'orange').save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue())
+
+
+@override_settings(
+    BACKGROUND_TASKS_EAGER=True,
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+)
+class ThumbnailDerivativeTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.chapter = Chapter.objects.create(title='الفصل الأول', grade=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.chapter.thumbnail.save('cover.png', make_image())
+
+    def test_upload_builds_derivatives(self):
+        self.chapter.refresh_from_db()
+        derivatives = self.chapter.thumbnail_derivatives
+        self.assertEqual(sorted(derivatives), ['jpg', 'webp'])
+        self.assertEqual(sorted(derivatives['webp'], key=int), ['320', '640'])  # never upscaled
+        storage = self.chapter.thumbnail.storage
+        self.assertTrue(all(storage.exists(path) for path in derivatives['jpg'].values()))
+
+    def test_partial_save_keeps_derivatives(self):
+        chapter = Chapter.objects.get(pk=self.chapter.pk)
+        derivatives = chapter.thumbnail_derivatives
+        chapter.title = 'عنوان جديد'
+        chapter.thumbnail = 'chapters/not-saved.png'  # not in update_fields
+        with patch('apps.courses.thumbnails.generate_derivatives') as generate:
+            with self.captureOnCommitCallbacks(execute=True):
+                chapter.save(update_fields=['title'])
+
+        generate.assert_not_called()
+        self.assertEqual(chapter.thumbnail_derivatives, derivatives)
+        self.assertEqual(Chapter.objects.get(pk=self.chapter.pk).thumbnail_derivatives, derivatives)
+
+    def test_new_thumbnail_in_update_fields_rebuilds(self):
+        chapter = Chapter.objects.get(pk=self.chapter.pk)
+        chapter.thumbnail.save('other.png', make_image(400, 300), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            chapter.save(update_fields=['thumbnail'])
+
+        chapter.refresh_from_db()
+        self.assertEqual(sorted(chapter.thumbnail_derivatives['jpg'], key=int), ['320'])
+        self.assertIn('other', chapter.thumbnail_derivatives['jpg']['320'])
+
+    def test_chapter_list_renders_srcset(self):
+        derivatives = Chapter.objects.get(pk=self.chapter.pk).thumbnail_derivatives
+        response = self.client.get(reverse('courses:chapter_list'))
+
+        storage = self.chapter.thumbnail.storage
+        self.assertContains(
+            response,
+            f'srcset="{storage.url(derivatives["webp"]["320"])} 320w, '
+            f'{storage.url(derivatives["webp"]["640"])} 640w"'
+        )
+        self.assertContains(response, f'src="{storage.url(derivatives["jpg"]["320"])}"')
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class EntitlementCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user('01012345678', 'pass', first_name='طالب')
+        self.lecture = make_lecture(price=50)
+        self.client.force_login(self.student)
+
+    def fresh_entitlements(self):
+        # A new request: a new user object with no memoized entitlements
+        return get_entitlements(User.objects.get(pk=self.student.pk))
+
+    def test_checks_are_served_from_the_cache(self):
+        self.fresh_entitlements()
+        student = User.objects.get(pk=self.student.pk)
+        with self.assertNumQueries(0):
+            self.assertFalse(get_entitlements(student).owns(self.lecture.pk))
+
+    def test_activation_code_grants_access(self):
+        version = get_entitlements_version(self.student.pk)
+        self.assertFalse(self.fresh_entitlements().owns(self.lecture.pk))
+
+        ActivationCode.objects.create(code='ABC123', lecture=self.lecture)
+        self.client.post(reverse('users:activate_code'), {'code': 'abc123'})
+
+        self.assertNotEqual(get_entitlements_version(self.student.pk), version)
+        self.assertTrue(self.fresh_entitlements().owns(self.lecture.pk))
+        response = self.client.get(reverse('courses:lecture_detail', args=[self.lecture.pk]))
+        self.assertTemplateNotUsed(response, 'courses/access_denied.html')
+
+    def test_revoked_enrollment_stops_granting_access(self):
+        enrollment = Enrollment.objects.create(student=self.student, lecture=self.lecture)
+        self.assertTrue(self.fresh_entitlements().owns(self.lecture.pk))
+        version = get_entitlements_version(self.student.pk)
+
+        enrollment.delete()
+
+        self.assertNotEqual(get_entitlements_version(self.student.pk), version)
+        self.assertFalse(self.fresh_entitlements().owns(self.lecture.pk))
+        response = self.client.get(reverse('courses:lecture_detail', args=[self.lecture.pk]))
+        self.assertTemplateUsed(response, 'courses/access_denied.html')
+
+
+    def test_read_before_commit_is_not_kept(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            # An admin approves the student inside one transaction...
+            invalidate_entitlements(self.student)
+            # ...while the student's refresh reads the not yet committed state
+            self.assertFalse(self.fresh_entitlements().owns(self.lecture.pk))
+            Enrollment.objects.create(student=self.student, lecture=self.lecture)
+        for callback in callbacks:
+            callback()
+
+        self.assertTrue(self.fresh_entitlements().owns(self.lecture.pk))
+
+class ProgressBufferTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user('01012345678', 'pass', first_name='طالب')
+        self.lecture = make_lecture()
+        Enrollment.objects.create(student=self.student, lecture=self.lecture)
+
+    def progress(self):
+        return Enrollment.objects.get(student=self.student, lecture=self.lecture).progress
+
+    def test_process_local_cache_writes_directly(self):
+        # LocMemCache is private to each process: the flush worker would never see it
+        record_heartbeat(self.student.pk, self.lecture.pk, 30)
+        self.assertEqual(self.progress(), 30)
+        self.assertIsNone(get_buffered_progress(self.student.pk, self.lecture.pk))
+
+    @patch('apps.courses.progress_buffer.cache_is_shared', return_value=True)
+    def test_buffered_max_is_flushed_once(self, _):
+        for value in (30, 20, 50, 40):
+            record_heartbeat(self.student.pk, self.lecture.pk, value)
+        self.assertEqual(get_buffered_progress(self.student.pk, self.lecture.pk), 50)
+        self.assertEqual(self.progress(), 0)
+
+        self.assertEqual(flush_progress(), 1)
+        self.assertEqual(self.progress(), 50)
+        self.assertEqual(flush_progress(), 0)
+
+        # The next heartbeat after a flush is logged again
+        record_heartbeat(self.student.pk, self.lecture.pk, 60)
+        self.assertEqual(flush_progress(), 1)
+        self.assertEqual(self.progress(), 60)
+
+    @patch('apps.courses.progress_buffer.cache_is_shared', return_value=True)
+    def test_concurrent_heartbeats_keep_the_max(self, _):
+        values = list(range(1, 41))
+        barrier = threading.Barrier(len(values))
+
+        def beat(value):
+            barrier.wait()
+            record_heartbeat(self.student.pk, self.lecture.pk, value)
+
+        threads = [threading.Thread(target=beat, args=(value,)) for value in values]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(get_buffered_progress(self.student.pk, self.lecture.pk), 40)
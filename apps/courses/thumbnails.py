@@ -0,0 +1,104 @@
+"""
+Thumbnail derivatives
+نسخ مصغرة من صور الفصول والمحاضرات
+
+After an admin uploads a thumbnail, a background job renders it at a few
+fixed widths in WebP and JPEG and records the paths on the row:
+
+    {'webp': {'320': 'thumbs/chapters/x_320w.webp', ...}, 'jpg': {...}}
+
+Templates turn that into srcset attributes with the filters in
+templatetags/thumbnails.py.
+"""
+import os
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .background import run_in_background
+
+THUMBNAIL_WIDTHS = (320, 640, 960)
+THUMBNAIL_FORMATS = (
+    ('webp', 'WEBP', {'quality': 75, 'method': 6}),
+    ('jpg', 'JPEG', {'quality': 78, 'optimize': True, 'progressive': True}),
+)
+
+
+def derivative_name(name, width, ext):
+    root, _ = os.path.splitext(name)
+    return f'thumbs/{root}_{width}w.{ext}'
+
+
+def generate_derivatives(field_file):
+    """Render every width/format of an image field. Returns the paths dict."""
+    from PIL import Image, ImageOps
+    
+    storage = field_file.storage
+    with field_file.open('rb') as f:
+        image = ImageOps.exif_transpose(Image.open(f))
+        image = image.convert('RGB')
+    
+    # Never upscale; keep at least the smallest width
+    widths = [w for w in THUMBNAIL_WIDTHS if w <= image.width] or [THUMBNAIL_WIDTHS[0]]
+    
+    derivatives = {ext: {} for ext, _, _ in THUMBNAIL_FORMATS}
+    for width in widths:
+        resized = image.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+        for ext, pil_format, options in THUMBNAIL_FORMATS:
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **options)
+            name = derivative_name(field_file.name, width, ext)
+            if storage.exists(name):
+                storage.delete(name)
+            derivatives[ext][str(width)] = storage.save(name, ContentFile(buffer.getvalue()))
+    return derivatives
+
+
+def build_thumbnail_derivatives(model_label, pk, thumbnail_name):
+    """Background job: generate and record derivatives for one row"""
+    from .catalog import invalidate_catalog
+    
+    Model = apps.get_model(model_label)
+    instance = Model.objects.filter(pk=pk, thumbnail=thumbnail_name).first()
+    if instance is None:
+        return  # Deleted or re-uploaded meanwhile; the newer job wins
+    
+    derivatives = generate_derivatives(instance.thumbnail)
+    Model.objects.filter(pk=pk, thumbnail=thumbnail_name).update(
+        thumbnail_derivatives=derivatives,
+        updated_at=timezone.now()
+    )
+    grade = instance.grade if hasattr(instance, 'grade') else instance.chapter.grade
+    invalidate_catalog(grade)
+
+
+def thumbnail_changed(instance):
+    return instance.thumbnail.name != getattr(instance, '_loaded_thumbnail', None)
+
+
+def thumbnail_saved(update_fields):
+    """Whether a save() with these update_fields writes the thumbnail column"""
+    return update_fields is None or 'thumbnail' in update_fields
+
+
+def schedule_thumbnail_derivatives(instance):
+    run_in_background(
+        build_thumbnail_derivatives,
+        instance._meta.label,
+        instance.pk,
+        instance.thumbnail.name
+    )
+
+
+def srcset(derivatives, ext):
+    """'url 320w, url 640w' for one format of a derivatives dict"""
+    from django.core.files.storage import default_storage
+    
+    paths = (derivatives or {}).get(ext) or {}
+    return ', '.join(
+        f'{default_storage.url(path)} {width}w'
+        for width, path in sorted(paths.items(), key=lambda item: int(item[0]))
+    )
@@ -0,0 +1,106 @@
+"""
+Video metadata pipeline
+جلب بيانات الفيديو (المدة) في الخلفية
+
+Lecture.save() never talks to YouTube itself; it queues a lookup here and
+the duration is filled in once the fetcher returns. The fetcher is
+configurable through settings.VIDEO_DURATION_FETCHER so tests and local
+setups can plug in a fake that never touches the network.
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .background import run_in_background
+
+logger = logging.getLogger(__name__)
+
+
+YOUTUBE_ID_PATTERNS = [
+    re.compile(r'youtube(?:-nocookie)?\.com/watch\?(?:.*&)?v=([a-zA-Z0-9_-]+)'),
+    re.compile(r'youtu\.be/([a-zA-Z0-9_-]+)'),
+    re.compile(r'youtube(?:-nocookie)?\.com/(?:embed|shorts|live|v)/([a-zA-Z0-9_-]+)'),
+]
+VIMEO_URL = re.compile(
+    r'vimeo\.com/(?:video/|channels/[\w-]+/|groups/[\w-]+/videos/)?(\d+)'
+    r'(?:/([a-zA-Z0-9]+))?(?:[/?#].*)?$'
+)
+VIMEO_HASH_PARAM = re.compile(r'[?&]h=([a-zA-Z0-9]+)')
+
+
+def extract_youtube_id(url):
+    """Return the YouTube video ID from a watch/short/embed/shorts/live URL, or None"""
+    for pattern in YOUTUBE_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return match.group(1)
+    return None
+
+
+def extract_vimeo_hash(url):
+    """Privacy hash of an unlisted Vimeo URL (vimeo.com/ID/HASH or ?h=HASH), or ''"""
+    match = VIMEO_URL.search(url or '')
+    if match and match.group(2):
+        return match.group(2)
+    match = VIMEO_HASH_PARAM.search(url or '')
+    return match.group(1) if match else ''
+
+
+def parse_video_url(url):
+    """Return (provider, video_id) for a lecture URL; ('other', '') if unknown"""
+    url = url or ''
+    video_id = extract_youtube_id(url)
+    if video_id:
+        return 'youtube', video_id
+    match = VIMEO_URL.search(url)
+    if match:
+        return 'vimeo', match.group(1)
+    return 'other', ''
+
+
+def get_youtube_duration(url):
+    """Fetch video duration from YouTube URL in minutes"""
+    try:
+        from pytube import YouTube
+        
+        video_id = extract_youtube_id(url)
+        if video_id:
+            yt = YouTube(f'https://www.youtube.com/watch?v={video_id}')
+            # Duration is in seconds, convert to minutes
+            duration_minutes = yt.length // 60
+            return max(1, duration_minutes)  # At least 1 minute
+    except Exception:
+        logger.warning('Error fetching YouTube duration for %s', url, exc_info=True)
+    return 0
+
+
+def get_duration_fetcher():
+    """Return the configured callable: url -> duration in minutes (0 on failure)"""
+    return import_string(settings.VIDEO_DURATION_FETCHER)
+
+
+def refresh_lecture_duration(lecture_id, video_url):
+    """Fetch and store the duration for one lecture"""
+    from .catalog import invalidate_catalog
+    from .models import Lecture
+
+    duration = get_duration_fetcher()(video_url)
+    if duration > 0:
+        # Only write if the URL wasn't changed again while we were fetching
+        updated = Lecture.objects.filter(pk=lecture_id, video_url=video_url).update(
+            duration=duration,
+            updated_at=timezone.now()
+        )
+        if updated:
+            invalidate_catalog(
+                Lecture.objects.filter(pk=lecture_id).values_list('chapter__grade', flat=True).first()
+            )
+    return duration
+
+
+def schedule_duration_refresh(lecture):
+    """Queue a duration lookup for a saved lecture"""
+    run_in_background(refresh_lecture_duration, lecture.pk, lecture.video_url)
@@ -1,15 +1,21 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
-from django.utils import timezone
+from django.http import Http404, JsonResponse
+from django.contrib.messages import get_messages
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+import hashlib
 from .models import Chapter, Lecture, Enrollment
+from .catalog import get_catalog, get_catalog_chapter
+from .downloads import serve_protected_file
+from .entitlements import get_entitlements, invalidate_entitlements
+from .progress import COMPLETION_THRESHOLD, complete_enrollment, record_progress
+from .progress_buffer import buffering_enabled, record_heartbeat
 
 
-def chapter_list(request):
-    """عرض قائمة الفصول حسب السنة الدراسية"""
+def _parse_grade(request):
+    """Validate grade - must be a valid number (1, 2, or 3)"""
     grade = request.GET.get('grade', None)
-    
-    # Validate grade - must be a valid number (1, 2, or 3)
     if grade and grade not in ['None', 'null', '']:
         try:
             grade = int(grade)
@@ -19,51 +25,76 @@ def chapter_list(request):
             grade = None
     else:
         grade = None
+    return grade
+
+
+def _page_etag(request, *parts):
+    """
+    ETag for a catalog page: content fingerprint + who is looking.
+    Built only from cached data, so a 304 costs no catalog or
+    enrollment queries. Skipped while flash messages are pending,
+    since a 304 would hide them.
+    """
+    if len(get_messages(request)):
+        return None
+    entitlements = get_entitlements(request.user)
+    key = '|'.join(str(part) for part in parts)
+    key += f'|{request.user.pk}|{entitlements.version}'
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def _chapter_fingerprint(chapter):
+    return f"{chapter['id']}:{chapter['updated_at'].timestamp()}:{chapter['lectures_count']}"
+
+
+def chapter_list_etag(request):
+    grade = _parse_grade(request)
+    chapters = get_catalog(grade)
+    return _page_etag(request, grade, *map(_chapter_fingerprint, chapters))
+
+
+def lecture_list_etag(request, chapter_id):
+    chapter = get_catalog_chapter(chapter_id)
+    if chapter is None:
+        return None
+    return _page_etag(request, _chapter_fingerprint(chapter))
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=chapter_list_etag)
+def chapter_list(request):
+    """عرض قائمة الفصول حسب السنة الدراسية"""
+    grade = _parse_grade(request)
     
-    chapters = Chapter.objects.filter(is_active=True)
-    if grade:
-        chapters = chapters.filter(grade=grade)
+    # Cached snapshot: chapters with lecture counts and total duration
+    chapters = get_catalog(grade)
     
-    # Get user's enrolled lectures if authenticated
-    enrolled_lectures = []
-    if request.user.is_authenticated:
-        enrolled_lectures = list(
-            Enrollment.objects.filter(student=request.user)
-            .values_list('lecture_id', flat=True)
-        )
+    # Get user's enrolled lectures (empty for anonymous users)
+    entitlements = get_entitlements(request.user)
     
     context = {
         'chapters': chapters,
-        'enrolled_lectures': enrolled_lectures,
+        'enrolled_lectures': entitlements.enrolled,
         'selected_grade': grade,
     }
     return render(request, 'courses/chapter_list.html', context)
 
 
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=lecture_list_etag)
 def lecture_list(request, chapter_id):
     """عرض محاضرات فصل معين"""
     chapter = get_object_or_404(Chapter, id=chapter_id, is_active=True)
     lectures = chapter.lectures.filter(is_active=True)
     
     # Get user's enrolled and completed lectures
-    enrolled_ids = []
-    completed_ids = []
-    if request.user.is_authenticated:
-        enrollments = Enrollment.objects.filter(
-            student=request.user,
-            lecture__chapter=chapter
-        )
-        enrolled_ids = list(enrollments.values_list('lecture_id', flat=True))
-        completed_ids = list(
-            enrollments.filter(is_completed=True)
-            .values_list('lecture_id', flat=True)
-        )
+    entitlements = get_entitlements(request.user)
     
     context = {
         'chapter': chapter,
         'lectures': lectures,
-        'enrolled_ids': enrolled_ids,
-        'completed_ids': completed_ids,
+        'enrolled_ids': entitlements.enrolled,
+        'completed_ids': entitlements.completed,
     }
     return render(request, 'courses/lecture_list.html', context)
 
@@ -74,32 +105,27 @@ def lecture_detail(request, lecture_id):
     lecture = get_object_or_404(Lecture, id=lecture_id, is_active=True)
     
     # Check if user has access
-    if not lecture.is_free:
-        enrollment = Enrollment.objects.filter(
-            student=request.user,
-            lecture=lecture
-        ).first()
-        
-        if not enrollment:
+    entitlements = get_entitlements(request.user)
+    if not entitlements.owns(lecture.id):
+        if not lecture.is_free:
             # User doesn't have access
             return render(request, 'courses/access_denied.html', {
                 'lecture': lecture
             })
-    else:
+        
         # Create enrollment for free lectures
-        enrollment, _ = Enrollment.objects.get_or_create(
+        _, created = Enrollment.objects.get_or_create(
             student=request.user,
             lecture=lecture
         )
+        if created:
+            invalidate_entitlements(request.user)
     
     # Check if there's a quiz for this lecture
     quiz = lecture.quizzes.first() if hasattr(lecture, 'quizzes') else None
     
     context = {
         'lecture': lecture,
-        'enrollment': enrollment if not lecture.is_free else Enrollment.objects.filter(
-            student=request.user, lecture=lecture
-        ).first(),
         'quiz': quiz,
         # For watermark
         'student_phone': request.user.phone_number,
@@ -107,37 +133,44 @@ def lecture_detail(request, lecture_id):
     return render(request, 'courses/video_player.html', context)
 
 
+@login_required
+def lecture_pdf(request, lecture_id):
+    """تحميل ملزمة المحاضرة للطلاب المشتركين فقط"""
+    lecture = get_object_or_404(Lecture, id=lecture_id, is_active=True)
+    
+    if not get_entitlements(request.user).can_watch(lecture):
+        return render(request, 'courses/access_denied.html', {
+            'lecture': lecture
+        })
+    if not lecture.pdf_file:
+        raise Http404('لا توجد ملزمة لهذه المحاضرة')
+    
+    return serve_protected_file(request, lecture.pdf_file, content_type='application/pdf')
+
+
 @login_required
 def update_progress(request, lecture_id):
     """تحديث نسبة مشاهدة الفيديو (AJAX)"""
     if request.method == 'POST':
-        lecture = get_object_or_404(Lecture, id=lecture_id)
-        progress = int(request.POST.get('progress', 0))
+        progress = min(int(request.POST.get('progress', 0)), 100)
         
-        enrollment = Enrollment.objects.filter(
-            student=request.user,
-            lecture=lecture
-        ).first()
-        
-        if enrollment:
-            enrollment.progress = min(progress, 100)
-            if progress >= 90 and not enrollment.is_completed:
-                enrollment.is_completed = True
-                enrollment.completed_at = timezone.now()
-                
-                # Update user battery level
-                request.user.battery_level = min(
-                    request.user.battery_level + 5,
-                    100
-                )
-                request.user.save()
-            
-            enrollment.save()
+        entitlements = get_entitlements(request.user)
+        if entitlements.owns(lecture_id):
+            completed = lecture_id in entitlements.completed
+            if progress >= COMPLETION_THRESHOLD and not completed:
+                if complete_enrollment(request.user.pk, lecture_id, progress):
+                    invalidate_entitlements(request.user)
+                completed = True
+            elif buffering_enabled():
+                # Regular heartbeat - buffered, flushed to the DB in batches
+                progress = record_heartbeat(request.user.pk, lecture_id, progress)
+            else:
+                record_progress(request.user.pk, lecture_id, progress)
             
             return JsonResponse({
                 'success': True,
-                'progress': enrollment.progress,
-                'completed': enrollment.is_completed
+                'progress': progress,
+                'completed': completed
             })
     
     return JsonResponse({'success': False}, status=400)
@@ -1,5 +1,17 @@
-from django.contrib import admin
-from .models import Quiz, Question, StudentResult
+from django.contrib import admin, messages
+from django.db.models import Count
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from .answer_keys import compile_answer_key, get_answer_key
+from .exports import stream_csv, stream_xlsx
+from .forms import AnswerSheetUploadForm, QuestionImportForm
+from .models import Quiz, Question, QuestionStat, StudentResult
+from .paper_grading import AnswerSheetError, grade_answer_sheet, read_answer_sheet
+from .question_io import (
+    QUESTION_FIELDS, QuestionImportError, export_questions, import_questions, read_question_file
+)
 
 
 class QuestionInline(admin.StackedInline):
@@ -17,7 +29,7 @@ class QuestionInline(admin.StackedInline):
             'classes': ('collapse-open',)
         }),
         ('الإجابة الصحيحة', {
-            'fields': ('correct_answer', 'points', 'explanation'),
+            'fields': ('correct_answer', 'points', 'tag', 'explanation'),
         }),
     )
 
@@ -40,7 +52,9 @@ class QuizAdmin(admin.ModelAdmin):
         'is_active'
     ]
     search_fields = ['title', 'lecture__title']
+    list_select_related = ['lecture__chapter']
     inlines = [QuestionInline]
+    change_form_template = 'admin/exams/quiz/change_form.html'
     
     fieldsets = (
         ('بيانات الامتحان', {
@@ -55,19 +69,142 @@ class QuizAdmin(admin.ModelAdmin):
                 'show_answers'
             )
         }),
+        ('بنك الأسئلة', {
+            'fields': ('questions_per_attempt', 'sampling_strata'),
+            'description': 'اسحب عدداً محدداً من الأسئلة لكل طالب بدلاً من عرض كل الأسئلة'
+        }),
         ('الحالة', {
             'fields': ('is_active',)
         }),
     )
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            _questions_count=Count('questions')
+        )
+    
+    def questions_count(self, obj):
+        return obj._questions_count
+    questions_count.short_description = 'عدد الأسئلة'
+    questions_count.admin_order_field = '_questions_count'
+    
+    def get_urls(self):
+        urls = [
+            path(
+                '<int:quiz_id>/grade-sheet/',
+                self.admin_site.admin_view(self.grade_sheet_view),
+                name='exams_quiz_grade_sheet'
+            ),
+            path(
+                '<int:quiz_id>/import-questions/',
+                self.admin_site.admin_view(self.import_questions_view),
+                name='exams_quiz_import_questions'
+            ),
+            path(
+                '<int:quiz_id>/export-questions/',
+                self.admin_site.admin_view(self.export_questions_view),
+                name='exams_quiz_export_questions'
+            ),
+        ]
+        return urls + super().get_urls()
+    
+    def import_questions_view(self, request, quiz_id):
+        """استيراد الأسئلة من ملف JSON / CSV / ZIP"""
+        quiz = get_object_or_404(Quiz.objects.select_related('lecture'), pk=quiz_id)
+        if not self.has_change_permission(request, quiz):
+            return redirect('admin:exams_quiz_changelist')
+        
+        import_errors = []
+        form = QuestionImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            try:
+                rows, images = read_question_file(form.cleaned_data['questions_file'])
+                count = import_questions(quiz, rows, images, replace=form.cleaned_data['replace'])
+            except QuestionImportError as e:
+                import_errors = e.errors
+            else:
+                self.message_user(request, f'تم استيراد {count} سؤال ✅')
+                return redirect('admin:exams_quiz_change', quiz.pk)
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'استيراد الأسئلة: {quiz.title}',
+            'quiz': quiz,
+            'form': form,
+            'fields': QUESTION_FIELDS,
+            'import_errors': import_errors,
+        }
+        return TemplateResponse(request, 'admin/exams/quiz/import_questions.html', context)
+    
+    def export_questions_view(self, request, quiz_id):
+        """تصدير أسئلة الامتحان"""
+        quiz = get_object_or_404(Quiz, pk=quiz_id)
+        if not self.has_view_or_change_permission(request, quiz):
+            return redirect('admin:exams_quiz_changelist')
+        
+        filename, content_type, data = export_questions(quiz, request.GET.get('format', 'json'))
+        response = HttpResponse(data, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
+    def grade_sheet_view(self, request, quiz_id):
+        """رفع شيت إجابات امتحان ورقي وتصحيحه"""
+        quiz = get_object_or_404(Quiz.objects.select_related('lecture'), pk=quiz_id)
+        if not self.has_change_permission(request, quiz):
+            return redirect('admin:exams_quiz_changelist')
+        
+        form = AnswerSheetUploadForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            try:
+                rows = read_answer_sheet(form.cleaned_data['sheet'])
+            except AnswerSheetError as e:
+                form.add_error('sheet', str(e))
+            else:
+                summary = grade_answer_sheet(quiz, rows)
+                self.message_user(
+                    request,
+                    f"تم تصحيح {summary['graded']} طالب (ناجح: {summary['passed']}) ✅"
+                )
+                if summary['unknown']:
+                    self.message_user(
+                        request,
+                        f"أرقام غير مسجلة ({len(summary['unknown'])}): "
+                        + '، '.join(summary['unknown'][:20]),
+                        messages.WARNING
+                    )
+                if summary['skipped']:
+                    self.message_user(
+                        request,
+                        "صفوف تم تجاهلها (رقم غير صالح أو مكرر): "
+                        + '، '.join(map(str, summary['skipped'][:20])),
+                        messages.WARNING
+                    )
+                return redirect('admin:exams_quiz_change', quiz.pk)
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'تصحيح امتحان ورقي: {quiz.title}',
+            'quiz': quiz,
+            'questions_count': len(get_answer_key(quiz)),
+            'form': form,
+        }
+        return TemplateResponse(request, 'admin/exams/quiz/grade_sheet.html', context)
 
 
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     """Admin for Questions (standalone view)"""
     
-    list_display = ['order', 'text_preview', 'quiz', 'has_image', 'correct_answer', 'points']
-    list_filter = ['quiz__lecture__chapter__grade', 'quiz']
+    list_display = [
+        'order', 'text_preview', 'quiz', 'has_image', 'correct_answer', 'points',
+        'p_value', 'discrimination', 'distractors'
+    ]
+    list_filter = ['quiz__lecture__chapter__grade', 'quiz', 'tag']
     search_fields = ['text', 'quiz__title']
+    list_select_related = ['quiz__lecture', 'stat']
+    readonly_fields = ['attempts', 'p_value', 'discrimination', 'distractors']
     
     fieldsets = (
         ('السؤال', {
@@ -77,10 +214,50 @@ class QuestionAdmin(admin.ModelAdmin):
             'fields': (('option_a', 'option_b'), ('option_c', 'option_d')),
         }),
         ('الإجابة الصحيحة', {
-            'fields': ('correct_answer', 'points', 'explanation'),
+            'fields': ('correct_answer', 'points', 'tag', 'explanation'),
+        }),
+        ('تحليل السؤال', {
+            'fields': ('attempts', 'p_value', 'discrimination', 'distractors'),
+            'description': 'يتم تحديثه تلقائياً مع كل نتيجة جديدة'
         }),
     )
     
+    def _stat(self, obj):
+        try:
+            return obj.stat
+        except QuestionStat.DoesNotExist:
+            return None
+    
+    def attempts(self, obj):
+        stat = self._stat(obj)
+        return stat.attempts if stat else 0
+    attempts.short_description = 'عدد المحاولات'
+    
+    def p_value(self, obj):
+        stat = self._stat(obj)
+        if not stat or stat.p_value is None:
+            return '-'
+        return f"{stat.p_value:.0%}"
+    p_value.short_description = 'السهولة'
+    
+    def discrimination(self, obj):
+        stat = self._stat(obj)
+        if not stat or stat.discrimination is None:
+            return '-'
+        return f"{stat.discrimination:.2f}"
+    discrimination.short_description = 'التمييز'
+    
+    def distractors(self, obj):
+        stat = self._stat(obj)
+        if not stat or not stat.attempts:
+            return '-'
+        labels = dict(Question.ANSWER_CHOICES, blank='فارغ')
+        return ' | '.join(
+            f"{labels[option]}{'✓' if option == obj.correct_answer else ''} {share:.0%}"
+            for option, share in stat.distractors.items()
+        )
+    distractors.short_description = 'توزيع الاختيارات'
+    
     def text_preview(self, obj):
         return obj.text[:80] + "..." if len(obj.text) > 80 else obj.text
     text_preview.short_description = 'السؤال'
@@ -127,6 +304,9 @@ class StudentResultAdmin(admin.ModelAdmin):
         'percentage',
         'passed',
         'time_taken',
+        'question_ids',
+        'answer_string',
+        'correct_mask',
         'answers_data',
         'started_at',
         'completed_at'
@@ -141,14 +321,35 @@ class StudentResultAdmin(admin.ModelAdmin):
     time_display.short_description = 'الوقت'
     
     # Actions for bulk operations
-    actions = ['export_results']
+    actions = ['export_results', 'export_results_with_answers', 'export_results_xlsx']
+    
+    def _question_ids(self, request, queryset):
+        """Question columns only make sense when every row is the same quiz"""
+        quiz_ids = list(queryset.order_by().values_list('quiz_id', flat=True).distinct()[:2])
+        if len(quiz_ids) != 1:
+            self.message_user(
+                request,
+                'إجابات الأسئلة تُصدَّر لامتحان واحد فقط - تم التصدير بدونها',
+                messages.WARNING
+            )
+            return None
+        return compile_answer_key(quiz_ids[0]).question_ids.tolist()
     
     def export_results(self, request, queryset):
         """Export results to CSV"""
-        # This can be expanded to export to Excel
-        pass
+        return stream_csv(queryset)
     export_results.short_description = "تصدير النتائج المحددة"
     
+    def export_results_with_answers(self, request, queryset):
+        """Export results to CSV with one column per question"""
+        return stream_csv(queryset, self._question_ids(request, queryset))
+    export_results_with_answers.short_description = "تصدير النتائج مع إجابات كل سؤال"
+    
+    def export_results_xlsx(self, request, queryset):
+        """Export results to Excel"""
+        return stream_xlsx(queryset, self._question_ids(request, queryset))
+    export_results_xlsx.short_description = "تصدير النتائج Excel"
+    
     def get_queryset(self, request):
         return super().get_queryset(request).select_related(
             'student', 'quiz', 'quiz__lecture'
@@ -0,0 +1,113 @@
+"""
+Compiled answer keys
+مفاتيح الإجابة المجمعة للتصحيح
+
+A quiz's questions are compiled once into parallel numpy arrays (question
+ids, correct option codes, points) and cached under the quiz's
+questions_version, which is bumped whenever a Question is saved or deleted.
+Grading a submission is then a single vectorized comparison with no
+Question queries.
+"""
+import numpy as np
+from django.core.cache import cache
+from django.db.models import F
+
+from .compact import UNANSWERED, encode_answer, pack_answers, pack_mask, unpack_answers
+from .models import Question, Quiz
+
+ANSWER_KEY_TIMEOUT = 60 * 60 * 24
+
+
+class AnswerKey:
+    """Question ids, correct option codes, points and tags in question order"""
+
+    __slots__ = ('question_ids', 'answers', 'points', 'tags')
+
+    def __init__(self, question_ids, answers, points, tags):
+        self.question_ids = question_ids
+        self.answers = answers
+        self.points = points
+        self.tags = tags
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    @property
+    def total_points(self):
+        return int(self.points.sum())
+
+    def subset(self, question_ids):
+        """
+        Key for the questions drawn for one attempt, in the given order.
+        Ids no longer in the quiz are dropped.
+        """
+        position = {qid: i for i, qid in enumerate(self.question_ids.tolist())}
+        index = np.array([position[qid] for qid in question_ids if qid in position], dtype=np.intp)
+        return AnswerKey(
+            self.question_ids[index], self.answers[index], self.points[index], self.tags[index]
+        )
+
+    def encode_submission(self, data, prefix='question_'):
+        """Read one answer per question from a QueryDict/dict into a code array"""
+        return np.fromiter(
+            (encode_answer(data.get(f'{prefix}{qid}')) for qid in self.question_ids.tolist()),
+            dtype=np.int8,
+            count=len(self),
+        )
+
+    def decode(self, answer_string):
+        """Code array from a packed answer string; blanks if it doesn't line up"""
+        codes = unpack_answers(answer_string or '')
+        if len(codes) != len(self):
+            return np.full(len(self), UNANSWERED, dtype=np.int8)
+        return codes
+
+    def grade(self, submitted):
+        """
+        Compare a code array against the key.
+        Returns (correct mask, correct count, score).
+        """
+        correct = submitted == self.answers
+        return correct, int(correct.sum()), int(self.points[correct].sum())
+
+    def compact_fields(self, submitted, correct):
+        """StudentResult field values for one graded submission"""
+        return {
+            'question_ids': self.question_ids.tolist(),
+            'answer_string': pack_answers(submitted.tolist()),
+            'correct_mask': pack_mask(correct),
+        }
+
+
+def compile_answer_key(quiz_id):
+    rows = list(
+        Question.objects.filter(quiz_id=quiz_id)
+        .order_by('order', 'id')
+        .values_list('id', 'correct_answer', 'points', 'tag')
+    )
+    return AnswerKey(
+        np.array([row[0] for row in rows], dtype=np.int64),
+        np.array([encode_answer(row[1]) for row in rows], dtype=np.int8),
+        np.array([row[2] for row in rows], dtype=np.int32),
+        np.array([row[3] for row in rows], dtype=object),
+    )
+
+
+def answer_key_cache_key(quiz):
+    # 'k2': keys cached before tags were added lack that slot
+    return f'exams:answer_key:k2:{quiz.pk}:v{quiz.questions_version}'
+
+
+def get_answer_key(quiz):
+    """Return the quiz's AnswerKey, compiling it on a cache miss"""
+    key = answer_key_cache_key(quiz)
+    answer_key = cache.get(key)
+    if answer_key is None:
+        answer_key = compile_answer_key(quiz.pk)
+        cache.set(key, answer_key, ANSWER_KEY_TIMEOUT)
+    return answer_key
+
+
+def bump_questions_version(quiz_id):
+    """Invalidate every cached artifact derived from the quiz's questions"""
+    Quiz.objects.filter(pk=quiz_id).update(questions_version=F('questions_version') + 1)
@@ -5,3 +5,6 @@ class ExamsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.exams'
     verbose_name = 'إدارة الامتحانات'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,73 @@
+"""
+Quiz attempt accounting
+حساب محاولات الطالب في الامتحان
+
+Each (student, quiz) pair has one QuizAttemptCounter row. Checking the
+remaining attempts is a single indexed lookup, and claiming one is a
+conditional UPDATE (used < max_attempts), so two simultaneous submits can
+never both take the last attempt. Call claim_attempt() inside the same
+transaction that writes the StudentResult.
+"""
+from django.db.models import F
+
+from .models import QuizAttemptCounter
+
+
+def get_attempt_counts(student_id, quiz_id):
+    """(attempts used, next attempt_number) in one indexed lookup"""
+    row = QuizAttemptCounter.objects.filter(
+        student_id=student_id, quiz_id=quiz_id
+    ).values_list('used', 'last_number').first()
+    used, last_number = row or (0, 0)
+    return used, last_number + 1
+
+
+def get_attempts_used(student_id, quiz_id):
+    return get_attempt_counts(student_id, quiz_id)[0]
+
+
+def _ensure_counters(student_ids, quiz_id):
+    QuizAttemptCounter.objects.bulk_create(
+        [QuizAttemptCounter(student_id=student_id, quiz_id=quiz_id) for student_id in student_ids],
+        ignore_conflicts=True
+    )
+
+
+def claim_attempt(student_id, quiz, attempt_number=None):
+    """
+    Take one attempt if any are left.
+    Returns the new attempt_number, or None when max_attempts is reached.
+    With attempt_number, only that exact attempt can be claimed, so an
+    attempt token cannot be submitted twice.
+    """
+    _ensure_counters([student_id], quiz.pk)
+    counters = QuizAttemptCounter.objects.filter(student_id=student_id, quiz_id=quiz.pk)
+    available = counters.filter(used__lt=quiz.max_attempts)
+    if attempt_number is not None:
+        available = available.filter(last_number=attempt_number - 1)
+    claimed = available.update(
+        used=F('used') + 1,
+        last_number=F('last_number') + 1
+    )
+    if not claimed:
+        return None
+    # The UPDATE holds the row lock until commit, so this read is our own value
+    return counters.values_list('last_number', flat=True).get()
+
+
+def claim_attempts_bulk(student_ids, quiz_id):
+    """
+    Take one attempt for every student regardless of max_attempts
+    (in-center paper exams). Returns {student_id: attempt_number}.
+    """
+    _ensure_counters(student_ids, quiz_id)
+    counters = QuizAttemptCounter.objects.filter(student_id__in=student_ids, quiz_id=quiz_id)
+    counters.update(used=F('used') + 1, last_number=F('last_number') + 1)
+    return dict(counters.values_list('student_id', 'last_number'))
+
+
+def release_attempt(student_id, quiz_id):
+    """Give an attempt back, e.g. when an admin deletes a result"""
+    QuizAttemptCounter.objects.filter(
+        student_id=student_id, quiz_id=quiz_id, used__gt=0
+    ).update(used=F('used') - 1)
@@ -0,0 +1,50 @@
+"""
+Compact answer encoding
+تخزين مضغوط لإجابات الطالب
+
+Answers are stored as one character per question ('a'-'d', '-' when left
+blank) aligned to a list of question ids, plus a hex bitmask of the
+correct ones. A 50-question attempt takes ~300 bytes instead of the
+several KB of the per-question answers_data dict.
+"""
+import numpy as np
+
+OPTIONS = 'abcd'
+BLANK = '-'
+UNANSWERED = -1
+OPTION_CODES = {letter: code for code, letter in enumerate(OPTIONS)}
+
+# byte value → option code, for decoding whole answer strings at once
+_BYTE_CODES = np.full(256, UNANSWERED, dtype=np.int8)
+for _code, _letter in enumerate(OPTIONS):
+    _BYTE_CODES[ord(_letter)] = _code
+
+
+def encode_answer(answer):
+    """'a'..'d' → 0..3, anything else → UNANSWERED"""
+    return OPTION_CODES.get((answer or '').strip().lower(), UNANSWERED)
+
+
+def decode_answer(code):
+    return OPTIONS[code] if 0 <= code < len(OPTIONS) else ''
+
+
+def pack_answers(codes):
+    """Option codes → 'ab-d...'"""
+    return ''.join(OPTIONS[code] if 0 <= code < len(OPTIONS) else BLANK for code in codes)
+
+
+def unpack_answers(answer_string):
+    """'ab-d...' → int8 array of option codes"""
+    return _BYTE_CODES[np.frombuffer(answer_string.encode('ascii'), dtype=np.uint8)]
+
+
+def pack_mask(correct):
+    """Boolean array → hex string, one bit per question"""
+    return np.packbits(np.asarray(correct, dtype=bool)).tobytes().hex()
+
+
+def unpack_mask(mask, count):
+    """Hex string → boolean array of length count"""
+    bits = np.unpackbits(np.frombuffer(bytes.fromhex(mask), dtype=np.uint8), count=count)
+    return bits.astype(bool)
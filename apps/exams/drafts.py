@@ -0,0 +1,78 @@
+"""
+Quiz autosave
+الحفظ التلقائي لإجابات الامتحان
+
+Each click autosaves the whole answer vector (one letter per question, in
+answer-key order) to the cache under (student, quiz). At most once every
+DRAFT_FLUSH_INTERVAL seconds the draft is also copied to a QuizDraft row,
+so answers survive a cache restart without a DB write per click.
+
+The draft also keeps the attempt token issued by quiz_take, so reopening
+the quiz resumes the same attempt (same start time and question order)
+instead of restarting the clock.
+"""
+from django.core.cache import cache
+
+from .models import QuizDraft
+
+DRAFT_TIMEOUT = 6 * 60 * 60
+DRAFT_FLUSH_INTERVAL = 60
+
+
+def _draft_key(student_id, quiz_id):
+    return f'exams:draft:{student_id}:{quiz_id}'
+
+
+def _flush_key(student_id, quiz_id):
+    return f'exams:draft:flushed:{student_id}:{quiz_id}'
+
+
+def save_draft(student_id, quiz, attempt_number, token, answer_string='', durable=False):
+    """Store the draft in the cache; copy it to the DB when due (or forced)"""
+    draft = {
+        'attempt': attempt_number,
+        'token': token,
+        'answers': answer_string,
+        'version': quiz.questions_version,
+    }
+    cache.set(_draft_key(student_id, quiz.pk), draft, DRAFT_TIMEOUT)
+    
+    # add() succeeds at most once per interval: that request does the write
+    if durable or cache.add(_flush_key(student_id, quiz.pk), 1, DRAFT_FLUSH_INTERVAL):
+        QuizDraft.objects.update_or_create(
+            student_id=student_id,
+            quiz_id=quiz.pk,
+            defaults={
+                'attempt_number': attempt_number,
+                'token': token,
+                'answer_string': answer_string,
+                'questions_version': quiz.questions_version,
+            }
+        )
+    return draft
+
+
+def get_draft(student_id, quiz):
+    """Return the draft dict for the student's open attempt, or None"""
+    draft = cache.get(_draft_key(student_id, quiz.pk))
+    if draft is None:
+        row = QuizDraft.objects.filter(student_id=student_id, quiz_id=quiz.pk).first()
+        if row is None:
+            return None
+        draft = {
+            'attempt': row.attempt_number,
+            'token': row.token,
+            'answers': row.answer_string,
+            'version': row.questions_version,
+        }
+        cache.set(_draft_key(student_id, quiz.pk), draft, DRAFT_TIMEOUT)
+    
+    if draft['version'] != quiz.questions_version:
+        # Questions changed mid-attempt; the vector no longer lines up
+        draft = dict(draft, answers='')
+    return draft
+
+
+def discard_draft(student_id, quiz_id):
+    cache.delete_many([_draft_key(student_id, quiz_id), _flush_key(student_id, quiz_id)])
+    QuizDraft.objects.filter(student_id=student_id, quiz_id=quiz_id).delete()
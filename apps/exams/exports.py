@@ -0,0 +1,120 @@
+"""
+Result exports
+تصدير النتائج CSV / Excel
+
+Rows are read with queryset.iterator() and written out one at a time, so
+memory stays flat whatever the number of results. CSV is streamed straight
+to the client; XLSX is written by openpyxl in write-only mode to a
+temporary file that is then streamed back.
+"""
+import csv
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+EXPORT_CHUNK_SIZE = 2000
+
+HEADER = [
+    'الطالب', 'رقم الهاتف', 'رقم ولي الأمر', 'الصف', 'المحافظة',
+    'الامتحان', 'رقم المحاولة', 'الدرجة', 'الإجابات الصحيحة', 'عدد الأسئلة',
+    'النسبة المئوية', 'الحالة', 'الوقت (ثانية)', 'تاريخ التسليم',
+]
+
+
+# A cell starting with one of these is run as a formula by Excel/Sheets
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def escape_formula(value):
+    """Prefix student/admin-entered text that would start a formula with '"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class Echo:
+    """File-like object whose write() just returns the value, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def export_queryset(queryset):
+    return queryset.select_related(None).select_related('student', 'quiz').only(
+        'score', 'correct_answers', 'total_questions', 'percentage', 'passed',
+        'time_taken', 'attempt_number', 'completed_at',
+        'question_ids', 'answer_string', 'correct_mask', 'answers_data',
+        'student__first_name', 'student__last_name', 'student__phone_number',
+        'student__parent_phone', 'student__grade', 'student__governorate',
+        'quiz__title',
+    ).order_by('pk')
+
+
+def iter_result_rows(queryset, question_ids=None):
+    """Header + one row per result; question_ids adds a column per question"""
+    header = list(HEADER)
+    if question_ids:
+        header += [f'س{i}' for i in range(1, len(question_ids) + 1)]
+    yield header
+
+    for result in export_queryset(queryset).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        student = result.student
+        completed_at = timezone.localtime(result.completed_at) if result.completed_at else None
+        row = [
+            escape_formula(student.get_full_name() or student.first_name),
+            escape_formula(student.phone_number),
+            escape_formula(student.parent_phone or ''),
+            student.get_grade_display() if student.grade else '',
+            student.get_governorate_display(),
+            escape_formula(result.quiz.title),
+            result.attempt_number,
+            result.score,
+            result.correct_answers,
+            result.total_questions,
+            float(result.percentage),
+            'ناجح' if result.passed else 'راسب',
+            result.time_taken,
+            completed_at.strftime('%Y-%m-%d %H:%M') if completed_at else '',
+        ]
+        if question_ids:
+            answers = result.get_answers()
+            row += [answers.get(qid, ('', False))[0] for qid in question_ids]
+        yield row
+
+
+def _filename(extension):
+    return f"results-{timezone.localdate():%Y%m%d}.{extension}"
+
+
+def stream_csv(queryset, question_ids=None):
+    writer = csv.writer(Echo())
+
+    def rows():
+        yield '\ufeff'  # BOM so Excel opens Arabic text correctly
+        for row in iter_result_rows(queryset, question_ids):
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(rows(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{_filename("csv")}"'
+    return response
+
+
+def stream_xlsx(queryset, question_ids=None):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('النتائج')
+    for row in iter_result_rows(queryset, question_ids):
+        sheet.append(row)
+
+    # Anonymous temp file: removed as soon as FileResponse closes it
+    output = tempfile.TemporaryFile(suffix='.xlsx')
+    workbook.save(output)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=_filename('xlsx'),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
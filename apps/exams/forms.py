@@ -0,0 +1,21 @@
+from django import forms
+
+
+class AnswerSheetUploadForm(forms.Form):
+    """رفع شيت إجابات امتحان ورقي"""
+    sheet = forms.FileField(
+        label='شيت الإجابات',
+        help_text='CSV أو XLSX: رقم الهاتف في العمود الأول ثم إجابة كل سؤال بالترتيب (a/b/c/d)'
+    )
+
+
+class QuestionImportForm(forms.Form):
+    """استيراد أسئلة من ملف"""
+    questions_file = forms.FileField(
+        label='ملف الأسئلة',
+        help_text='JSON أو CSV، أو ZIP يحتوي على الملف والصور'
+    )
+    replace = forms.BooleanField(
+        label='حذف الأسئلة الحالية واستبدالها',
+        required=False
+    )
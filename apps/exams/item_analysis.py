@@ -0,0 +1,145 @@
+"""
+Item analysis
+تحليل الأسئلة: معامل السهولة والتمييز وتوزيع الاختيارات
+
+Each QuestionStat row keeps running sums (attempts, correct answers, option
+counts, and sums of the students' total percentage). New results are added
+with a single UPDATE per batch, a deleted result is taken back out the same
+way, and the rebuild_item_stats command recomputes every row from
+StudentResult with NumPy. Questions a student was not given
+(question-bank draws, or added after the attempt) are NOT_SEEN and are left
+out of that question's sums rather than counted as blank.
+"""
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, F, FloatField, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .answer_keys import compile_answer_key
+from .compact import OPTIONS, UNANSWERED, encode_answer, unpack_answers
+from .models import QuestionStat, StudentResult
+
+COUNT_FIELDS = ('attempts', 'correct', 'count_a', 'count_b', 'count_c', 'count_d', 'count_blank')
+SUM_FIELDS = ('score_sum', 'score_sq_sum', 'correct_score_sum')
+NOT_SEEN = -2
+
+
+def compute_item_sums(answer_key, codes, scores):
+    """
+    Column sums for an (n students × q questions) matrix of answer codes
+    and the students' percentages. Returns {field: array of length q}.
+    """
+    codes = np.asarray(codes, dtype=np.int8).reshape(-1, len(answer_key))
+    return _column_sums(codes, codes == answer_key.answers, scores)
+
+
+def _column_sums(codes, correct, scores):
+    scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+    seen = codes != NOT_SEEN
+
+    sums = {
+        'attempts': seen.sum(axis=0),
+        'correct': correct.sum(axis=0),
+        'count_blank': (codes == UNANSWERED).sum(axis=0),
+        'score_sum': scores @ seen,
+        'score_sq_sum': (scores ** 2) @ seen,
+        'correct_score_sum': scores @ correct,
+    }
+    for code, letter in enumerate(OPTIONS):
+        sums[f'count_{letter}'] = (codes == code).sum(axis=0)
+    return sums
+
+
+def _increment(field, question_ids, values, sign=1):
+    output_field = IntegerField() if field in COUNT_FIELDS else FloatField()
+    values = [sign * v for v in values.tolist()]
+    if len(set(values)) == 1:
+        delta = Value(values[0], output_field=output_field)
+    else:
+        delta = Case(
+            *[When(question_id=qid, then=Value(v)) for qid, v in zip(question_ids, values)],
+            default=Value(0),
+            output_field=output_field
+        )
+    if sign < 0:
+        # Never below zero, even if the stats were rebuilt without this result
+        return Greatest(F(field) + delta, Value(0, output_field=output_field))
+    return F(field) + delta
+
+
+def _apply_sums(question_ids, sums, sign=1):
+    QuestionStat.objects.filter(question_id__in=question_ids).update(
+        updated_at=timezone.now(),
+        **{
+            field: _increment(field, question_ids, sums[field], sign)
+            for field in COUNT_FIELDS + SUM_FIELDS
+        }
+    )
+
+
+def record_item_stats(answer_key, codes, scores):
+    """Add one or more graded submissions to the questions' running stats"""
+    if not len(answer_key) or not np.size(codes):
+        return
+    sums = compute_item_sums(answer_key, codes, scores)
+    question_ids = answer_key.question_ids.tolist()
+
+    QuestionStat.objects.bulk_create(
+        [QuestionStat(question_id=qid) for qid in question_ids],
+        ignore_conflicts=True
+    )
+    _apply_sums(question_ids, sums)
+
+
+def remove_item_stats(result):
+    """
+    Take a deleted result back out of its questions' stats, using the
+    questions it was given and the correctness stored when it was graded
+    """
+    answers = result.get_answers()
+    if not answers:
+        return
+    question_ids = list(answers)
+    codes = np.array([[encode_answer(answer) for answer, _ in answers.values()]], dtype=np.int8)
+    correct = np.array([[is_correct for _, is_correct in answers.values()]], dtype=bool)
+    # Only existing rows are updated: during a cascade delete the questions
+    # (and their stats) may already be gone
+    _apply_sums(question_ids, _column_sums(codes, correct, [float(result.percentage)]), sign=-1)
+
+
+def rebuild_item_stats(quiz):
+    """Recompute the quiz's QuestionStat rows from every stored result"""
+    answer_key = compile_answer_key(quiz.pk)
+    key_ids = answer_key.question_ids.tolist()
+
+    codes = []
+    scores = []
+    results = StudentResult.objects.filter(quiz=quiz).values_list(
+        'question_ids', 'answer_string', 'answers_data', 'percentage'
+    )
+    for question_ids, answer_string, answers_data, percentage in results.iterator(chunk_size=2000):
+        if question_ids == key_ids:
+            codes.append(unpack_answers(answer_string))
+        else:
+            # A drawn subset, questions changed since, or a legacy row: align by id
+            if question_ids:
+                answers = dict(zip(question_ids, unpack_answers(answer_string).tolist()))
+            else:
+                answers = {
+                    int(qid): encode_answer(data.get('answer'))
+                    for qid, data in answers_data.items()
+                }
+            codes.append([answers.get(qid, NOT_SEEN) for qid in key_ids])
+        scores.append(float(percentage))
+
+    sums = compute_item_sums(answer_key, codes, scores) if codes else None
+    stats = []
+    for i, qid in enumerate(answer_key.question_ids.tolist()):
+        values = {field: sums[field][i].item() for field in sums} if sums else {}
+        stats.append(QuestionStat(question_id=qid, **values))
+
+    with transaction.atomic():
+        QuestionStat.objects.filter(question__quiz=quiz).delete()
+        QuestionStat.objects.bulk_create(stats)
+    return len(codes)
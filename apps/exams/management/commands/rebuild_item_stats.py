@@ -0,0 +1,32 @@
+"""
+Management command to recompute item analysis from stored results
+
+Usage:
+    python manage.py rebuild_item_stats             # every quiz
+    python manage.py rebuild_item_stats --quiz 12   # one quiz
+"""
+from django.core.management.base import BaseCommand
+
+from apps.exams.item_analysis import rebuild_item_stats
+from apps.exams.models import Quiz
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-question difficulty, discrimination and distractor stats'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--quiz', type=int, action='append',
+            help='Only rebuild this quiz (may be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.all()
+        if options['quiz']:
+            quizzes = quizzes.filter(pk__in=options['quiz'])
+
+        for quiz in quizzes.iterator():
+            count = rebuild_item_stats(quiz)
+            self.stdout.write(self.style.SUCCESS(f'  ✓ {quiz.title}: {count} results'))
+
+        self.stdout.write(self.style.SUCCESS('\nItem stats rebuilt!'))
@@ -0,0 +1,32 @@
+"""
+Management command to recompute quiz score histograms from stored results
+
+Usage:
+    python manage.py rebuild_score_histograms             # every quiz
+    python manage.py rebuild_score_histograms --quiz 12   # one quiz
+"""
+from django.core.management.base import BaseCommand
+
+from apps.exams.models import Quiz
+from apps.exams.score_histograms import rebuild_score_histogram
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-quiz score histograms used for percentile ranks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--quiz', type=int, action='append',
+            help='Only rebuild this quiz (may be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        quizzes = Quiz.objects.all()
+        if options['quiz']:
+            quizzes = quizzes.filter(pk__in=options['quiz'])
+
+        for quiz in quizzes.iterator():
+            count = rebuild_score_histogram(quiz)
+            self.stdout.write(self.style.SUCCESS(f'  ✓ {quiz.title}: {count} results'))
+
+        self.stdout.write(self.style.SUCCESS('\nScore histograms rebuilt!'))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0003_alter_question_option_a_alter_question_option_b_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='questions_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='إصدار الأسئلة'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0004_quiz_questions_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionStat',
+            fields=[
+                ('question', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stat', serialize=False, to='exams.question', verbose_name='السؤال')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='عدد المحاولات')),
+                ('correct', models.PositiveIntegerField(default=0, verbose_name='الإجابات الصحيحة')),
+                ('count_a', models.PositiveIntegerField(default=0, verbose_name='اختاروا أ')),
+                ('count_b', models.PositiveIntegerField(default=0, verbose_name='اختاروا ب')),
+                ('count_c', models.PositiveIntegerField(default=0, verbose_name='اختاروا ج')),
+                ('count_d', models.PositiveIntegerField(default=0, verbose_name='اختاروا د')),
+                ('count_blank', models.PositiveIntegerField(default=0, verbose_name='بدون إجابة')),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_sq_sum', models.FloatField(default=0)),
+                ('correct_score_sum', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر تحديث')),
+            ],
+            options={
+                'verbose_name': 'تحليل سؤال',
+                'verbose_name_plural': 'تحليل الأسئلة',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0005_question_stat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentresult',
+            name='answer_string',
+            field=models.TextField(blank=True, verbose_name='الإجابات'),
+        ),
+        migrations.AddField(
+            model_name='studentresult',
+            name='correct_mask',
+            field=models.TextField(blank=True, verbose_name='الإجابات الصحيحة (bitmask)'),
+        ),
+        migrations.AddField(
+            model_name='studentresult',
+            name='question_ids',
+            field=models.JSONField(blank=True, default=list, verbose_name='ترتيب الأسئلة'),
+        ),
+        migrations.AlterField(
+            model_name='studentresult',
+            name='answers_data',
+            field=models.JSONField(blank=True, default=dict, help_text='تخزين إجابات الطالب (النظام القديم)', verbose_name='بيانات الإجابات'),
+        ),
+    ]
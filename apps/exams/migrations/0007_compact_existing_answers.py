@@ -0,0 +1,86 @@
+# Copy existing answers_data dicts into the compact answer columns
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# Frozen copy of the apps.exams.compact encoding as of this migration, so
+# later changes to the app code cannot change what it writes
+OPTIONS = 'abcd'
+BLANK = '-'
+
+
+def encode_answer(answer):
+    answer = (answer or '').strip().lower()
+    return answer if answer and answer in OPTIONS else BLANK
+
+
+def pack_answers(answers):
+    return ''.join(encode_answer(answer) for answer in answers)
+
+
+def pack_mask(correct):
+    mask = bytearray((len(correct) + 7) // 8)
+    for i, is_correct in enumerate(correct):
+        if is_correct:
+            mask[i // 8] |= 0x80 >> (i % 8)
+    return mask.hex()
+
+
+def unpack_mask(mask, count):
+    data = bytes.fromhex(mask)
+    return [bool(data[i // 8] & (0x80 >> (i % 8))) for i in range(count)]
+
+
+def compact_answers(apps, schema_editor):
+    """Fill the compact columns; answers_data is left as it was"""
+    StudentResult = apps.get_model('exams', 'StudentResult')
+    rows = StudentResult.objects.filter(question_ids=[]).exclude(answers_data={})
+    batch = []
+    for result in rows.only('id', 'answers_data').iterator(chunk_size=BATCH_SIZE):
+        items = list(result.answers_data.items())
+        result.question_ids = [int(qid) for qid, _ in items]
+        result.answer_string = pack_answers([data.get('answer') for _, data in items])
+        result.correct_mask = pack_mask([bool(data.get('is_correct')) for _, data in items])
+        batch.append(result)
+        if len(batch) >= BATCH_SIZE:
+            StudentResult.objects.bulk_update(batch, ['question_ids', 'answer_string', 'correct_mask'])
+            batch = []
+    if batch:
+        StudentResult.objects.bulk_update(batch, ['question_ids', 'answer_string', 'correct_mask'])
+
+
+def expand_answers(apps, schema_editor):
+    """
+    Results that only have compact columns (submitted after this migration)
+    get an answers_data dict before 0006 drops the columns. Rows compacted
+    above still hold their original answers_data.
+    """
+    StudentResult = apps.get_model('exams', 'StudentResult')
+    rows = StudentResult.objects.filter(answers_data={}).exclude(question_ids=[])
+    batch = []
+    for result in rows.only('id', 'question_ids', 'answer_string', 'correct_mask').iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        correct = unpack_mask(result.correct_mask, len(result.question_ids))
+        result.answers_data = {
+            str(qid): {'answer': '' if letter == BLANK else letter, 'is_correct': is_correct}
+            for qid, letter, is_correct in zip(result.question_ids, result.answer_string, correct)
+        }
+        batch.append(result)
+        if len(batch) >= BATCH_SIZE:
+            StudentResult.objects.bulk_update(batch, ['answers_data'])
+            batch = []
+    if batch:
+        StudentResult.objects.bulk_update(batch, ['answers_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0006_studentresult_compact_answers'),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_answers, expand_answers),
+    ]
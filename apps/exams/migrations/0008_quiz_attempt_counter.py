@@ -0,0 +1,74 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def renumber_attempts(apps, schema_editor):
+    """
+    Number each student's results for a quiz 1..n in the order they were
+    taken, and start the counters from n, so the unique constraint added in
+    the next migration holds for existing data.
+    """
+    StudentResult = apps.get_model('exams', 'StudentResult')
+    QuizAttemptCounter = apps.get_model('exams', 'QuizAttemptCounter')
+
+    changed = []
+    counters = {}
+    rows = StudentResult.objects.order_by('student_id', 'quiz_id', 'started_at', 'id').only(
+        'id', 'student_id', 'quiz_id', 'attempt_number'
+    )
+    for result in rows.iterator(chunk_size=2000):
+        key = (result.student_id, result.quiz_id)
+        counters[key] = counters.get(key, 0) + 1
+        if result.attempt_number != counters[key]:
+            result.attempt_number = counters[key]
+            changed.append(result)
+    StudentResult.objects.bulk_update(changed, ['attempt_number'], batch_size=500)
+
+    QuizAttemptCounter.objects.bulk_create(
+        [
+            QuizAttemptCounter(student_id=student_id, quiz_id=quiz_id, used=n, last_number=n)
+            for (student_id, quiz_id), n in counters.items()
+        ],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('exams', '0007_compact_existing_answers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizAttemptCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('used', models.PositiveIntegerField(default=0, verbose_name='المحاولات المستخدمة')),
+                ('last_number', models.PositiveIntegerField(default=0, verbose_name='آخر رقم محاولة')),
+            ],
+            options={
+                'verbose_name': 'عداد محاولات',
+                'verbose_name_plural': 'عدادات المحاولات',
+            },
+        ),
+        migrations.AddField(
+            model_name='quizattemptcounter',
+            name='quiz',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempt_counters', to='exams.quiz', verbose_name='الامتحان'),
+        ),
+        migrations.AddField(
+            model_name='quizattemptcounter',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempt_counters', to=settings.AUTH_USER_MODEL, verbose_name='الطالب'),
+        ),
+        migrations.AddConstraint(
+            model_name='quizattemptcounter',
+            constraint=models.UniqueConstraint(fields=('student', 'quiz'), name='unique_attempt_counter'),
+        ),
+        migrations.RunPython(renumber_attempts, migrations.RunPython.noop),
+    ]
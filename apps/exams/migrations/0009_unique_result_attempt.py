@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('exams', '0008_quiz_attempt_counter'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='studentresult',
+            constraint=models.UniqueConstraint(fields=('student', 'quiz', 'attempt_number'), name='unique_result_attempt'),
+        ),
+    ]
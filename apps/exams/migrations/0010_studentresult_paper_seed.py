@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0009_unique_result_attempt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentresult',
+            name='paper_seed',
+            field=models.PositiveIntegerField(blank=True, help_text='يعيد بناء ترتيب الأسئلة الذي ظهر للطالب', null=True, verbose_name='بذرة ترتيب الأسئلة'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('exams', '0010_studentresult_paper_seed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizDraft',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempt_number', models.PositiveIntegerField(verbose_name='رقم المحاولة')),
+                ('token', models.TextField(verbose_name='توكن المحاولة')),
+                ('answer_string', models.TextField(blank=True, verbose_name='الإجابات')),
+                ('questions_version', models.PositiveIntegerField(default=0, verbose_name='إصدار الأسئلة')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر حفظ')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='drafts', to='exams.quiz', verbose_name='الامتحان')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_drafts', to=settings.AUTH_USER_MODEL, verbose_name='الطالب')),
+            ],
+            options={
+                'verbose_name': 'مسودة امتحان',
+                'verbose_name_plural': 'مسودات الامتحانات',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='quizdraft',
+            constraint=models.UniqueConstraint(fields=('student', 'quiz'), name='unique_quiz_draft'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0011_quiz_draft'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='tag',
+            field=models.CharField(blank=True, help_text='مثال: الباب الأول، مسائل، نظري', max_length=50, verbose_name='التصنيف'),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='questions_per_attempt',
+            field=models.PositiveIntegerField(default=0, help_text='0 = كل أسئلة الامتحان', verbose_name='عدد الأسئلة في كل محاولة'),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='sampling_strata',
+            field=models.CharField(blank=True, choices=[('', 'عشوائي بالكامل'), ('points', 'متوازن حسب الدرجة'), ('tag', 'متوازن حسب التصنيف')], default='', help_text='توزيع الأسئلة المسحوبة بنفس نسب بنك الأسئلة', max_length=10, verbose_name='طريقة اختيار الأسئلة'),
+        ),
+    ]
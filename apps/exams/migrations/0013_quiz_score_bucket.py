@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:37
+
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_histograms(apps, schema_editor):
+    StudentResult = apps.get_model('exams', 'StudentResult')
+    QuizScoreBucket = apps.get_model('exams', 'QuizScoreBucket')
+    counts = Counter(
+        (quiz_id, min(100, int(percentage)))
+        for quiz_id, percentage in StudentResult.objects.values_list(
+            'quiz_id', 'percentage'
+        ).iterator(chunk_size=2000)
+    )
+    QuizScoreBucket.objects.bulk_create(
+        [
+            QuizScoreBucket(quiz_id=quiz_id, bucket=bucket, count=count)
+            for (quiz_id, bucket), count in counts.items()
+        ],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0012_question_bank_sampling'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizScoreBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.PositiveSmallIntegerField(verbose_name='النسبة المئوية')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='عدد النتائج')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_buckets', to='exams.quiz', verbose_name='الامتحان')),
+            ],
+            options={
+                'verbose_name': 'شريحة درجات',
+                'verbose_name_plural': 'توزيع الدرجات',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='quizscorebucket',
+            constraint=models.UniqueConstraint(fields=('quiz', 'bucket'), name='unique_quiz_score_bucket'),
+        ),
+        migrations.RunPython(fill_histograms, migrations.RunPython.noop),
+    ]
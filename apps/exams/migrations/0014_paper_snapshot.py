@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exams', '0013_quiz_score_bucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaperSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('questions_version', models.PositiveIntegerField(verbose_name='إصدار الأسئلة')),
+                ('questions', models.JSONField(default=list, verbose_name='الأسئلة')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='paper_snapshots', to='exams.quiz', verbose_name='الامتحان')),
+            ],
+            options={
+                'verbose_name': 'نسخة ورقة امتحان',
+                'verbose_name_plural': 'نسخ أوراق الامتحانات',
+            },
+        ),
+        migrations.AddField(
+            model_name='studentresult',
+            name='snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='results', to='exams.papersnapshot', verbose_name='نسخة ورقة الامتحان'),
+        ),
+        migrations.AddConstraint(
+            model_name='papersnapshot',
+            constraint=models.UniqueConstraint(fields=('quiz', 'questions_version'), name='unique_paper_snapshot'),
+        ),
+    ]
@@ -4,6 +4,13 @@ Exams Models for Voltage Platform
 """
 from django.db import models
 from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from .compact import decode_answer, unpack_answers, unpack_mask
+
+# Battery change applied when a quiz result is recorded
+PASS_BATTERY_DELTA = 10
+FAIL_BATTERY_DELTA = -5
 
 
 class Quiz(models.Model):
@@ -32,9 +39,36 @@ class Quiz(models.Model):
     show_answers = models.BooleanField('عرض الإجابات بعد الامتحان', default=True)
     max_attempts = models.PositiveIntegerField('عدد المحاولات المسموحة', default=1)
     
+    # Question bank: draw N questions per attempt instead of showing all
+    SAMPLING_CHOICES = [
+        ('', 'عشوائي بالكامل'),
+        ('points', 'متوازن حسب الدرجة'),
+        ('tag', 'متوازن حسب التصنيف'),
+    ]
+    questions_per_attempt = models.PositiveIntegerField(
+        'عدد الأسئلة في كل محاولة',
+        default=0,
+        help_text='0 = كل أسئلة الامتحان'
+    )
+    sampling_strata = models.CharField(
+        'طريقة اختيار الأسئلة',
+        max_length=10,
+        choices=SAMPLING_CHOICES,
+        blank=True,
+        default='',
+        help_text='توزيع الأسئلة المسحوبة بنفس نسب بنك الأسئلة'
+    )
+    
     is_active = models.BooleanField('نشط', default=True)
     created_at = models.DateTimeField('تاريخ الإنشاء', auto_now_add=True)
     
+    # Bumped on every Question change; keys the cached answer key
+    questions_version = models.PositiveIntegerField(
+        'إصدار الأسئلة',
+        default=0,
+        editable=False
+    )
+    
     class Meta:
         verbose_name = 'امتحان'
         verbose_name_plural = 'الامتحانات'
@@ -43,6 +77,10 @@ class Quiz(models.Model):
     def __str__(self):
         return f"{self.lecture.title} - {self.title}"
     
+    @property
+    def is_sampled(self):
+        return self.questions_per_attempt > 0
+    
     @property
     def questions_count(self):
         return self.questions.count()
@@ -99,6 +137,12 @@ class Question(models.Model):
     
     points = models.PositiveIntegerField('الدرجة', default=1)
     order = models.PositiveIntegerField('الترتيب', default=0)
+    tag = models.CharField(
+        'التصنيف',
+        max_length=50,
+        blank=True,
+        help_text='مثال: الباب الأول، مسائل، نظري'
+    )
     
     class Meta:
         verbose_name = 'سؤال'
@@ -112,6 +156,38 @@ class Question(models.Model):
         return getattr(self, f'option_{self.correct_answer}')
 
 
+class PaperSnapshot(models.Model):
+    """
+    نسخة ثابتة من ورقة الامتحان - The serialized questions (text, options,
+    answer, explanation, image URL) of one questions_version of a quiz.
+    Every result graded against that version points at the same row, so
+    the result page shows exactly what was answered even after edits.
+    """
+    
+    quiz = models.ForeignKey(
+        Quiz,
+        on_delete=models.CASCADE,
+        related_name='paper_snapshots',
+        verbose_name='الامتحان'
+    )
+    questions_version = models.PositiveIntegerField('إصدار الأسئلة')
+    questions = models.JSONField('الأسئلة', default=list)
+    created_at = models.DateTimeField('تاريخ الإنشاء', auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'نسخة ورقة امتحان'
+        verbose_name_plural = 'نسخ أوراق الامتحانات'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['quiz', 'questions_version'],
+                name='unique_paper_snapshot'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.quiz_id} v{self.questions_version}"
+
+
 class StudentResult(models.Model):
     """نتيجة الطالب في الامتحان"""
     
@@ -140,12 +216,19 @@ class StudentResult(models.Model):
     )
     passed = models.BooleanField('ناجح', default=False)
     
-    # Answers tracking (JSON)
+    # Compact answers: one letter per question ('-' = blank), aligned to
+    # question_ids, plus a hex bitmask of the correct ones
+    question_ids = models.JSONField('ترتيب الأسئلة', default=list, blank=True)
+    answer_string = models.TextField('الإجابات', blank=True)
+    correct_mask = models.TextField('الإجابات الصحيحة (bitmask)', blank=True)
+    
+    # Legacy per-question dict, only kept for results that predate the
+    # compact columns
     answers_data = models.JSONField(
         'بيانات الإجابات',
         default=dict,
         blank=True,
-        help_text='تخزين إجابات الطالب'
+        help_text='تخزين إجابات الطالب (النظام القديم)'
     )
     
     time_taken = models.PositiveIntegerField(
@@ -154,6 +237,20 @@ class StudentResult(models.Model):
     )
     
     attempt_number = models.PositiveIntegerField('رقم المحاولة', default=1)
+    snapshot = models.ForeignKey(
+        PaperSnapshot,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='results',
+        verbose_name='نسخة ورقة الامتحان'
+    )
+    paper_seed = models.PositiveIntegerField(
+        'بذرة ترتيب الأسئلة',
+        null=True,
+        blank=True,
+        help_text='يعيد بناء ترتيب الأسئلة الذي ظهر للطالب'
+    )
     started_at = models.DateTimeField('بدأ في', auto_now_add=True)
     completed_at = models.DateTimeField('انتهى في', null=True, blank=True)
     
@@ -161,11 +258,31 @@ class StudentResult(models.Model):
         verbose_name = 'نتيجة'
         verbose_name_plural = 'النتائج'
         ordering = ['-completed_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student', 'quiz', 'attempt_number'],
+                name='unique_result_attempt'
+            ),
+        ]
     
     def __str__(self):
         status = "✅ ناجح" if self.passed else "❌ راسب"
         return f"{self.student.first_name} - {self.quiz.title} ({self.percentage}%) {status}"
     
+    def get_answers(self):
+        """{question_id: (answer letter, is_correct)} from the compact columns"""
+        if not self.question_ids and self.answers_data:
+            return {
+                int(qid): (data.get('answer', ''), data.get('is_correct', False))
+                for qid, data in self.answers_data.items()
+            }
+        codes = unpack_answers(self.answer_string).tolist()
+        correct = unpack_mask(self.correct_mask, len(self.question_ids)).tolist()
+        return {
+            qid: (decode_answer(code), is_correct)
+            for qid, code, is_correct in zip(self.question_ids, codes, correct)
+        }
+    
     def calculate_result(self):
         """حساب النتيجة النهائية"""
         self.percentage = (
@@ -174,15 +291,188 @@ class StudentResult(models.Model):
         )
         self.passed = self.percentage >= self.quiz.passing_score
         
-        # Update student battery level based on result
-        if self.passed:
-            self.student.battery_level = min(
-                self.student.battery_level + 10,
-                100
-            )
-        else:
-            self.student.battery_level = max(
-                self.student.battery_level - 5,
-                0
-            )
-        self.student.save()
+        # Update student battery level based on result (single UPDATE)
+        get_user_model().objects.adjust_battery(
+            [self.student_id],
+            PASS_BATTERY_DELTA if self.passed else FAIL_BATTERY_DELTA
+        )
+        # The UPDATE bypassed the loaded student; don't leave it showing the old level
+        if StudentResult.student.is_cached(self):
+            self.student.refresh_from_db(fields=['battery_level'])
+
+
+class QuizAttemptCounter(models.Model):
+    """
+    عداد محاولات الطالب - One row per (student, quiz), claimed with a
+    conditional UPDATE so concurrent submits cannot exceed max_attempts.
+    """
+    
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='quiz_attempt_counters',
+        verbose_name='الطالب'
+    )
+    quiz = models.ForeignKey(
+        Quiz,
+        on_delete=models.CASCADE,
+        related_name='attempt_counters',
+        verbose_name='الامتحان'
+    )
+    
+    # Attempts that count against max_attempts (drops when a result is deleted)
+    used = models.PositiveIntegerField('المحاولات المستخدمة', default=0)
+    # Highest attempt_number handed out; never goes back
+    last_number = models.PositiveIntegerField('آخر رقم محاولة', default=0)
+    
+    class Meta:
+        verbose_name = 'عداد محاولات'
+        verbose_name_plural = 'عدادات المحاولات'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student', 'quiz'],
+                name='unique_attempt_counter'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.quiz_id}: {self.used}"
+
+
+class QuizDraft(models.Model):
+    """
+    مسودة إجابات الامتحان - Durable copy of an in-progress attempt.
+    Autosaves live in the cache; this row is only written every
+    DRAFT_FLUSH_INTERVAL seconds so a cache restart does not lose answers.
+    """
+    
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='quiz_drafts',
+        verbose_name='الطالب'
+    )
+    quiz = models.ForeignKey(
+        Quiz,
+        on_delete=models.CASCADE,
+        related_name='drafts',
+        verbose_name='الامتحان'
+    )
+    
+    attempt_number = models.PositiveIntegerField('رقم المحاولة')
+    token = models.TextField('توكن المحاولة')
+    answer_string = models.TextField('الإجابات', blank=True)
+    questions_version = models.PositiveIntegerField('إصدار الأسئلة', default=0)
+    updated_at = models.DateTimeField('آخر حفظ', auto_now=True)
+    
+    class Meta:
+        verbose_name = 'مسودة امتحان'
+        verbose_name_plural = 'مسودات الامتحانات'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['student', 'quiz'],
+                name='unique_quiz_draft'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id} - {self.quiz_id} ({self.attempt_number})"
+
+
+class QuestionStat(models.Model):
+    """
+    تحليل السؤال - Running sums per question, updated as results arrive.
+    Difficulty, discrimination and distractor frequencies are derived
+    from these counters, so the admin never scans answers_data.
+    """
+    
+    question = models.OneToOneField(
+        Question,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stat',
+        verbose_name='السؤال'
+    )
+    
+    attempts = models.PositiveIntegerField('عدد المحاولات', default=0)
+    correct = models.PositiveIntegerField('الإجابات الصحيحة', default=0)
+    
+    count_a = models.PositiveIntegerField('اختاروا أ', default=0)
+    count_b = models.PositiveIntegerField('اختاروا ب', default=0)
+    count_c = models.PositiveIntegerField('اختاروا ج', default=0)
+    count_d = models.PositiveIntegerField('اختاروا د', default=0)
+    count_blank = models.PositiveIntegerField('بدون إجابة', default=0)
+    
+    # Sums of the students' total percentage, for the point-biserial
+    score_sum = models.FloatField(default=0)
+    score_sq_sum = models.FloatField(default=0)
+    correct_score_sum = models.FloatField(default=0)
+    
+    updated_at = models.DateTimeField('آخر تحديث', auto_now=True)
+    
+    class Meta:
+        verbose_name = 'تحليل سؤال'
+        verbose_name_plural = 'تحليل الأسئلة'
+    
+    def __str__(self):
+        return f"تحليل {self.question_id}"
+    
+    @property
+    def p_value(self):
+        """نسبة الإجابة الصحيحة (معامل السهولة)"""
+        return self.correct / self.attempts if self.attempts else None
+    
+    @property
+    def discrimination(self):
+        """Point-biserial correlation between this item and the total score"""
+        n, n1 = self.attempts, self.correct
+        if n < 2 or n1 in (0, n):
+            return None
+        mean = self.score_sum / n
+        variance = self.score_sq_sum / n - mean * mean
+        if variance <= 1e-9:
+            return None
+        mean_correct = self.correct_score_sum / n1
+        mean_wrong = (self.score_sum - self.correct_score_sum) / (n - n1)
+        p = n1 / n
+        return (mean_correct - mean_wrong) / variance ** 0.5 * (p * (1 - p)) ** 0.5
+    
+    @property
+    def distractors(self):
+        """Share of students choosing each option (and leaving it blank)"""
+        if not self.attempts:
+            return {}
+        return {
+            option: getattr(self, f'count_{option}') / self.attempts
+            for option in ('a', 'b', 'c', 'd', 'blank')
+        }
+
+
+class QuizScoreBucket(models.Model):
+    """
+    توزيع درجات الامتحان - One row per (quiz, whole percent), counting the
+    results that scored in it. Incremented with F() on every result, so a
+    percentile rank is a sum over at most 101 rows instead of a table scan.
+    """
+    
+    quiz = models.ForeignKey(
+        Quiz,
+        on_delete=models.CASCADE,
+        related_name='score_buckets',
+        verbose_name='الامتحان'
+    )
+    bucket = models.PositiveSmallIntegerField('النسبة المئوية')
+    count = models.PositiveIntegerField('عدد النتائج', default=0)
+    
+    class Meta:
+        verbose_name = 'شريحة درجات'
+        verbose_name_plural = 'توزيع الدرجات'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['quiz', 'bucket'],
+                name='unique_quiz_score_bucket'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.quiz_id} - {self.bucket}%: {self.count}"
@@ -0,0 +1,185 @@
+"""
+Batch grading of paper exams
+تصحيح الامتحانات الورقية من شيت الإجابات
+
+An answer sheet is a CSV or XLSX file with one row per student: the phone
+number in the first column followed by one answer letter per question, in
+the quiz's question order. (A single cell holding all letters, e.g.
+"abdc", is accepted too.) The whole sheet is graded with one NumPy
+comparison against the quiz's compiled answer key.
+"""
+import csv
+import io
+import re
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from apps.users.models import StudentStanding
+
+from .answer_keys import get_answer_key
+from .attempts import claim_attempts_bulk
+from .compact import OPTIONS, UNANSWERED
+from .item_analysis import record_item_stats
+from .models import FAIL_BATTERY_DELTA, PASS_BATTERY_DELTA, StudentResult
+from .papers import get_snapshot_id
+from .score_histograms import record_scores
+
+PHONE_RE = re.compile(r'^01[0125][0-9]{8}$')
+
+
+class AnswerSheetError(Exception):
+    """The uploaded file cannot be read as an answer sheet"""
+
+
+def normalize_phone(value):
+    """Undo what spreadsheets do to phone numbers (lost leading 0, +20, 1.0e9)"""
+    if isinstance(value, float):
+        value = int(value)
+    digits = re.sub(r'\D', '', str(value or '').strip().removesuffix('.0'))
+    if digits.startswith('20') and len(digits) == 12:
+        digits = digits[2:]
+    if len(digits) == 10 and digits.startswith('1'):
+        digits = '0' + digits
+    return digits
+
+
+def read_answer_sheet(uploaded_file):
+    """Return a list of raw rows (lists of cells) from a CSV or XLSX upload"""
+    name = uploaded_file.name.lower()
+    if name.endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise AnswerSheetError('رفع ملفات Excel يحتاج تثبيت openpyxl')
+        try:
+            workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+        except Exception:
+            raise AnswerSheetError('ملف Excel غير صالح')
+        try:
+            return [list(row) for row in workbook.active.iter_rows(values_only=True)]
+        finally:
+            workbook.close()
+
+    if name.endswith('.csv'):
+        try:
+            text = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig')
+            return list(csv.reader(text))
+        except UnicodeDecodeError:
+            raise AnswerSheetError('ملف CSV يجب أن يكون بترميز UTF-8')
+
+    raise AnswerSheetError('صيغة الملف غير مدعومة (CSV أو XLSX فقط)')
+
+
+def parse_answer_rows(rows, question_count):
+    """
+    Split raw rows into phone numbers and an (n × question_count) array of
+    answer letters. Header and blank rows are skipped; the first row for a
+    phone wins. Returns (phones, letters, skipped rows).
+    """
+    phones = []
+    answers = []
+    seen = set()
+    skipped = []
+
+    for line, row in enumerate(rows, start=1):
+        if not row or all(cell in (None, '') for cell in row):
+            continue
+        phone = normalize_phone(row[0])
+        if not PHONE_RE.match(phone) or phone in seen:
+            if line > 1:  # the first row may be a header
+                skipped.append(line)
+            continue
+        seen.add(phone)
+
+        cells = ['' if cell is None else str(cell) for cell in row[1:]]
+        if len(cells) == 1 and len(cells[0].strip()) > 1:
+            cells = list(cells[0].strip())
+        cells = (cells + [''] * question_count)[:question_count]
+        phones.append(phone)
+        answers.append(cells)
+
+    letters = np.array(answers, dtype='U8').reshape(len(phones), question_count)
+    return phones, letters, skipped
+
+
+def encode_letters(letters):
+    """Vectorized 'a'..'d' → 0..3 over a whole array of cells"""
+    cleaned = np.char.lower(np.char.strip(letters))
+    codes = np.full(cleaned.shape, UNANSWERED, dtype=np.int8)
+    for code, letter in enumerate(OPTIONS):
+        codes[cleaned == letter] = code
+    return codes
+
+
+def grade_answer_sheet(quiz, rows):
+    """
+    Grade every row of a sheet against the quiz and record the results.
+    Returns a summary dict for the admin message.
+    """
+    answer_key = get_answer_key(quiz)
+    question_count = len(answer_key)
+    phones, letters, skipped = parse_answer_rows(rows, question_count)
+
+    User = get_user_model()
+    student_ids = dict(
+        User.objects.filter(phone_number__in=phones).values_list('phone_number', 'id')
+    )
+    known = np.array([phone in student_ids for phone in phones], dtype=bool)
+    unknown = [phone for phone in phones if phone not in student_ids]
+    phones = [phone for phone in phones if phone in student_ids]
+    codes = encode_letters(letters)[known]
+
+    # One pass over the whole sheet
+    correct = codes == answer_key.answers
+    correct_counts = correct.sum(axis=1)
+    scores = correct.astype(np.int32) @ answer_key.points
+    percentages = (
+        np.round(correct_counts * 100 / question_count, 2)
+        if question_count else np.zeros(len(phones))
+    )
+    passed = percentages >= quiz.passing_score
+
+    ids = [student_ids[phone] for phone in phones]
+    now = timezone.now()
+    snapshot_id = get_snapshot_id(quiz)
+    results = []
+    for i, student_id in enumerate(ids):
+        results.append(StudentResult(
+            student_id=student_id,
+            quiz=quiz,
+            score=int(scores[i]),
+            total_questions=question_count,
+            correct_answers=int(correct_counts[i]),
+            percentage=Decimal(str(percentages[i])),
+            passed=bool(passed[i]),
+            completed_at=now,
+            snapshot_id=snapshot_id,
+            **answer_key.compact_fields(codes[i], correct[i])
+        ))
+
+    deltas = {
+        student_id: PASS_BATTERY_DELTA if is_passed else FAIL_BATTERY_DELTA
+        for student_id, is_passed in zip(ids, passed.tolist())
+    }
+    with transaction.atomic():
+        attempt_numbers = claim_attempts_bulk(ids, quiz.pk)
+        for result in results:
+            result.attempt_number = attempt_numbers[result.student_id]
+        StudentResult.objects.bulk_create(results, batch_size=500)
+        User.objects.adjust_battery_bulk(deltas)
+        record_item_stats(answer_key, codes, percentages)
+        record_scores(quiz.pk, percentages)
+        StudentStanding.objects.add_results(
+            {result.student_id: [result.percentage] for result in results}
+        )
+
+    return {
+        'graded': len(results),
+        'passed': int(passed.sum()),
+        'unknown': unknown,
+        'skipped': skipped,
+    }
@@ -0,0 +1,81 @@
+"""
+Cached quiz papers
+ورقة الامتحان المجهزة مسبقاً
+
+The question paper (text, options, image URL, answer and explanation) is
+serialized once per quiz questions_version and cached, so thousands of
+students opening the same quiz do not each query and re-resolve every
+Question. Per-student order comes from a seed stored with the attempt:
+the same seed rebuilds the same order on the result page.
+
+At submit time each result is pointed at a PaperSnapshot of the paper it
+was graded against (one shared row per questions_version), so the result
+page renders from that single row and never shows later edits.
+"""
+import secrets
+
+import numpy as np
+from django.core.cache import cache
+
+from .models import PaperSnapshot, Question
+
+PAPER_TIMEOUT = 60 * 60 * 24
+
+
+def paper_cache_key(quiz):
+    return f'exams:paper:{quiz.pk}:v{quiz.questions_version}'
+
+
+def serialize_question(question):
+    return {
+        'id': question.id,
+        'text': question.text,
+        'image_url': question.image.url if question.image else '',
+        'option_a': question.option_a,
+        'option_b': question.option_b,
+        'option_c': question.option_c,
+        'option_d': question.option_d,
+        'correct_answer': question.correct_answer,
+        'explanation': question.explanation,
+        'points': question.points,
+    }
+
+
+def get_paper(quiz):
+    """Return the quiz's questions as a list of dicts in canonical order"""
+    key = paper_cache_key(quiz)
+    paper = cache.get(key)
+    if paper is None:
+        paper = [
+            serialize_question(question)
+            for question in Question.objects.filter(quiz_id=quiz.pk).order_by('order', 'id')
+        ]
+        cache.set(key, paper, PAPER_TIMEOUT)
+    return paper
+
+
+def get_snapshot_id(quiz):
+    """Id of the PaperSnapshot for the quiz's current questions_version"""
+    key = f'exams:snapshot:{quiz.pk}:v{quiz.questions_version}'
+    snapshot_id = cache.get(key)
+    if snapshot_id is None:
+        snapshot, _ = PaperSnapshot.objects.get_or_create(
+            quiz_id=quiz.pk,
+            questions_version=quiz.questions_version,
+            defaults={'questions': get_paper(quiz)}
+        )
+        snapshot_id = snapshot.pk
+        cache.set(key, snapshot_id, PAPER_TIMEOUT)
+    return snapshot_id
+
+
+def new_paper_seed():
+    return secrets.randbelow(2 ** 31)
+
+
+def shuffle_paper(questions, seed):
+    """Reorder questions deterministically; seed=None keeps the given order"""
+    if seed is None:
+        return list(questions)
+    order = np.random.default_rng(seed).permutation(len(questions))
+    return [questions[i] for i in order.tolist()]
@@ -0,0 +1,237 @@
+"""
+Bulk question import / export
+استيراد وتصدير أسئلة الامتحان
+
+A question file is JSON (a list of objects) or CSV (one row per question)
+with the columns in QUESTION_FIELDS. Either can be wrapped in a ZIP
+together with the image files named in the "image" column, either by
+their path inside the ZIP or, when that is unambiguous, by file name. The
+whole file is validated before anything is written; questions are then
+inserted with one bulk_create and the images stored once that commits.
+"""
+import csv
+import io
+import json
+import os
+import zipfile
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Max
+
+from .answer_keys import bump_questions_version
+from .models import Question
+
+QUESTION_FIELDS = [
+    'order', 'text', 'option_a', 'option_b', 'option_c', 'option_d',
+    'correct_answer', 'points', 'tag', 'explanation', 'image',
+]
+ARABIC_ANSWERS = {'أ': 'a', 'ب': 'b', 'ج': 'c', 'د': 'd'}
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+MAX_IMAGE_SIZE = 5 * 1024 * 1024
+MAX_QUESTION_FILE_SIZE = 5 * 1024 * 1024
+
+
+class QuestionImportError(Exception):
+    """The file cannot be imported; .errors lists every problem found"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+# ---------------------------------------------------------------- export
+
+def _export_rows(quiz):
+    for question in quiz.questions.order_by('order', 'id'):
+        row = {field: getattr(question, field) for field in QUESTION_FIELDS if field != 'image'}
+        row['image'] = os.path.basename(question.image.name) if question.image else ''
+        yield question, row
+
+
+def export_questions(quiz, fmt='json'):
+    """
+    Return (filename, content_type, bytes). Quizzes with images are
+    exported as a ZIP holding the question file and the images.
+    """
+    questions = list(_export_rows(quiz))
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=QUESTION_FIELDS)
+        writer.writeheader()
+        writer.writerows(row for _, row in questions)
+        data = ('\ufeff' + buffer.getvalue()).encode('utf-8')
+        name, content_type = 'questions.csv', 'text/csv; charset=utf-8'
+    else:
+        data = json.dumps([row for _, row in questions], ensure_ascii=False, indent=2).encode('utf-8')
+        name, content_type = 'questions.json', 'application/json'
+
+    with_images = [(question, row) for question, row in questions if row['image']]
+    if not with_images:
+        return f'quiz-{quiz.pk}-{name}', content_type, data
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(name, data)
+        for question, row in with_images:
+            with question.image.open('rb') as image:
+                archive.writestr(row['image'], image.read())
+    return f'quiz-{quiz.pk}-questions.zip', 'application/zip', output.getvalue()
+
+
+# ---------------------------------------------------------------- import
+
+def _read_rows(name, data):
+    if name.endswith('.json'):
+        try:
+            rows = json.loads(data.decode('utf-8-sig'))
+        except (UnicodeDecodeError, ValueError):
+            raise QuestionImportError(['ملف JSON غير صالح'])
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise QuestionImportError(['ملف JSON يجب أن يكون قائمة أسئلة'])
+        return rows
+    if name.endswith('.csv'):
+        try:
+            return list(csv.DictReader(io.StringIO(data.decode('utf-8-sig'))))
+        except UnicodeDecodeError:
+            raise QuestionImportError(['ملف CSV يجب أن يكون بترميز UTF-8'])
+    raise QuestionImportError(['صيغة الملف غير مدعومة (JSON أو CSV أو ZIP)'])
+
+
+def read_question_file(uploaded_file):
+    """Return (rows, images) where images maps the path inside the ZIP → bytes"""
+    name = uploaded_file.name.lower()
+    if not name.endswith('.zip'):
+        if uploaded_file.size > MAX_QUESTION_FILE_SIZE:
+            raise QuestionImportError(['ملف الأسئلة أكبر من 5 ميجا'])
+        return _read_rows(name, uploaded_file.read()), {}
+
+    try:
+        archive = zipfile.ZipFile(uploaded_file)
+    except zipfile.BadZipFile:
+        raise QuestionImportError(['ملف ZIP غير صالح'])
+
+    rows = None
+    images = {}
+    with archive:
+        for info in archive.infolist():
+            entry = os.path.basename(info.filename)
+            lower = entry.lower()
+            if info.is_dir() or not entry or entry.startswith('.'):
+                continue
+            if lower.endswith(('.json', '.csv')) and rows is None:
+                if info.file_size > MAX_QUESTION_FILE_SIZE:
+                    raise QuestionImportError([f'ملف الأسئلة {entry} أكبر من 5 ميجا'])
+                rows = _read_rows(lower, archive.read(info))
+            elif lower.endswith(IMAGE_EXTENSIONS):
+                if info.file_size > MAX_IMAGE_SIZE:
+                    raise QuestionImportError([f'الصورة {info.filename} أكبر من 5 ميجا'])
+                images[_zip_path(info.filename)] = archive.read(info)
+    if rows is None:
+        raise QuestionImportError(['ملف ZIP لا يحتوي على ملف أسئلة (JSON أو CSV)'])
+    return rows, images
+
+
+def _zip_path(name):
+    return name.replace('\\', '/').lstrip('./')
+
+
+def _find_image(name, images):
+    """
+    The images key a row's "image" value refers to: its path inside the
+    ZIP, or a bare file name that only one image in the ZIP has. Returns
+    (key, error).
+    """
+    path = _zip_path(name)
+    if path in images:
+        return path, None
+    matches = [key for key in images if os.path.basename(key) == os.path.basename(path)]
+    if len(matches) == 1:
+        return matches[0], None
+    if matches:
+        return None, f'الصورة {name} موجودة في أكثر من مجلد في ملف ZIP، اكتب مسارها كاملاً'
+    return None, f'الصورة {name} غير موجودة في ملف ZIP'
+
+
+def build_questions(quiz, rows, images, start_order=0):
+    """
+    Validate every row in one pass. Returns unsaved Question objects paired
+    with their images key (or None), or raises QuestionImportError listing
+    all errors.
+    """
+    questions = []
+    errors = []
+    for line, row in enumerate(rows, start=1):
+        row = {key.strip().lower(): value for key, value in row.items() if key}
+        answer = str(row.get('correct_answer') or '').strip()
+        image_name = str(row.get('image') or '').strip()
+
+        question = Question(
+            quiz=quiz,
+            text=str(row.get('text') or '').strip(),
+            option_a=str(row.get('option_a') or ''),
+            option_b=str(row.get('option_b') or ''),
+            option_c=str(row.get('option_c') or ''),
+            option_d=str(row.get('option_d') or ''),
+            correct_answer=ARABIC_ANSWERS.get(answer, answer.lower()),
+            explanation=str(row.get('explanation') or ''),
+            tag=str(row.get('tag') or '').strip(),
+        )
+        try:
+            question.points = int(row.get('points') or 1)
+            question.order = int(row['order']) if row.get('order') not in (None, '') else start_order + line
+        except (TypeError, ValueError):
+            errors.append(f'سطر {line}: الدرجة والترتيب يجب أن يكونا أرقام')
+            continue
+
+        try:
+            question.full_clean(exclude=['quiz', 'image'])
+        except ValidationError as e:
+            messages = '، '.join(f'{field}: {" ".join(msgs)}' for field, msgs in e.message_dict.items())
+            errors.append(f'سطر {line}: {messages}')
+            continue
+        image_key = None
+        if image_name:
+            image_key, error = _find_image(image_name, images)
+            if error:
+                errors.append(f'سطر {line}: {error}')
+                continue
+        questions.append((question, image_key))
+
+    if errors:
+        raise QuestionImportError(errors)
+    return questions
+
+
+def _store_images(with_images, images):
+    for question, image_key in with_images:
+        question.image.save(os.path.basename(image_key), ContentFile(images[image_key]), save=False)
+    Question.objects.bulk_update([question for question, _ in with_images], ['image'])
+    bump_questions_version(with_images[0][0].quiz_id)
+
+
+def import_questions(quiz, rows, images, replace=False):
+    """Insert all questions with one bulk_create, then store their images"""
+    start_order = 0
+    if not replace:
+        start_order = quiz.questions.aggregate(m=Max('order'))['m'] or 0
+    parsed = build_questions(quiz, rows, images, start_order)
+
+    with transaction.atomic():
+        if replace:
+            quiz.questions.all().delete()
+        created = Question.objects.bulk_create([question for question, _ in parsed])
+
+        # bulk_create skips post_save, so invalidate the cached key/paper here
+        bump_questions_version(quiz.pk)
+
+        # Files go to storage only once the rows are committed, so a rollback
+        # never leaves orphaned images behind
+        with_images = [
+            (question, image_key) for question, (_, image_key) in zip(created, parsed) if image_key
+        ]
+        if with_images:
+            transaction.on_commit(lambda: _store_images(with_images, images))
+
+    return len(created)
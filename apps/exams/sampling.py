@@ -0,0 +1,75 @@
+"""
+Question bank sampling
+سحب أسئلة عشوائية لكل محاولة من بنك الأسئلة
+
+A quiz with questions_per_attempt set draws that many questions from its
+bank for each attempt. The draw works on the cached answer key's id array
+with a seeded NumPy generator (no ORDER BY RANDOM()), optionally split
+across strata (points or tag) in the bank's own proportions. The drawn ids
+travel in the attempt token and end up in StudentResult.question_ids, so
+submit and result grade and render exactly the questions shown.
+"""
+import numpy as np
+
+from .answer_keys import get_answer_key
+
+
+def allocate(sizes, count):
+    """
+    Split count across strata of the given sizes proportionally, using the
+    largest remainder so the parts always add up to count.
+    """
+    sizes = np.asarray(sizes, dtype=np.int64)
+    quota = sizes * count / sizes.sum()
+    parts = np.floor(quota).astype(np.int64)
+    remainder = count - int(parts.sum())
+    if remainder:
+        # Stable sort: ties go to the earlier stratum, same as every other draw
+        parts[np.argsort(parts - quota, kind='stable')[:remainder]] += 1
+    return parts
+
+
+def draw_questions(answer_key, count, strata='', seed=None):
+    """
+    Ids of `count` questions drawn from the key, in canonical order.
+    Returns None when the draw would be the whole quiz.
+    """
+    total = len(answer_key)
+    if not count or count >= total:
+        return None
+
+    rng = np.random.default_rng(seed)
+    if strata == 'points':
+        values = answer_key.points
+    elif strata == 'tag':
+        values = answer_key.tags.astype(str)
+    else:
+        values = None
+
+    if values is None:
+        chosen = rng.choice(total, size=count, replace=False)
+    else:
+        _, groups = np.unique(values, return_inverse=True)
+        parts = allocate(np.bincount(groups), count)
+        chosen = np.concatenate([
+            rng.choice(np.flatnonzero(groups == group), size=part, replace=False)
+            for group, part in enumerate(parts.tolist()) if part
+        ])
+
+    chosen.sort()
+    return answer_key.question_ids[chosen].tolist()
+
+
+def draw_for_attempt(quiz, seed=None):
+    """Draw a fresh question set for a new attempt (None = all questions)"""
+    if not quiz.is_sampled:
+        return None
+    return draw_questions(get_answer_key(quiz), quiz.questions_per_attempt, quiz.sampling_strata, seed)
+
+
+def get_attempt_key(quiz, token):
+    """The answer key restricted to the questions drawn for this attempt"""
+    answer_key = get_answer_key(quiz)
+    if token.question_ids is None:
+        return answer_key
+    return answer_key.subset(token.question_ids)
@@ -0,0 +1,103 @@
+"""
+Score histograms
+توزيع الدرجات وترتيب الطالب (percentile)
+
+Every quiz keeps a histogram of its results' percentages in whole-percent
+buckets (QuizScoreBucket). Each new result bumps its bucket with a single
+F() UPDATE inside the submit transaction, and a percentile rank is read
+from at most 101 rows, so no page ever scans StudentResult to rank a
+student. The rebuild_score_histograms command recomputes them from scratch.
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import QuizScoreBucket, StudentResult
+
+BUCKETS = 101
+
+
+def bucket_for(percentage):
+    """Whole-percent bucket (0-100) for a percentage, rounded as it is stored"""
+    return min(BUCKETS - 1, max(0, int(round(float(percentage), 2))))
+
+
+def record_scores(quiz_id, percentages, delta=1):
+    """Add (or with delta=-1 remove) results from the quiz's histogram"""
+    counts = np.bincount(
+        np.fromiter((bucket_for(p) for p in percentages), dtype=np.intp), minlength=BUCKETS
+    )
+    buckets = np.flatnonzero(counts).tolist()
+    if not buckets:
+        return
+
+    if delta > 0:
+        QuizScoreBucket.objects.bulk_create(
+            [QuizScoreBucket(quiz_id=quiz_id, bucket=bucket) for bucket in buckets],
+            ignore_conflicts=True
+        )
+    # Removals only touch existing rows: inserting here during a cascade
+    # delete would add buckets for a quiz that is being deleted
+    rows = QuizScoreBucket.objects.filter(quiz_id=quiz_id, bucket__in=buckets)
+    if len(buckets) == 1:
+        change = Value(int(counts[buckets[0]]) * delta)
+    else:
+        change = Case(
+            *[When(bucket=bucket, then=Value(int(counts[bucket]) * delta)) for bucket in buckets],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+    if delta < 0:
+        # Never go below zero, even if the histogram was already out of date
+        rows = rows.filter(count__gt=0)
+    rows.update(count=F('count') + change)
+
+
+def get_histograms(quiz_ids):
+    """{quiz_id: counts array of length BUCKETS} in one query"""
+    histograms = defaultdict(lambda: np.zeros(BUCKETS, dtype=np.int64))
+    rows = QuizScoreBucket.objects.filter(quiz_id__in=quiz_ids, count__gt=0)
+    for quiz_id, bucket, count in rows.values_list('quiz_id', 'bucket', 'count'):
+        histograms[quiz_id][bucket] = count
+    return histograms
+
+
+def percentile_rank(histogram, percentage):
+    """
+    Share of results scoring below this one (ties count half), as 0-100.
+    None when the quiz has no results yet.
+    """
+    total = int(histogram.sum())
+    if not total:
+        return None
+    bucket = bucket_for(percentage)
+    below = int(histogram[:bucket].sum())
+    return round(float(below + histogram[bucket] / 2) / total * 100)
+
+
+def attach_percentile_ranks(results):
+    """Set result.percentile on each result, one histogram query in total"""
+    histograms = get_histograms({result.quiz_id for result in results})
+    for result in results:
+        result.percentile = percentile_rank(histograms[result.quiz_id], result.percentage)
+    return results
+
+
+def rebuild_score_histogram(quiz):
+    """Recompute the quiz's histogram from every stored result"""
+    percentages = StudentResult.objects.filter(quiz=quiz).values_list('percentage', flat=True)
+    counts = np.bincount(
+        np.fromiter(
+            (bucket_for(p) for p in percentages.iterator(chunk_size=2000)), dtype=np.intp
+        ),
+        minlength=BUCKETS
+    )
+    with transaction.atomic():
+        QuizScoreBucket.objects.filter(quiz=quiz).delete()
+        QuizScoreBucket.objects.bulk_create([
+            QuizScoreBucket(quiz=quiz, bucket=bucket, count=int(counts[bucket]))
+            for bucket in np.flatnonzero(counts).tolist()
+        ])
+    return int(counts.sum())
@@ -0,0 +1,27 @@
+"""
+Signals for the exams app
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.users.models import StudentStanding
+
+from .answer_keys import bump_questions_version
+from .attempts import release_attempt
+from .item_analysis import remove_item_stats
+from .models import Question, StudentResult
+from .score_histograms import record_scores
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    bump_questions_version(instance.quiz_id)
+
+
+@receiver(post_delete, sender=StudentResult)
+def result_deleted(sender, instance, **kwargs):
+    # Deleting a result gives the student the attempt back
+    release_attempt(instance.student_id, instance.quiz_id)
+    record_scores(instance.quiz_id, [instance.percentage], delta=-1)
+    remove_item_stats(instance)
+    StudentStanding.objects.add_results({instance.student_id: [instance.percentage]}, sign=-1)
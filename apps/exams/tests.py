@@ -0,0 +1,729 @@
+import time
+from importlib import import_module
+from unittest.mock import patch
+
+from django.apps import apps
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.courses.models import Chapter, Lecture
+from apps.users.models import User
+from .answer_keys import get_answer_key
+from .attempts import get_attempt_counts, get_attempts_used
+from .compact import encode_answer, pack_answers, pack_mask
+from .item_analysis import rebuild_item_stats
+from .models import (
+    PaperSnapshot, Quiz, Question, QuestionStat, QuizScoreBucket, StudentResult
+)
+from .sampling import allocate, draw_questions
+from .score_histograms import get_histograms, percentile_rank, rebuild_score_histogram
+from .tokens import issue_attempt_token
+
+
+def make_quiz(questions=3):
+    chapter = Chapter.objects.create(title='الفصل الأول', grade=1)
+    lecture = Lecture.objects.create(
+        chapter=chapter,
+        title='محاضرة',
+        video_url='https://vimeo.com/1'
+    )
+    quiz = Quiz.objects.create(lecture=lecture, title='امتحان')
+    for i in range(questions):
+        Question.objects.create(quiz=quiz, text=f'سؤال {i}', correct_answer='a', order=i)
+    quiz.refresh_from_db()
+    return quiz
+
+
+def submit_quiz(client, student, quiz, data=None, token=None):
+    """POST answers with a freshly issued attempt token, as quiz_take would"""
+    if token is None:
+        attempt_number = get_attempt_counts(student.pk, quiz.pk)[1]
+        token = issue_attempt_token(student.pk, quiz.pk, attempt_number, None)
+    data = dict(data or {}, attempt_token=token)
+    return client.post(reverse('exams:quiz_submit', args=[quiz.pk]), data)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ExamTestCase(TestCase):
+    """Starts every test with an empty cache: test databases reuse primary keys"""
+
+    def setUp(self):
+        cache.clear()
+
+
+class QuizChangelistQueryCountTests(ExamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        admin = User.objects.create_superuser('01000000001', 'pass', first_name='Admin')
+        self.client.force_login(admin)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin:exams_quiz_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_constant_queries(self):
+        for _ in range(2):
+            make_quiz()
+        small = self.count_queries()
+        for _ in range(8):
+            make_quiz()
+        self.assertEqual(small, self.count_queries())
+
+
+class AnswerKeyGradingTests(ExamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.student = User.objects.create_user('01012345678', 'pass', first_name='طالب')
+        self.client.force_login(self.student)
+        self.quiz = make_quiz(questions=4)
+        self.questions = list(self.quiz.questions.order_by('order'))
+        Question.objects.filter(pk=self.questions[3].pk).update(points=3)
+
+    def test_question_save_bumps_version(self):
+        version = self.quiz.questions_version
+        self.questions[0].correct_answer = 'b'
+        self.questions[0].save()
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.questions_version, version + 1)
+        self.assertEqual(get_answer_key(self.quiz).answers.tolist()[0], 1)
+
+    def test_submit_grades_without_question_queries(self):
+        self.questions[1].save()  # version bump after the points update
+        self.quiz.refresh_from_db()
+        get_answer_key(self.quiz)  # warm the cache
+        data = {
+            f'question_{self.questions[0].pk}': 'a',
+            f'question_{self.questions[1].pk}': 'c',
+            f'question_{self.questions[3].pk}': 'A',
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            submit_quiz(self.client, self.student, self.quiz, data)
+        sql = [q['sql'] for q in ctx.captured_queries]
+        # Only the cold snapshot reads the questions, before the transaction opens
+        atomic = next(i for i, q in enumerate(sql) if q.startswith('SAVEPOINT'))
+        self.assertEqual(len([q for q in sql[:atomic] if '"exams_question"' in q]), 1)
+        self.assertFalse([q for q in sql[atomic:] if '"exams_question"' in q])
+        self.assertFalse([q for q in sql if '"django_session"' in q and not q.startswith('SELECT')])
+
+        result = StudentResult.objects.get(student=self.student)
+        self.assertEqual(result.total_questions, 4)
+        self.assertEqual(result.correct_answers, 2)
+        self.assertEqual(result.score, 4)
+        self.assertEqual(result.answer_string, 'ac-a')
+        self.assertEqual(result.answers_data, {})
+        self.assertEqual(result.get_answers()[self.questions[2].pk], ('', False))
+        self.assertEqual(result.get_answers()[self.questions[3].pk], ('a', True))
+
+
+class PaperGradingTests(ExamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.quiz = make_quiz(questions=3)
+        self.first = User.objects.create_user('01012345678', 'pass', first_name='طالب')
+        self.second = User.objects.create_user('01112345678', 'pass', first_name='طالب')
+        admin = User.objects.create_superuser('01000000001', 'pass', first_name='Admin')
+        self.client.force_login(admin)
+
+    def upload(self, content):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        sheet = SimpleUploadedFile('sheet.csv', content.encode(), content_type='text/csv')
+        url = reverse('admin:exams_quiz_grade_sheet', args=[self.quiz.pk])
+        return self.client.post(url, {'sheet': sheet})
+
+    def test_sheet_is_graded_in_bulk(self):
+        response = self.upload(
+            'phone,q1,q2,q3\n'
+            '1012345678,a,A,b\n'      # leading zero lost by the spreadsheet
+            '01112345678,aaa\n'
+            '01112345678,bbb\n'        # duplicate row ignored
+            '01099999999,a,a,a\n'      # not registered
+        )
+        self.assertEqual(response.status_code, 302)
+
+        first = StudentResult.objects.get(student=self.first)
+        self.assertEqual((first.correct_answers, first.passed), (2, True))
+        second = StudentResult.objects.get(student=self.second)
+        self.assertEqual((second.correct_answers, second.percentage), (3, 100))
+
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.battery_level, 10)
+
+
+class ItemAnalysisTests(ExamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.quiz = make_quiz(questions=2)
+        self.questions = list(self.quiz.questions.order_by('order'))
+
+    def submit(self, phone, answers):
+        student = User.objects.create_user(phone, 'pass', first_name='طالب')
+        self.client.force_login(student)
+        data = {f'question_{q.pk}': a for q, a in zip(self.questions, answers)}
+        submit_quiz(self.client, student, self.quiz, data)
+
+    def stats(self):
+        return {
+            s.question_id: (s.attempts, s.correct, s.count_b, s.count_blank,
+                            round(s.p_value, 4), round(s.discrimination or 0, 4))
+            for s in QuestionStat.objects.all()
+        }
+
+    def test_incremental_matches_rebuild(self):
+        self.submit('01012345671', 'aa')
+        self.submit('01012345672', 'ab')
+        self.submit('01012345673', 'b')
+        self.submit('01012345674', 'ba')
+
+        incremental = self.stats()
+        first = QuestionStat.objects.get(question=self.questions[0])
+        self.assertEqual((first.attempts, first.correct, first.count_b), (4, 2, 2))
+        self.assertGreater(first.discrimination, 0)
+
+        rebuild_item_stats(self.quiz)
+        self.assertEqual(self.stats(), incremental)
+
+    def test_deleting_a_result_takes_it_out_of_the_stats(self):
+        self.submit('01012345671', 'aa')
+        self.submit('01012345672', 'ab')
+        self.submit('01012345673', 'b')
+        self.submit('01012345674', 'ba')
+
+        StudentResult.objects.filter(student__phone_number='01012345672').delete()
+        first = QuestionStat.objects.get(question=self.questions[0])
+        self.assertEqual((first.attempts, first.correct, first.count_b), (3, 1, 2))
+
+        incremental = self.stats()
+        rebuild_item_stats(self.quiz)
+        self.assertEqual(self.stats(), incremental)
+
+
+class CompactAnswersMigrationTests(ExamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.migration = import_module('apps.exams.migrations.0007_compact_existing_answers')
+        self.quiz = make_quiz(questions=3)
+        self.questions = list(self.quiz.questions.order_by('order').values_list('id', flat=True))
+        self.student = User.objects.create_user('01012345678', 'pass', first_name='طالب')
+
+    def make_result(self, **fields):
+        return StudentResult.objects.create(
+            student=self.student, quiz=self.quiz, score=1, total_questions=3, correct_answers=1,
+            **fields
+        )
+
+    def test_frozen_encoding_matches_app(self):
+        answers = ['a', 'D ', '', None, 'x', 'c'] * 3
+        correct = [True, False, False, True, True, False, True, True, True]
+        self.assertEqual(
+            self.migration.pack_answers(answers),
+            pack_answers([encode_answer(answer) for answer in answers])
+        )
+        self.assertEqual(self.migration.pack_mask(correct), pack_mask(correct))
+        self.assertEqual(self.migration.unpack_mask(pack_mask(correct), len(correct)), correct)
+
+    def test_forward_keeps_answers_data_and_reverse_is_lossless(self):
+        first, second, third = self.questions
+        legacy_data = {
+            str(first): {'answer': 'a', 'is_correct': True},
+            str(second): {'answer': '', 'is_correct': False},
+            str(third): {'answer': 'b', 'is_correct': False},
+        }
+        legacy = self.make_result(answers_data=legacy_data)
+        compact = self.make_result(
+            attempt_number=2, question_ids=self.questions, answer_string='c-a', correct_mask='a0'
+        )
+        before = compact.get_answers()
+
+        self.migration.compact_answers(apps, None)
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.answers_data, legacy_data)
+        self.assertEqual((legacy.question_ids, legacy.answer_string), (self.questions, 'a-b'))
+        self.assertEqual(legacy.get_answers(), {
+            first: ('a', True), second: ('', False), third: ('b', False)
+        })
+
+        self.migration.expand_answers(apps, None)
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.answers_data, legacy_data)
+        compact.refresh_from_db()
+        self.assertEqual(
+            {int(qid): (data['answer'], data['is_correct']) for qid, data in compact.answers_data.items()},
+            before
+        )
+
+
+class AttemptAccountingTests(ExamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.quiz = make_quiz(questions=1)
+        self.student = User.objects.create_user('01012345678', 'pass', first_name='طالب')
+        self.client.force_login(self.student)
+
+    def test_submit_cannot_exceed_max_attempts(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(max_attempts=2)
+        submit_quiz(self.client, self.student, self.quiz)
+        submit_quiz(self.client, self.student, self.quiz)
+        submit_quiz(self.client, self.student, self.quiz)
+
+        self.assertEqual(StudentResult.objects.filter(student=self.student).count(), 2)
+        self.assertEqual(get_attempts_used(self.student.pk, self.quiz.pk), 2)
+
+    def test_token_is_single_use(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(max_attempts=2)
+        token = issue_attempt_token(self.student.pk, self.quiz.pk, 1, None)
+        submit_quiz(self.client, self.student, self.quiz, token=token)
+        submit_quiz(self.client, self.student, self.quiz, token=token)  # e.g. a second tab
+
+        self.assertEqual(StudentResult.objects.filter(student=self.student).count(), 1)
+
+    def test_late_or_forged_submissions_are_rejected(self):
+        with patch('apps.exams.tokens.time.time', return_value=time.time() - 3600):
+            late = issue_attempt_token(self.student.pk, self.quiz.pk, 1, None)
+        submit_quiz(self.client, self.student, self.quiz, token=late)
+        submit_quiz(self.client, self.student, self.quiz, token=late + 'x')
+        submit_quiz(self.client, self.student, self.quiz, token='')
+
+        self.assertFalse(StudentResult.objects.filter(student=self.student).exists())
+
+    def test_deleted_result_frees_attempt_but_not_number(self):
+        submit_quiz(self.client, self.student, self.quiz)
+        StudentResult.objects.get(student=self.student).delete()
+        self.assertEqual(get_attempts_used(self.student.pk, self.quiz.pk), 0)
+
+        submit_quiz(self.client, self.student, self.quiz)
+        self.assertEqual(StudentResult.objects.get(student=self.student).attempt_number, 2)
+
+    def test_stale_students_both_charge_battery(self):
+        # Two tabs, each with its own copy of the student loaded at 0
+        first_tab = User.objects.get(pk=self.student.pk)
+        second_tab = User.objects.get(pk=self.student.pk)
+        for tab in (first_tab, second_tab):
+            StudentResult(
+                student=tab, quiz=self.quiz, total_questions=1, correct_answers=1
+            ).calculate_result()
+
+        self.assertEqual(User.objects.get(pk=self.student.pk).battery_level, 20)
+        # Each copy was refreshed after its own UPDATE
+        self.assertEqual(first_tab.battery_level, 10)
+        self.assertEqual(second_tab.battery_level, 20)
+
+
+class CachedPaperTests(ExamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.quiz = make_quiz(questions=6)
+        Quiz.objects.filter(pk=self.quiz.pk).update(max_attempts=3)
+        self.student = User.objects.create_user('01012345678', 'pass', first_name='طالب')
+        self.client.force_login(self.student)
+
+    def test_result_page_shows_the_order_the_student_saw(self):
+        self.client.get(reverse('exams:quiz_take', args=[self.quiz.pk]))  # warm the cache
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('exams:quiz_take', args=[self.quiz.pk]))
+        self.assertFalse([q for q in ctx.captured_queries if '"exams_question"' in q['sql']])
+
+        response = self.client.get(reverse('exams:quiz_take', args=[self.quiz.pk]))
+        taken = [q['id'] for q in response.context['questions']]
+        submit_quiz(self.client, self.student, self.quiz, token=response.context['attempt_token'])
+
+        result = StudentResult.objects.get(student=self.student)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('exams:quiz_result', args=[result.pk]))
+        self.assertFalse([q for q in ctx.captured_queries if '"exams_question"' in q['sql']])
+        shown = [item['question']['id'] for item in response.context['questions_with_answers']]
+        self.assertEqual(shown, taken)
+
+
+class QuestionBankSamplingTests(ExamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.quiz = make_quiz(questions=10)
+        self.quiz.questions.filter(order__lt=6).update(tag='نظري')
+        Quiz.objects.filter(pk=self.quiz.pk).update(
+            questions_per_attempt=5, sampling_strata='tag', max_attempts=3
+        )
+        self.quiz.refresh_from_db()
+        self.student = User.objects.create_user('01012345678', 'pass', first_name='طالب')
+        self.client.force_login(self.student)
+
+    def test_allocation_keeps_bank_proportions(self):
+        self.assertEqual(allocate([6, 4], 5).tolist(), [3, 2])
+        self.assertEqual(allocate([1, 1, 1], 2).tolist(), [1, 1, 0])
+        self.assertEqual(int(allocate([7, 3, 11], 9).sum()), 9)
+
+    def test_draw_is_seeded_and_stratified(self):
+        answer_key = get_answer_key(self.quiz)
+        drawn = draw_questions(answer_key, 5, 'tag', seed=42)
+        self.assertEqual(drawn, draw_questions(answer_key, 5, 'tag', seed=42))
+        tags = dict(self.quiz.questions.values_list('id', 'tag'))
+        self.assertEqual(sorted(tags[qid] for qid in drawn), ['', '', 'نظري', 'نظري', 'نظري'])
+        self.assertIsNone(draw_questions(answer_key, 10))
+
+    def test_attempt_is_graded_on_the_drawn_questions(self):
+        response = self.client.get(reverse('exams:quiz_take', args=[self.quiz.pk]))
+        shown = [q['id'] for q in response.context['questions']]
+        self.assertEqual(len(shown), 5)
+
+        data = {f'question_{qid}': 'a' for qid in shown}
+        submit_quiz(self.client, self.student, self.quiz, data, token=response.context['attempt_token'])
+
+        result = StudentResult.objects.get(student=self.student)
+        self.assertEqual(sorted(result.question_ids), sorted(shown))
+        self.assertEqual((result.total_questions, result.correct_answers), (5, 5))
+
+        response = self.client.get(reverse('exams:quiz_result', args=[result.pk]))
+        rendered = [item['question']['id'] for item in response.context['questions_with_answers']]
+        self.assertEqual(sorted(rendered), sorted(shown))
+
+        # Questions that were not drawn get no attempt in the item stats
+        self.assertEqual(QuestionStat.objects.filter(attempts=1).count(), 5)
+        rebuild_item_stats(self.quiz)
+        self.assertEqual(QuestionStat.objects.filter(attempts=1).count(), 5)
+        self.assertEqual(QuestionStat.objects.filter(attempts=0).count(), 5)
+
+
+class PaperSnapshotTests(ExamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.quiz = make_quiz(questions=3)
+        Quiz.objects.filter(pk=self.quiz.pk).update(max_attempts=3)
+        self.student = User.objects.create_user('01012345678', 'pass', first_name='طالب')
+        self.client.force_login(self.student)
+
+    def test_result_page_shows_the_paper_as_graded(self):
+        submit_quiz(self.client, self.student, self.quiz)
+        submit_quiz(self.client, self.student, self.quiz)
+        self.assertEqual(PaperSnapshot.objects.count(), 1)
+        first, second = StudentResult.objects.order_by('attempt_number')
+        self.assertEqual(first.snapshot_id, second.snapshot_id)
+
+        question = self.quiz.questions.order_by('order').first()
+        question.text = 'نص معدل'
+        question.save()
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('exams:quiz_result', args=[first.pk]))
+        texts = [item['question']['text'] for item in response.context['questions_with_answers']]
+        self.assertIn('سؤال 0', texts)
+        self.assertNotIn('نص معدل', texts)
+        exam_queries = [q for q in ctx.captured_queries if '"exams_' in q['sql']]
+        self.assertEqual(len(exam_queries), 2)  # the result row + its quiz histogram
+        self.assertIn('"exams_papersnapshot"', exam_queries[0]['sql'])
+
+        # An attempt after the edit is graded against a new snapshot
+        submit_quiz(self.client, self.student, self.quiz)
+        self.assertEqual(PaperSnapshot.objects.count(), 2)
+
+
+class AutosaveTests(ExamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.quiz = make_quiz(questions=3)
+        self.questions = list(self.quiz.questions.order_by('order'))
+        self.student = User.objects.create_user('01012345678', 'pass', first_name='طالب')
+        self.client.force_login(self.student)
+
+    def take(self):
+        return self.client.get(reverse('exams:quiz_take', args=[self.quiz.pk]))
+
+    def autosave(self, token, answers):
+        data = {f'question_{q.pk}': a for q, a in zip(self.questions, answers) if a}
+        data['attempt_token'] = token
+        return self.client.post(reverse('exams:quiz_autosave', args=[self.quiz.pk]), data)
+
+    def test_reopening_resumes_the_attempt(self):
+        token = self.take().context['attempt_token']
+        self.assertTrue(self.autosave(token, 'ab').json()['success'])
+
+        response = self.take()
+        self.assertEqual(response.context['attempt_token'], token)
+        saved = {q['id']: q['saved'] for q in response.context['questions']}
+        self.assertEqual(saved[self.questions[1].pk], 'b')
+
+    def test_autosave_coalesces_durable_writes(self):
+        token = self.take().context['attempt_token']
+        with CaptureQueriesContext(connection) as ctx:
+            for answers in ('a', 'ab', 'abc'):
+                self.autosave(token, answers)
+        self.assertFalse([q for q in ctx.captured_queries if 'exams_quizdraft' in q['sql']])
+
+    def test_expired_attempt_is_graded_from_the_draft(self):
+        with patch('apps.exams.tokens.time.time', return_value=time.time() - 3600):
+            token = self.take().context['attempt_token']
+            self.autosave(token, 'a-a')
+
+        submit_quiz(self.client, self.student, self.quiz, {}, token=token)
+
+        result = StudentResult.objects.get(student=self.student)
+        self.assertEqual((result.answer_string, result.correct_answers), ('a-a', 2))
+        self.assertEqual(result.time_taken, self.quiz.time_limit * 60)
+        self.assertIsNone(cache.get(f'exams:draft:{self.student.pk}:{self.quiz.pk}'))
+
+
+class ResultExportTests(ExamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.quiz = make_quiz(questions=2)
+        self.questions = list(self.quiz.questions.order_by('order'))
+        for phone, answers in (('01012345671', 'ab'), ('01012345672', 'aa')):
+            student = User.objects.create_user(phone, 'pass', first_name='طالب')
+            self.client.force_login(student)
+            data = {f'question_{q.pk}': a for q, a in zip(self.questions, answers)}
+            submit_quiz(self.client, student, self.quiz, data)
+        admin = User.objects.create_superuser('01000000001', 'pass', first_name='Admin')
+        self.client.force_login(admin)
+
+    def export(self, action):
+        ids = StudentResult.objects.values_list('pk', flat=True)
+        return self.client.post(reverse('admin:exams_studentresult_changelist'), {
+            'action': action, '_selected_action': list(ids),
+        })
+
+    def test_csv_streams_with_question_columns(self):
+        response = self.export('export_results_with_answers')
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].endswith('س1,س2'))
+        self.assertTrue(lines[1].startswith('طالب,01012345671'))
+        self.assertTrue(lines[1].endswith(',a,b'))
+
+    def test_xlsx_export(self):
+        import io
+        from openpyxl import load_workbook
+        response = self.export('export_results_xlsx')
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(workbook.active.max_row, 3)
+
+    def test_formula_like_text_is_escaped(self):
+        import io
+        from openpyxl import load_workbook
+        User.objects.filter(phone_number='01012345671').update(first_name='=HYPERLINK("x")', last_name='')
+        Quiz.objects.filter(pk=self.quiz.pk).update(title='@SUM(A1)')
+
+        response = self.export('export_results')
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertTrue(lines[1].startswith('"\'=HYPERLINK(""x"")",01012345671'))
+        self.assertIn(",'@SUM(A1),", lines[1])
+
+        response = self.export('export_results_xlsx')
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        row = [cell.value for cell in sheet[2]]
+        self.assertEqual((row[0], row[5]), ('\'=HYPERLINK("x")', "'@SUM(A1)"))
+        self.assertEqual(sheet['A2'].data_type, 's')
+
+
+class QuestionImportExportTests(ExamTestCase):
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = self.settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.quiz = make_quiz(questions=2)
+        admin = User.objects.create_superuser('01000000001', 'pass', first_name='Admin')
+        self.client.force_login(admin)
+
+    def upload(self, name, content, replace=False):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        data = {'questions_file': SimpleUploadedFile(name, content)}
+        if replace:
+            data['replace'] = 'on'
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('admin:exams_quiz_import_questions', args=[self.quiz.pk]), data
+            )
+
+    def zip_bundle(self, rows, files):
+        import io
+        import json
+        import zipfile
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('questions.json', json.dumps(rows))
+            for name, content in files.items():
+                archive.writestr(name, content)
+        return buffer.getvalue()
+
+    def test_csv_round_trip_appends_and_invalidates_key(self):
+        version = self.quiz.questions_version
+        response = self.client.get(
+            reverse('admin:exams_quiz_export_questions', args=[self.quiz.pk]), {'format': 'csv'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+        with self.assertNumQueries(8):
+            # session, user, quiz, max(order), savepoint, bulk_create, version bump, release
+            response = self.upload('questions.csv', response.content)
+        self.assertEqual(response.status_code, 302)
+
+        orders = list(self.quiz.questions.order_by('order').values_list('order', flat=True))
+        self.assertEqual(len(orders), 4)
+        self.quiz.refresh_from_db()
+        self.assertGreater(self.quiz.questions_version, version)
+        self.assertEqual(len(get_answer_key(self.quiz)), 4)
+
+    def test_zip_with_images_replaces_questions(self):
+        import io
+        import json
+        import zipfile
+        rows = [
+            {'text': 'س1', 'option_a': '1', 'option_b': '2', 'option_c': '3', 'option_d': '4',
+             'correct_answer': 'ب', 'image': 'diagram.png'},
+            {'text': 'س2', 'option_a': '1', 'option_b': '2', 'option_c': '3', 'option_d': '4',
+             'correct_answer': 'd', 'points': 2},
+        ]
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('questions.json', json.dumps(rows))
+            archive.writestr('images/diagram.png', b'\x89PNG fake')
+
+        response = self.upload('bundle.zip', buffer.getvalue(), replace=True)
+        self.assertEqual(response.status_code, 302)
+
+        questions = list(self.quiz.questions.order_by('order'))
+        self.assertEqual([q.correct_answer for q in questions], ['b', 'd'])
+        self.assertTrue(questions[0].image.name.endswith('.png'))
+        self.assertFalse(questions[1].image)
+
+        response = self.client.get(reverse('admin:exams_quiz_export_questions', args=[self.quiz.pk]))
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            self.assertEqual(len(archive.namelist()), 2)
+
+    def test_same_named_images_in_different_folders(self):
+        question = {'text': 'س', 'option_a': '1', 'option_b': '2', 'option_c': '3', 'option_d': '4',
+                    'correct_answer': 'a'}
+        files = {'part1/fig.png': b'\x89PNG first', 'part2/fig.png': b'\x89PNG second'}
+
+        response = self.upload(
+            'bundle.zip', self.zip_bundle([dict(question, image='fig.png')], files), replace=True
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('أكثر من مجلد', response.context['import_errors'][0])
+
+        rows = [dict(question, image='part1/fig.png'), dict(question, image='part2/fig.png')]
+        response = self.upload('bundle.zip', self.zip_bundle(rows, files), replace=True)
+        self.assertEqual(response.status_code, 302)
+        contents = []
+        for question in self.quiz.questions.order_by('order'):
+            with question.image.open('rb') as image:
+                contents.append(image.read())
+        self.assertEqual(contents, [b'\x89PNG first', b'\x89PNG second'])
+
+    def test_oversized_question_file_is_rejected(self):
+        bundle = self.zip_bundle([{'text': 'س' * 20}], {})
+        with patch('apps.exams.question_io.MAX_QUESTION_FILE_SIZE', 10):
+            response = self.upload('bundle.zip', bundle)
+            self.assertEqual(len(response.context['import_errors']), 1)
+            response = self.upload('questions.json', b'[' + b' ' * 20 + b']')
+            self.assertEqual(len(response.context['import_errors']), 1)
+        self.assertEqual(self.quiz.questions.count(), 2)
+
+    def test_rollback_stores_no_images(self):
+        import os
+        from django.conf import settings
+        rows = [{'text': 'س', 'option_a': '1', 'option_b': '2', 'option_c': '3', 'option_d': '4',
+                 'correct_answer': 'a', 'image': 'fig.png'}]
+        bundle = self.zip_bundle(rows, {'fig.png': b'\x89PNG'})
+        with patch('apps.exams.question_io.bump_questions_version', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.upload('bundle.zip', bundle, replace=True)
+
+        self.assertEqual(self.quiz.questions.count(), 2)
+        self.assertEqual([files for _, _, files in os.walk(settings.MEDIA_ROOT) if files], [])
+
+    def test_every_invalid_row_is_reported_and_nothing_written(self):
+        import json
+        rows = [
+            {'text': '', 'option_a': '1', 'option_b': '2', 'option_c': '3', 'option_d': '4',
+             'correct_answer': 'a'},
+            {'text': 'س', 'option_a': '1', 'option_b': '2', 'option_c': '3', 'option_d': '4',
+             'correct_answer': 'z'},
+            {'text': 'س', 'option_a': '1', 'option_b': '2', 'option_c': '3', 'option_d': '4',
+             'correct_answer': 'a', 'image': 'missing.png'},
+        ]
+        response = self.upload('questions.json', json.dumps(rows).encode(), replace=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['import_errors']), 3)
+        self.assertEqual(self.quiz.questions.count(), 2)
+
+
+class ScoreHistogramTests(ExamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.quiz = make_quiz(questions=4)
+        self.questions = list(self.quiz.questions.order_by('order'))
+        self.students = []
+        # 25%, 50%, 50%, 100%
+        for i, right in enumerate((1, 2, 2, 4)):
+            student = User.objects.create_user(f'0101234567{i}', 'pass', first_name='طالب')
+            self.client.force_login(student)
+            data = {f'question_{q.pk}': 'a' if n < right else 'b' for n, q in enumerate(self.questions)}
+            submit_quiz(self.client, student, self.quiz, data)
+            self.students.append(student)
+
+    def test_histogram_is_updated_on_insert_and_delete(self):
+        histogram = get_histograms([self.quiz.pk])[self.quiz.pk]
+        self.assertEqual((histogram[25], histogram[50], histogram[100]), (1, 2, 1))
+        self.assertEqual(percentile_rank(histogram, 50), 50)
+        self.assertEqual(percentile_rank(histogram, 100), 88)
+
+        StudentResult.objects.filter(student=self.students[0]).delete()
+        self.assertEqual(QuizScoreBucket.objects.get(quiz=self.quiz, bucket=25).count, 0)
+
+        QuizScoreBucket.objects.all().delete()
+        self.assertEqual(rebuild_score_histogram(self.quiz), 3)
+        self.assertEqual(
+            dict(QuizScoreBucket.objects.values_list('bucket', 'count')), {50: 2, 100: 1}
+        )
+
+    def test_quiz_and_lecture_with_results_can_be_deleted(self):
+        from apps.courses.models import Lecture
+        other = make_quiz(questions=1)
+        submit_quiz(self.client, self.students[0], other)
+        QuizScoreBucket.objects.filter(quiz=other).delete()  # with and without bucket rows
+
+        for obj in (self.quiz, Lecture.objects.get(pk=other.lecture_id)):
+            with self.subTest(model=obj._meta.model_name):
+                obj.delete()
+                # SQLite checks foreign keys at commit; check them now
+                connection.check_constraints()
+        self.assertFalse(QuizScoreBucket.objects.exists())
+        self.assertFalse(StudentResult.objects.exists())
+
+    def test_pages_rank_without_scanning_results(self):
+        result = StudentResult.objects.get(student=self.students[3])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('exams:quiz_result', args=[result.pk]))
+        self.assertEqual(response.context['result'].percentile, 88)
+        self.assertEqual(
+            len([q for q in ctx.captured_queries if '"exams_studentresult"' in q['sql']]), 1
+        )
+
+        response = self.client.get(reverse('exams:my_results'))
+        self.assertContains(response, 'أفضل من 88%')
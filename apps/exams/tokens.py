@@ -0,0 +1,55 @@
+"""
+Signed attempt tokens
+توكن المحاولة الموقّع
+
+quiz_take hands the student a signed token carrying the user, quiz,
+attempt number, start time, shuffle seed and, for question-bank quizzes,
+the ids drawn for the attempt. quiz_submit verifies it and
+enforces the deadline from the token alone, so an attempt needs no
+session writes and late submissions are rejected server-side.
+"""
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core import signing
+
+TOKEN_SALT = 'exams.attempt'
+
+AttemptToken = namedtuple(
+    'AttemptToken', 'user_id quiz_id attempt_number started_at seed question_ids',
+    defaults=(None,)
+)
+
+
+class AttemptTokenError(Exception):
+    """The token is missing, forged or belongs to another user/quiz"""
+
+
+def issue_attempt_token(user_id, quiz_id, attempt_number, seed, question_ids=None):
+    data = {'u': user_id, 'q': quiz_id, 'a': attempt_number, 't': int(time.time()), 's': seed}
+    if question_ids is not None:
+        data['d'] = question_ids
+    return signing.dumps(data, salt=TOKEN_SALT, compress=True)
+
+
+def read_attempt_token(token, user_id, quiz_id):
+    """Verify the signature and owner; returns an AttemptToken"""
+    if not token:
+        raise AttemptTokenError('missing token')
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT)
+    except signing.BadSignature:
+        raise AttemptTokenError('bad signature')
+    if data.get('u') != user_id or data.get('q') != quiz_id:
+        raise AttemptTokenError('token for another user or quiz')
+    return AttemptToken(data['u'], data['q'], data['a'], data['t'], data.get('s'), data.get('d'))
+
+
+def seconds_elapsed(token, now=None):
+    return int((now or time.time()) - token.started_at)
+
+
+def is_late(token, time_limit_minutes, now=None):
+    allowed = time_limit_minutes * 60 + settings.QUIZ_SUBMIT_GRACE_SECONDS
+    return seconds_elapsed(token, now) > allowed
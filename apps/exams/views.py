@@ -3,8 +3,19 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.utils import timezone
 from django.contrib import messages
-import random
+from django.db import transaction
+from apps.users.models import StudentStanding
+from .attempts import claim_attempt, get_attempt_counts, get_attempts_used
+from .compact import pack_answers
+from .drafts import discard_draft, get_draft, save_draft
+from .item_analysis import record_item_stats
 from .models import Quiz, Question, StudentResult
+from .papers import get_paper, get_snapshot_id, new_paper_seed, shuffle_paper
+from .sampling import draw_for_attempt, get_attempt_key
+from .score_histograms import attach_percentile_ranks, record_scores
+from .tokens import (
+    AttemptTokenError, is_late, issue_attempt_token, read_attempt_token, seconds_elapsed
+)
 
 
 @login_required
@@ -13,28 +24,26 @@ def quiz_intro(request, quiz_id):
     quiz = get_object_or_404(Quiz, id=quiz_id, is_active=True)
     
     # Check if user has access to the lecture
-    from apps.courses.models import Enrollment
-    enrollment = Enrollment.objects.filter(
-        student=request.user,
-        lecture=quiz.lecture
-    ).first()
-    
-    if not enrollment and not quiz.lecture.is_free:
+    from apps.courses.entitlements import get_entitlements
+    if not get_entitlements(request.user).can_watch(quiz.lecture):
         messages.error(request, 'ليس لديك صلاحية الوصول لهذا الامتحان')
         return redirect('courses:lecture_list', chapter_id=quiz.lecture.chapter.id)
     
     # Check attempts
-    attempts = StudentResult.objects.filter(
-        student=request.user,
-        quiz=quiz
-    ).count()
+    attempts = get_attempts_used(request.user.pk, quiz.pk)
     
     can_take = attempts < quiz.max_attempts
     
+    # Question-bank quizzes show only questions_per_attempt of their questions
+    questions_count = quiz.questions_count
+    if quiz.is_sampled:
+        questions_count = min(questions_count, quiz.questions_per_attempt)
+    
     context = {
         'quiz': quiz,
         'attempts': attempts,
         'can_take': can_take,
+        'questions_count': questions_count,
     }
     return render(request, 'exams/quiz_intro.html', context)
 
@@ -45,31 +54,77 @@ def quiz_take(request, quiz_id):
     quiz = get_object_or_404(Quiz, id=quiz_id, is_active=True)
     
     # Check attempts
-    attempts = StudentResult.objects.filter(
-        student=request.user,
-        quiz=quiz
-    ).count()
+    attempts, attempt_number = get_attempt_counts(request.user.pk, quiz.pk)
     
     if attempts >= quiz.max_attempts:
         messages.error(request, 'لقد استنفذت جميع محاولاتك')
         return redirect('exams:quiz_intro', quiz_id=quiz.id)
     
-    # Get questions
-    questions = list(quiz.questions.all())
-    if quiz.shuffle_questions:
-        random.shuffle(questions)
-    
-    # Store start time in session
-    request.session[f'quiz_{quiz.id}_start'] = timezone.now().isoformat()
+    # Resume the open attempt (same token, clock and order) if there is one
+    draft = get_draft(request.user.pk, quiz)
+    token = None
+    if draft and draft['attempt'] == attempt_number:
+        try:
+            token = read_attempt_token(draft['token'], request.user.pk, quiz.id)
+        except AttemptTokenError:
+            pass
+    
+    if token and is_late(token, quiz.time_limit):
+        # Time ran out while the page was closed: grade what was saved
+        answer_key = get_attempt_key(quiz, token)
+        return _record_submission(request, quiz, answer_key, token, answer_key.decode(draft['answers']))
+    
+    if token is None:
+        # Start time and seed travel in a signed token, not the session
+        seed = new_paper_seed() if quiz.shuffle_questions else None
+        drawn = draw_for_attempt(quiz, new_paper_seed())
+        signed = issue_attempt_token(request.user.pk, quiz.id, attempt_number, seed, drawn)
+        draft = save_draft(request.user.pk, quiz, attempt_number, signed)
+        token = read_attempt_token(signed, request.user.pk, quiz.id)
+    
+    # Serialized paper from the cache, cut down to the drawn questions and
+    # shuffled per student from the seed
+    paper = {question['id']: question for question in get_paper(quiz)}
+    question_ids = get_attempt_key(quiz, token).question_ids.tolist()
+    saved = dict(zip(question_ids, draft['answers']))
+    questions = [
+        dict(paper[question_id], saved=saved.get(question_id, ''))
+        for question_id in shuffle_paper(question_ids, token.seed)
+    ]
     
     context = {
         'quiz': quiz,
         'questions': questions,
-        'attempt_number': attempts + 1,
+        'attempt_number': attempt_number,
+        'attempt_token': draft['token'],
+        'remaining_seconds': max(0, quiz.time_limit * 60 - seconds_elapsed(token)),
     }
     return render(request, 'exams/quiz_take.html', context)
 
 
+@login_required
+def quiz_autosave(request, quiz_id):
+    """حفظ تلقائي لإجابات الامتحان (AJAX)"""
+    if request.method == 'POST':
+        quiz = get_object_or_404(Quiz, id=quiz_id, is_active=True)
+        signed = request.POST.get('attempt_token')
+        try:
+            token = read_attempt_token(signed, request.user.pk, quiz.id)
+        except AttemptTokenError:
+            return JsonResponse({'success': False}, status=400)
+        
+        if is_late(token, quiz.time_limit):
+            return JsonResponse({'success': False, 'expired': True}, status=409)
+        
+        submitted = get_attempt_key(quiz, token).encode_submission(request.POST)
+        save_draft(
+            request.user.pk, quiz, token.attempt_number, signed, pack_answers(submitted.tolist())
+        )
+        return JsonResponse({'success': True})
+    
+    return JsonResponse({'success': False}, status=400)
+
+
 @login_required
 def quiz_submit(request, quiz_id):
     """تسليم الامتحان وحساب النتيجة"""
@@ -77,61 +132,64 @@ def quiz_submit(request, quiz_id):
         return redirect('exams:quiz_take', quiz_id=quiz_id)
     
     quiz = get_object_or_404(Quiz, id=quiz_id)
-    questions = quiz.questions.all()
-    
-    # Calculate time taken
-    start_time_str = request.session.get(f'quiz_{quiz.id}_start')
-    if start_time_str:
-        from datetime import datetime
-        start_time = datetime.fromisoformat(start_time_str)
-        time_taken = int((timezone.now() - timezone.make_aware(start_time)).total_seconds())
-    else:
-        time_taken = 0
     
-    # Grade the quiz
-    correct_count = 0
-    total_points = 0
-    answers_data = {}
+    signed = request.POST.get('attempt_token')
+    try:
+        token = read_attempt_token(signed, request.user.pk, quiz.id)
+    except AttemptTokenError:
+        messages.error(request, 'انتهت صلاحية الامتحان، ابدأ من جديد')
+        return redirect('exams:quiz_intro', quiz_id=quiz.id)
     
-    for question in questions:
-        answer = request.POST.get(f'question_{question.id}', '')
-        is_correct = answer.lower() == question.correct_answer.lower()
-        
-        answers_data[str(question.id)] = {
-            'answer': answer,
-            'correct': question.correct_answer,
-            'is_correct': is_correct
-        }
-        
-        if is_correct:
-            correct_count += 1
-            total_points += question.points
-    
-    # Create result
-    attempts = StudentResult.objects.filter(
-        student=request.user,
-        quiz=quiz
-    ).count()
-    
-    result = StudentResult.objects.create(
-        student=request.user,
-        quiz=quiz,
-        score=total_points,
-        total_questions=questions.count(),
-        correct_answers=correct_count,
-        answers_data=answers_data,
-        time_taken=time_taken,
-        attempt_number=attempts + 1,
-        completed_at=timezone.now()
-    )
+    # Grade only the questions drawn for this attempt
+    answer_key = get_attempt_key(quiz, token)
     
-    # Calculate and save result
-    result.calculate_result()
-    result.save()
+    if is_late(token, quiz.time_limit):
+        # Too late for the posted answers; fall back to the last autosave
+        draft = get_draft(request.user.pk, quiz)
+        if not draft or draft['token'] != signed:
+            messages.error(request, 'انتهى وقت الامتحان ولم يتم قبول الإجابات ⏰')
+            return redirect('exams:quiz_intro', quiz_id=quiz.id)
+        submitted = answer_key.decode(draft['answers'])
+    else:
+        submitted = answer_key.encode_submission(request.POST)
     
-    # Clear session
-    if f'quiz_{quiz.id}_start' in request.session:
-        del request.session[f'quiz_{quiz.id}_start']
+    return _record_submission(request, quiz, answer_key, token, submitted)
+
+
+def _record_submission(request, quiz, answer_key, token, submitted):
+    """Grade an answer vector against the compiled key and store the result"""
+    correct, correct_count, total_points = answer_key.grade(submitted)
+    # A cold snapshot reads the paper; keep that out of the transaction
+    snapshot_id = get_snapshot_id(quiz)
+    
+    with transaction.atomic():
+        # Claim an attempt atomically; concurrent submits cannot both pass
+        attempt_number = claim_attempt(request.user.pk, quiz, token.attempt_number)
+        if attempt_number is None:
+            messages.error(request, 'تم تسليم هذه المحاولة من قبل أو استنفذت جميع محاولاتك')
+            return redirect('exams:quiz_intro', quiz_id=quiz.id)
+        
+        result = StudentResult.objects.create(
+            student=request.user,
+            quiz=quiz,
+            score=total_points,
+            total_questions=len(answer_key),
+            correct_answers=correct_count,
+            time_taken=min(seconds_elapsed(token), quiz.time_limit * 60),
+            attempt_number=attempt_number,
+            paper_seed=token.seed,
+            snapshot_id=snapshot_id,
+            completed_at=timezone.now(),
+            **answer_key.compact_fields(submitted, correct)
+        )
+        
+        # Calculate and save result
+        result.calculate_result()
+        result.save()
+        record_item_stats(answer_key, submitted, float(result.percentage))
+        record_scores(quiz.pk, [result.percentage])
+        StudentStanding.objects.add_results({request.user.pk: [result.percentage]})
+        discard_draft(request.user.pk, quiz.id)
     
     return redirect('exams:quiz_result', result_id=result.id)
 
@@ -140,22 +198,30 @@ def quiz_submit(request, quiz_id):
 def quiz_result(request, result_id):
     """صفحة عرض نتيجة الامتحان"""
     result = get_object_or_404(
-        StudentResult,
+        StudentResult.objects.select_related('quiz', 'snapshot'),
         id=result_id,
         student=request.user
     )
     
-    # Prepare questions with answers if allowed
+    # Rebuild the order the student saw from the graded paper and the seed
     questions_with_answers = []
     if result.quiz.show_answers:
-        for question in result.quiz.questions.all():
-            q_data = result.answers_data.get(str(question.id), {})
+        answers = result.get_answers()
+        # Results older than snapshots fall back to the live paper
+        paper = result.snapshot.questions if result.snapshot else get_paper(result.quiz)
+        paper = {question['id']: question for question in paper}
+        for question_id in shuffle_paper(list(answers), result.paper_seed):
+            if question_id not in paper:
+                continue  # deleted since the attempt
+            answer, is_correct = answers[question_id]
             questions_with_answers.append({
-                'question': question,
-                'student_answer': q_data.get('answer', ''),
-                'is_correct': q_data.get('is_correct', False),
+                'question': paper[question_id],
+                'student_answer': answer,
+                'is_correct': is_correct,
             })
     
+    attach_percentile_ranks([result])
+    
     context = {
         'result': result,
         'questions_with_answers': questions_with_answers,
@@ -170,6 +236,9 @@ def my_results(request):
         student=request.user
     ).select_related('quiz', 'quiz__lecture')
     
+    # Rank within each quiz from its score histogram, one query for all
+    results = attach_percentile_ranks(list(results))
+    
     context = {
         'results': results
     }
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.utils import timezone
 from .models import WalletConfig, PaymentOrder
 from apps.courses.models import Enrollment
+from apps.courses.entitlements import invalidate_entitlements
 
 
 @admin.register(WalletConfig)
@@ -58,6 +59,7 @@ class PaymentOrderAdmin(admin.ModelAdmin):
                 student=order.student,
                 lecture=order.lecture
             )
+            invalidate_entitlements(order.student)
             count += 1
         
         self.message_user(request, f'تم تأكيد {count} طلب دفع وتفعيل المحاضرات ✅')
@@ -80,5 +82,6 @@ class PaymentOrderAdmin(admin.ModelAdmin):
                 student=obj.student,
                 lecture=obj.lecture
             )
+            invalidate_entitlements(obj.student)
         
         super().save_model(request, obj, form, change)
@@ -6,7 +6,8 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 
 from .models import WalletConfig, PaymentOrder
-from apps.courses.models import Lecture, Enrollment
+from apps.courses.models import Lecture
+from apps.courses.entitlements import get_entitlements
 
 
 @login_required
@@ -15,7 +16,7 @@ def initiate_payment(request, lecture_id):
     lecture = get_object_or_404(Lecture, id=lecture_id, is_active=True)
     
     # Check if already enrolled
-    if Enrollment.objects.filter(student=request.user, lecture=lecture).exists():
+    if get_entitlements(request.user).owns(lecture.id):
         return redirect('courses:lecture_detail', lecture_id=lecture.id)
     
     # Check for existing pending order
@@ -0,0 +1,70 @@
+"""
+Leaderboards
+لوحات الشرف: أعلى الطلاب شحناً وأعلى متوسط في الامتحانات
+
+Boards are scoped to a grade, optionally narrowed to a governorate. The
+battery board reads User through the (grade[, governorate], battery_level)
+indexes; the quiz board reads the StudentStanding rollup, which is updated
+incrementally as results are recorded. Either way a board is the first N
+entries of an index range, and the rendered list is cached for a minute,
+so the cost of a page does not grow with the number of students.
+"""
+from django.core.cache import cache
+
+from .models import StudentStanding, User
+
+LEADERBOARD_SIZE = 50
+LEADERBOARD_TIMEOUT = 60
+
+BOARDS = {
+    'battery': 'الأعلى شحناً 🔋',
+    'quiz': 'الأعلى في الامتحانات 📝',
+}
+
+
+def leaderboard_cache_key(board, grade, governorate=''):
+    return f'leaderboard:{board}:{grade}:{governorate or "all"}'
+
+
+def _battery_board(grade, governorate, limit):
+    users = User.objects.filter(grade=grade, role='student', is_active=True)
+    if governorate:
+        users = users.filter(governorate=governorate)
+    rows = users.order_by('-battery_level', 'id').values_list(
+        'id', 'first_name', 'last_name', 'governorate', 'battery_level'
+    )[:limit]
+    return [
+        {'student_id': pk, 'name': f'{first} {last}'.strip(), 'governorate': gov, 'value': level}
+        for pk, first, last, gov, level in rows
+    ]
+
+
+def _quiz_board(grade, governorate, limit):
+    standings = StudentStanding.objects.filter(grade=grade, results_count__gt=0)
+    if governorate:
+        standings = standings.filter(governorate=governorate)
+    rows = standings.order_by('-quiz_average', 'student').values_list(
+        'student_id', 'student__first_name', 'student__last_name', 'governorate', 'quiz_average'
+    )[:limit]
+    return [
+        {'student_id': pk, 'name': f'{first} {last}'.strip(), 'governorate': gov, 'value': round(avg, 1)}
+        for pk, first, last, gov, avg in rows
+    ]
+
+
+def get_leaderboard(board, grade, governorate='', limit=LEADERBOARD_SIZE):
+    """Top `limit` students as a list of dicts (student_id, name, governorate, value)"""
+    key = leaderboard_cache_key(board, grade, governorate)
+    entries = cache.get(key)
+    if entries is None:
+        read = _quiz_board if board == 'quiz' else _battery_board
+        entries = read(grade, governorate, limit)
+        cache.set(key, entries, LEADERBOARD_TIMEOUT)
+    return entries
+
+
+def sync_standing_scope(user):
+    """Copy a student's grade/governorate onto their standing row"""
+    StudentStanding.objects.filter(student_id=user.pk).exclude(
+        grade=user.grade, governorate=user.governorate
+    ).update(grade=user.grade, governorate=user.governorate)
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:39
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+import django.db.models.deletion
+
+
+def fill_standings(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    StudentResult = apps.get_model('exams', 'StudentResult')
+    StudentStanding = apps.get_model('users', 'StudentStanding')
+    totals = {
+        row['student_id']: (row['n'], float(row['total'] or 0))
+        for row in StudentResult.objects.values('student_id').annotate(
+            n=Count('id'), total=Sum('percentage')
+        )
+    }
+    standings = [
+        StudentStanding(
+            student_id=pk,
+            grade=grade,
+            governorate=governorate,
+            results_count=totals[pk][0],
+            percentage_sum=totals[pk][1],
+            quiz_average=totals[pk][1] / totals[pk][0],
+        )
+        for pk, grade, governorate in User.objects.filter(
+            pk__in=list(totals)
+        ).values_list('pk', 'grade', 'governorate').iterator(chunk_size=2000)
+    ]
+    StudentStanding.objects.bulk_create(standings, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        ('exams', '0013_quiz_score_bucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentStanding',
+            fields=[
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='standing', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='الطالب')),
+                ('grade', models.IntegerField(blank=True, choices=[(1, 'الصف الأول الثانوي'), (2, 'الصف الثاني الثانوي'), (3, 'الصف الثالث الثانوي')], null=True, verbose_name='السنة الدراسية')),
+                ('governorate', models.CharField(blank=True, choices=[('cairo', 'القاهرة'), ('giza', 'الجيزة'), ('alexandria', 'الإسكندرية'), ('dakahlia', 'الدقهلية'), ('sharqia', 'الشرقية'), ('qalyubia', 'القليوبية'), ('gharbia', 'الغربية'), ('monufia', 'المنوفية'), ('beheira', 'البحيرة'), ('kafr_el_sheikh', 'كفر الشيخ'), ('damietta', 'دمياط'), ('port_said', 'بورسعيد'), ('ismailia', 'الإسماعيلية'), ('suez', 'السويس'), ('fayoum', 'الفيوم'), ('beni_suef', 'بني سويف'), ('minya', 'المنيا'), ('asyut', 'أسيوط'), ('sohag', 'سوهاج'), ('qena', 'قنا'), ('aswan', 'أسوان'), ('luxor', 'الأقصر'), ('red_sea', 'البحر الأحمر'), ('new_valley', 'الوادي الجديد'), ('matruh', 'مطروح'), ('north_sinai', 'شمال سيناء'), ('south_sinai', 'جنوب سيناء')], max_length=20, verbose_name='المحافظة')),
+                ('results_count', models.PositiveIntegerField(default=0, verbose_name='عدد الامتحانات')),
+                ('percentage_sum', models.FloatField(default=0)),
+                ('quiz_average', models.FloatField(default=0, verbose_name='متوسط الامتحانات (%)')),
+            ],
+            options={
+                'verbose_name': 'ترتيب طالب',
+                'verbose_name_plural': 'ترتيب الطلاب',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['grade', '-battery_level', 'id'], name='user_grade_battery_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['grade', 'governorate', '-battery_level', 'id'], name='user_grade_gov_battery_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentstanding',
+            index=models.Index(fields=['grade', '-quiz_average', 'student'], name='standing_grade_avg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentstanding',
+            index=models.Index(fields=['grade', 'governorate', '-quiz_average', 'student'], name='standing_grade_gov_avg_idx'),
+        ),
+        migrations.RunPython(fill_standings, migrations.RunPython.noop),
+    ]
@@ -4,6 +4,8 @@ Custom User Model for Voltage Platform
 """
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
+from django.db.models import Case, F, FloatField, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest, Least
 from django.core.validators import RegexValidator
 
 
@@ -23,6 +25,27 @@ class UserManager(BaseUserManager):
         extra_fields.setdefault('is_superuser', True)
         extra_fields.setdefault('role', 'admin')
         return self.create_user(phone_number, password, **extra_fields)
+    
+    def adjust_battery(self, user_ids, delta):
+        """Add delta to battery_level, clamped to 0-100, in a single UPDATE"""
+        level = F('battery_level') + delta
+        level = Least(level, Value(100)) if delta > 0 else Greatest(level, Value(0))
+        return self.filter(pk__in=user_ids).update(battery_level=level)
+    
+    def adjust_battery_bulk(self, deltas):
+        """Apply a {user_id: delta} mapping, clamped to 0-100, in a single UPDATE"""
+        if not deltas:
+            return 0
+        by_delta = {}
+        for user_id, delta in deltas.items():
+            by_delta.setdefault(delta, []).append(user_id)
+        delta = Case(
+            *[When(pk__in=ids, then=Value(d)) for d, ids in by_delta.items()],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+        level = Greatest(Least(F('battery_level') + delta, Value(100)), Value(0))
+        return self.filter(pk__in=list(deltas)).update(battery_level=level)
 
 
 class User(AbstractUser):
@@ -145,6 +168,17 @@ class User(AbstractUser):
         verbose_name = 'مستخدم'
         verbose_name_plural = 'المستخدمين'
         ordering = ['-created_at']
+        indexes = [
+            # Battery leaderboards: top-N within a grade (and governorate)
+            models.Index(
+                fields=['grade', '-battery_level', 'id'],
+                name='user_grade_battery_idx'
+            ),
+            models.Index(
+                fields=['grade', 'governorate', '-battery_level', 'id'],
+                name='user_grade_gov_battery_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.get_full_name()} ({self.phone_number})"
@@ -188,3 +222,106 @@ class ActivationCode(models.Model):
     
     def __str__(self):
         return f"{self.code} - {self.lecture.title}"
+
+
+class StudentStandingManager(models.Manager):
+    
+    def add_results(self, percentages, sign=1):
+        """
+        Fold {student_id: [percentage, ...]} into the students' quiz averages
+        in a single UPDATE (sign=-1 takes deleted results back out)
+        """
+        if not percentages:
+            return 0
+        rows = self.filter(student_id__in=list(percentages))
+        if sign > 0:
+            # Rows for students with no standing yet, copying their scope
+            self.bulk_create(
+                [
+                    StudentStanding(student_id=pk, grade=grade, governorate=governorate)
+                    for pk, grade, governorate in User.objects.filter(
+                        pk__in=list(percentages)
+                    ).values_list('pk', 'grade', 'governorate')
+                ],
+                ignore_conflicts=True
+            )
+        else:
+            # Only take back what was counted: results created without
+            # add_results would otherwise push results_count below zero
+            counted = Q()
+            for pk, p in percentages.items():
+                counted |= Q(student_id=pk, results_count__gte=len(p))
+            rows = rows.filter(counted)
+        count = Case(
+            *[When(student_id=pk, then=Value(sign * len(p))) for pk, p in percentages.items()],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+        total = Case(
+            *[
+                When(student_id=pk, then=Value(sign * float(sum(p))))
+                for pk, p in percentages.items()
+            ],
+            default=Value(0.0),
+            output_field=FloatField()
+        )
+        # Both sides of the SET read the old row, so the average is exact
+        return rows.update(
+            results_count=F('results_count') + count,
+            percentage_sum=F('percentage_sum') + total,
+            quiz_average=(F('percentage_sum') + total) / Greatest(
+                F('results_count') + count, Value(1)
+            ),
+        )
+
+
+class StudentStanding(models.Model):
+    """
+    ترتيب الطالب - Rollup of a student's quiz results (count, sum and
+    average percentage), kept up to date as results are recorded, with
+    the student's grade and governorate copied in so each leaderboard is
+    an index range read instead of an aggregate over every result.
+    """
+    
+    student = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='standing',
+        verbose_name='الطالب'
+    )
+    grade = models.IntegerField(
+        'السنة الدراسية',
+        choices=User.GRADE_CHOICES,
+        null=True,
+        blank=True
+    )
+    governorate = models.CharField(
+        'المحافظة',
+        max_length=20,
+        choices=User.GOVERNORATE_CHOICES,
+        blank=True
+    )
+    
+    results_count = models.PositiveIntegerField('عدد الامتحانات', default=0)
+    percentage_sum = models.FloatField(default=0)
+    quiz_average = models.FloatField('متوسط الامتحانات (%)', default=0)
+    
+    objects = StudentStandingManager()
+    
+    class Meta:
+        verbose_name = 'ترتيب طالب'
+        verbose_name_plural = 'ترتيب الطلاب'
+        indexes = [
+            models.Index(
+                fields=['grade', '-quiz_average', 'student'],
+                name='standing_grade_avg_idx'
+            ),
+            models.Index(
+                fields=['grade', 'governorate', '-quiz_average', 'student'],
+                name='standing_grade_gov_avg_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.student_id}: {self.quiz_average:.1f}%"
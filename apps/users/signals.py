@@ -0,0 +1,18 @@
+"""
+Signals for the users app
+"""
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .leaderboards import sync_standing_scope
+from .models import User
+
+SCOPE_FIELDS = {'grade', 'governorate'}
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Keep the leaderboard rollup in the student's current grade/governorate
+    if created or (update_fields is not None and not SCOPE_FIELDS & set(update_fields)):
+        return
+    sync_standing_scope(instance)
@@ -0,0 +1,86 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from apps.exams.models import Quiz, StudentResult
+from apps.exams.tests import make_quiz, submit_quiz
+from .models import StudentStanding, User
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class LeaderboardTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.quiz = make_quiz(questions=2)
+        Quiz.objects.filter(pk=self.quiz.pk).update(max_attempts=3)
+        self.questions = list(self.quiz.questions.order_by('order'))
+        self.cairo = User.objects.create_user(
+            '01012345671', 'pass', first_name='أحمد', grade=1, governorate='cairo'
+        )
+        self.giza = User.objects.create_user(
+            '01012345672', 'pass', first_name='منى', grade=1, governorate='giza'
+        )
+
+    def take(self, student, answers):
+        self.client.force_login(student)
+        data = {f'question_{q.pk}': a for q, a in zip(self.questions, answers)}
+        submit_quiz(self.client, student, self.quiz, data)
+
+    def test_standings_are_maintained_incrementally(self):
+        self.take(self.cairo, 'aa')
+        self.take(self.cairo, 'ab')
+        standing = StudentStanding.objects.get(student=self.cairo)
+        self.assertEqual((standing.results_count, standing.quiz_average), (2, 75.0))
+
+        StudentResult.objects.filter(student=self.cairo, percentage=50).delete()
+        standing.refresh_from_db()
+        self.assertEqual((standing.results_count, standing.quiz_average), (1, 100.0))
+
+        self.cairo.governorate = 'giza'
+        self.cairo.save()
+        self.assertEqual(StudentStanding.objects.get(student=self.cairo).governorate, 'giza')
+
+    def test_boards_are_scoped_and_cached(self):
+        self.take(self.cairo, 'ab')
+        self.take(self.giza, 'aa')
+        url = reverse('users:leaderboard')
+
+        response = self.client.get(url, {'board': 'quiz', 'grade': 1})
+        self.assertEqual(
+            [entry['student_id'] for entry in response.context['entries']],
+            [self.giza.pk, self.cairo.pk]
+        )
+        response = self.client.get(url, {'board': 'quiz', 'grade': 1, 'governorate': 'cairo'})
+        self.assertEqual([entry['value'] for entry in response.context['entries']], [50.0])
+
+        # giza passed (+10), cairo failed (0 floor)
+        response = self.client.get(url, {'board': 'battery', 'grade': 1})
+        self.assertEqual([entry['value'] for entry in response.context['entries']], [10, 0])
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url, {'board': 'battery', 'grade': 1})
+        self.assertFalse([
+            q for q in ctx.captured_queries
+            if 'ORDER BY' in q['sql'] and 'battery_level' in q['sql']
+        ])
+
+    def test_deleting_an_uncounted_result_keeps_standing_valid(self):
+        # Created through the ORM, so never folded into a standing
+        StudentResult.objects.create(
+            student=self.cairo, quiz=self.quiz, score=2, total_questions=2,
+            correct_answers=2, percentage=100
+        ).delete()
+        self.assertFalse(StudentStanding.objects.filter(student=self.cairo, results_count__gt=0).exists())
+
+        self.take(self.giza, 'aa')
+        StudentResult.objects.create(
+            student=self.giza, quiz=self.quiz, score=0, total_questions=2,
+            correct_answers=0, percentage=0, attempt_number=5
+        )
+        StudentResult.objects.filter(student=self.giza).delete()
+        standing = StudentStanding.objects.get(student=self.giza)
+        self.assertEqual(standing.results_count, 0)
+        self.assertGreaterEqual(standing.percentage_sum, 0)
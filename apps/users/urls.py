@@ -10,4 +10,5 @@ urlpatterns = [
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('activate-code/', views.activate_code_view, name='activate_code'),
     path('profile/', views.profile_view, name='profile'),
+    path('leaderboard/', views.leaderboard_view, name='leaderboard'),
 ]
@@ -3,6 +3,7 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
+from .leaderboards import BOARDS, get_leaderboard
 from .models import User, ActivationCode
 from .forms import UserLoginForm, UserRegisterForm
 
@@ -95,10 +96,12 @@ def activate_code_view(request):
             
             # Create enrollment
             from apps.courses.models import Enrollment
+            from apps.courses.entitlements import invalidate_entitlements
             Enrollment.objects.get_or_create(
                 student=request.user,
                 lecture=code.lecture
             )
+            invalidate_entitlements(request.user)
             
             messages.success(request, f'تم تفعيل المحاضرة: {code.lecture.title} ⚡')
             
@@ -123,8 +126,49 @@ def profile_view(request):
         if 'profile_pic' in request.FILES:
             user.profile_pic = request.FILES['profile_pic']
         
-        user.save()
+        # Only the edited fields: a full save would write back this request's
+        # copy of battery_level over charges made since it was loaded
+        user.save(update_fields=[
+            'first_name', 'last_name', 'parent_phone', 'governorate', 'profile_pic'
+        ])
         messages.success(request, 'تم تحديث بياناتك بنجاح')
         return redirect('users:profile')
     
     return render(request, 'users/profile.html')
+
+
+@login_required
+def leaderboard_view(request):
+    """لوحة الشرف حسب الصف والمحافظة"""
+    board = request.GET.get('board', 'battery')
+    if board not in BOARDS:
+        board = 'battery'
+    
+    grades = dict(User.GRADE_CHOICES)
+    try:
+        grade = int(request.GET.get('grade', ''))
+    except ValueError:
+        grade = request.user.grade
+    if grade not in grades:
+        grade = request.user.grade or User.GRADE_CHOICES[0][0]
+    
+    governorate = request.GET.get('governorate', '')
+    governorates = dict(User.GOVERNORATE_CHOICES)
+    if governorate not in governorates:
+        governorate = ''
+    
+    entries = [
+        dict(entry, governorate_name=governorates.get(entry['governorate'], ''))
+        for entry in get_leaderboard(board, grade, governorate)
+    ]
+    
+    context = {
+        'board': board,
+        'boards': BOARDS,
+        'grade': grade,
+        'grades': User.GRADE_CHOICES,
+        'governorate': governorate,
+        'governorates': User.GOVERNORATE_CHOICES,
+        'entries': entries,
+    }
+    return render(request, 'users/leaderboard.html', context)
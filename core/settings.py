@@ -91,6 +91,22 @@ else:
         }
     }
 
+# Cache - Use Redis on Railway if REDIS_URL is set, local memory otherwise
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -120,6 +136,13 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Protected media (lecture PDFs) delivery after the access check:
+# '' = Django streams the file (Range + sendfile-friendly),
+# 'nginx' = X-Accel-Redirect to PROTECTED_MEDIA_URL (an internal location aliased to MEDIA_ROOT),
+# 'sendfile' = X-Sendfile with the absolute path (Apache/lighttpd)
+PROTECTED_MEDIA_SERVER = os.getenv('PROTECTED_MEDIA_SERVER', '')
+PROTECTED_MEDIA_URL = os.getenv('PROTECTED_MEDIA_URL', '/protected-media/')
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -132,6 +155,25 @@ LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'users:dashboard'
 LOGOUT_REDIRECT_URL = 'home'
 
+# Background jobs (video metadata, ...)
+# Set BACKGROUND_TASKS_EAGER=true to run jobs inline after commit (tests/dev)
+BACKGROUND_TASKS_EAGER = os.getenv('BACKGROUND_TASKS_EAGER', 'False').lower() == 'true'
+BACKGROUND_TASK_WORKERS = int(os.getenv('BACKGROUND_TASK_WORKERS', '2'))
+
+# Callable used to look up video durations (url -> minutes)
+VIDEO_DURATION_FETCHER = os.getenv(
+    'VIDEO_DURATION_FETCHER',
+    'apps.courses.video_metadata.get_youtube_duration'
+)
+
+# Buffer video progress heartbeats in the cache and flush them in batches
+# (python manage.py flush_progress). Only used with a shared cache (REDIS_URL);
+# otherwise, or when disabled, each heartbeat is one UPDATE.
+PROGRESS_BUFFER_ENABLED = os.getenv('PROGRESS_BUFFER_ENABLED', 'True').lower() == 'true'
+
+# Seconds accepted after a quiz's time limit (network delay, auto-submit)
+QUIZ_SUBMIT_GRACE_SECONDS = int(os.getenv('QUIZ_SUBMIT_GRACE_SECONDS', '30'))
+
 # Security settings for production
 if not DEBUG:
     SECURE_BROWSER_XSS_FILTER = True
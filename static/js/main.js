@@ -5,7 +5,7 @@
 // Quiz Timer
 class QuizTimer {
     constructor(duration, display, onComplete) {
-        this.duration = duration * 60; // Convert to seconds
+        this.duration = Math.round(duration * 60); // Convert to seconds
         this.display = display;
         this.onComplete = onComplete;
         this.remaining = this.duration;